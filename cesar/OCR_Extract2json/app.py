@@ -7,27 +7,27 @@ import shutil
 import fitz  # PyMuPDF
 from PIL import Image
 
+from parsers.job_context import OCR, VISUALIZATION, JobContext, purge_jobs
+
 # ------------------- CONFIG STREAMLIT -------------------
 st.set_page_config(page_title="OCR Parser", layout="wide")
 st.title("📑 Analyseur de Relevés Bancaires")
 
 # ------------------- DOSSIERS -------------------
+# Un dossier de travail par PDF chargé (voir parsers/job_context.py) : deux sessions
+# ou deux PDF de même nom n'écrivent jamais dans les mêmes fichiers
 TEMP_DIR = "data/tmp_streamlit"
-IMAGE_DIR = os.path.join(TEMP_DIR, "pdf_pages")
-PREPROCESS_JSON_PATH = os.path.join(TEMP_DIR, "preprocess_config.json")
-OCR_OUTPUT_DIR = "data/ocr"
-ANNOTATED_DIR = "data/ocr_visualization"
 os.makedirs(TEMP_DIR, exist_ok=True)
-os.makedirs(IMAGE_DIR, exist_ok=True)
-os.makedirs(OCR_OUTPUT_DIR, exist_ok=True)
+# Dossiers des sessions fermées sans nouvel upload : supprimés après 24 h sans écriture
+JOB_MAX_AGE_S = 24 * 3600
 
 # ------------------- UTILS -------------------
-def convertir_pdf_en_images(pdf_path, prefix):
+def convertir_pdf_en_images(pdf_path, prefix, image_dir):
     doc = fitz.open(pdf_path)
     image_paths = []
     for i, page in enumerate(doc):
         pix = page.get_pixmap(dpi=150)
-        image_path = os.path.join(IMAGE_DIR, f"{prefix}_page_{i + 1}.png")
+        image_path = os.path.join(image_dir, f"{prefix}_page_{i + 1}.png")
         pix.save(image_path)
         image_paths.append(image_path)
     return image_paths
@@ -102,13 +102,25 @@ with col_centre:
 
     if uploaded_pdf:
         nom_base = Path(uploaded_pdf.name).stem
-        pdf_path = os.path.join(TEMP_DIR, f"{nom_base}.pdf")
+        if st.session_state.get("job_upload") != uploaded_pdf.file_id:
+            # Nouveau PDF : le dossier du précédent et ses résultats affichés ne servent plus
+            if "job" in st.session_state:
+                st.session_state["job"].cleanup()
+            for cle in ("json_output", "annot_images"):
+                st.session_state.pop(cle, None)
+            purge_jobs(TEMP_DIR, JOB_MAX_AGE_S)
+            st.session_state["job"] = JobContext(root=TEMP_DIR, prefix=nom_base, keep=True)
+            st.session_state["job_upload"] = uploaded_pdf.file_id
+        job = st.session_state["job"]
+        image_dir = job.subdir("pdf_pages")
+
+        pdf_path = job.path(f"{nom_base}.pdf")
         with open(pdf_path, "wb") as f:
-            f.write(uploaded_pdf.read())
+            f.write(uploaded_pdf.getvalue())
         st.session_state["pdf_path"] = pdf_path
 
         # Affichage immédiat du PDF brut
-        brut_images = convertir_pdf_en_images(pdf_path, nom_base)
+        brut_images = convertir_pdf_en_images(pdf_path, nom_base, image_dir)
         st.session_state["brut_images"] = brut_images
 
         # Choix du mode juste après upload PDF
@@ -149,22 +161,23 @@ with col_centre:
 
 
             if st.button("🚀 Lancer l'analyse OCR"):
-                output_json = os.path.join(TEMP_DIR, f"{nom_base}_output.json")
-                vis_path = f"{ANNOTATED_DIR}/{nom_base}_annotated.pdf"
+                output_json = job.path(f"{nom_base}_output.json")
+                vis_path = os.path.join(job.dir, VISUALIZATION, f"{nom_base}_annotated.pdf")
 
                 try:
                     subprocess.run([
                         "python3", "parsers/extract_data.py",
                         "--pdf", pdf_path,
                         "--config", os.path.join(config_dir, selected_config),
-                        "--output", output_json
+                        "--output", output_json,
+                        "--job-dir", job.dir
                     ], check=True)
 
                     with open(output_json, "r", encoding="utf-8") as f:
                         st.session_state["json_output"] = json.load(f)
 
                     if os.path.exists(vis_path):
-                        st.session_state["annot_images"] = convertir_pdf_en_images(vis_path, nom_base + "_annot")
+                        st.session_state["annot_images"] = convertir_pdf_en_images(vis_path, nom_base + "_annot", image_dir)
 
                 except subprocess.CalledProcessError as e:
                     st.error("Erreur pendant l'exécution du parsing OCR")
@@ -220,30 +233,33 @@ with col_centre:
                 preprocessing_config = None
 
             if st.button("🚀 Lancer le preprocessing"):
+                preprocess_json_path = job.path("preprocess_config.json")
+                ocr_output_dir = job.subdir(OCR)
                 if preprocessing_config:
-                    with open(PREPROCESS_JSON_PATH, "w", encoding="utf-8") as f:
+                    with open(preprocess_json_path, "w", encoding="utf-8") as f:
                         json.dump(preprocessing_config, f, indent=2)
 
                 try:
                     cmd = [
                         "python3", "parsers/ocr_reader.py",
                         pdf_path,
-                        "--output-dir", OCR_OUTPUT_DIR,
+                        "--output-dir", ocr_output_dir,
                         "--psm", str(psm),
-                        "--oem", str(oem)
+                        "--oem", str(oem),
+                        "--job-dir", job.dir
                     ]
                     if no_preprocess:
                         cmd.append("--no-preprocess")
                     else:
-                        cmd += ["--with-preprocessing-config", PREPROCESS_JSON_PATH]
+                        cmd += ["--with-preprocessing-config", preprocess_json_path]
 
                     subprocess.run(cmd, check=True)
 
-                    json_output_path = os.path.join(OCR_OUTPUT_DIR, f"{nom_base}.json")
+                    json_output_path = os.path.join(ocr_output_dir, f"{nom_base}.json")
 
-                    pdf_annotated = os.path.join(ANNOTATED_DIR, f"{nom_base}_annotated.pdf")
+                    pdf_annotated = os.path.join(job.dir, VISUALIZATION, f"{nom_base}_annotated.pdf")
                     if os.path.exists(pdf_annotated):
-                        st.session_state["annot_images"] = convertir_pdf_en_images(pdf_annotated, nom_base + "_annot")
+                        st.session_state["annot_images"] = convertir_pdf_en_images(pdf_annotated, nom_base + "_annot", image_dir)
 
                 except subprocess.CalledProcessError as e:
                     st.error("❌ Erreur lors du preprocessing")
@@ -0,0 +1,370 @@
+"""
+Service HTTP d'extraction : un PDF en entrée, le JSON structuré en sortie.
+
+    POST /jobs?config=<banque>   corps = PDF → 202 {"job_id", "statut", "url"}
+    GET  /jobs/<job_id>          → statut (en_attente, en_cours, termine, erreur) et résultat
+    POST /extract?config=<banque> corps = PDF (petit fichier) → 200 résultat, en synchrone
+    GET  /health                 → workers, jobs en cours, places libres
+
+Les extractions tournent dans un pool de processus démarré et préchauffé
+au lancement : chaque worker a déjà construit ses pipelines (plans YAML
+compilés) et chargé son moteur OCR, si bien qu'une requête ne paie que
+l'écriture du PDF dans son dossier de job et l'OCR lui-même. Le nombre de
+jobs acceptés est borné (workers + --queue-size) : au-delà, le service
+répond 503 avec Retry-After au lieu d'empiler.
+
+Sans ?config=, la banque est détectée automatiquement (voir batch_extract).
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Manager
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from batch_extract import (CONFIG_DIR, ConfigIntrouvable, _init_batch_worker, charger_config_map, extraire_document,
+                           obtenir_pipeline)
+from job_context import DEFAULT_JOBS_DIR, JobContext
+from log_config import add_logging_arguments, configure_logging
+from ocr_cache import DEFAULT_CACHE_DIR
+from ocr_engine import get_engine
+
+DEFAULT_QUEUE_SIZE = 8
+DEFAULT_MAX_UPLOAD_MB = 50
+DEFAULT_MAX_SYNC_MB = 5
+DEFAULT_SYNC_TIMEOUT = 120
+# Jobs terminés gardés en mémoire pour GET /jobs/<id> (les plus anciens sont oubliés)
+DEFAULT_KEEP_JOBS = 1000
+# Attente maximale du préchauffage de tous les workers (construction des pipelines comprise)
+PRECHAUFFAGE_TIMEOUT = 600
+
+
+def lister_configs(config_dir=CONFIG_DIR):
+    """Nom court (ex. sgbe) → chemin des configs YAML disponibles."""
+    configs = {}
+    for fname in sorted(os.listdir(config_dir)):
+        if fname.endswith(".yaml"):
+            nom = fname.split(".", 1)[0]
+            configs[nom] = os.path.join(config_dir, fname)
+    return configs
+
+
+def _init_api_worker(options, config_paths):
+    """Initialisation d'un worker : pipelines construits et moteurs OCR chargés avant la première requête."""
+    _init_batch_worker(options)
+    moteurs = set()
+    for config_path in config_paths:
+        try:
+            moteurs.add(obtenir_pipeline(config_path).ocr_engine)
+        except Exception as e:
+            print(f"⚠️ Config {config_path} non préchargée : {type(e).__name__}: {e}")
+
+    # Un premier OCR sur une image blanche charge le modèle de langue (gardé par tesserocr)
+    for moteur in moteurs:
+        try:
+            get_engine(moteur).image_to_data(np.full((32, 32), 255, dtype=np.uint8))
+        except Exception as e:
+            print(f"⚠️ Moteur OCR {moteur} non préchauffé : {type(e).__name__}: {e}")
+
+
+def _attendre_les_autres(barriere):
+    """
+    Tâche de préchauffage : bloque jusqu'à ce que tous les workers en aient
+    une. Aucun worker ne peut en prendre deux, donc chacun est démarré et
+    initialisé (_init_api_worker) avant la première requête.
+    """
+    barriere.wait(timeout=PRECHAUFFAGE_TIMEOUT)
+    return os.getpid()
+
+
+def _traiter_job(pdf_path, config_path):
+    """Tâche exécutée dans un worker : ne lève jamais, l'erreur fait partie du statut."""
+    debut = time.perf_counter()
+    infos = {"config": config_path, "banque": None}
+    try:
+        result, pipeline = extraire_document(pdf_path, config_path, infos=infos)
+        infos.update({"statut": "termine", "resultat": result, "durees": pipeline.timings})
+    except ConfigIntrouvable as e:
+        infos.update({"statut": "erreur", "erreur": str(e)})
+    except Exception as e:
+        infos.update({"statut": "erreur", "erreur": f"{type(e).__name__}: {e}"})
+    infos["duree"] = round(time.perf_counter() - debut, 3)
+    return infos
+
+
+class ServiceExtraction:
+    """
+    Pool de workers préchauffés, file bornée et suivi des jobs en mémoire.
+    Chaque job a son dossier (JobContext) qui ne contient que le PDF reçu et
+    qui est supprimé dès la fin de l'extraction.
+    """
+
+    def __init__(self, workers, queue_size=DEFAULT_QUEUE_SIZE, options=None, config_paths=(),
+                 jobs_dir=os.path.join(DEFAULT_JOBS_DIR, "api"), keep_jobs=DEFAULT_KEEP_JOBS):
+        self.workers = workers
+        self.capacite = workers + queue_size
+        self.jobs_dir = jobs_dir
+        self.keep_jobs = keep_jobs
+        self._places = threading.BoundedSemaphore(self.capacite)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_api_worker, initargs=(options or {}, tuple(config_paths))
+        )
+
+    def prechauffer(self):
+        """Démarre tous les workers (et leur initialisation) avant d'accepter des requêtes."""
+        debut = time.perf_counter()
+        with Manager() as manager:
+            barriere = manager.Barrier(self.workers)
+            futures = [self.pool.submit(_attendre_les_autres, barriere) for _ in range(self.workers)]
+            pids = {f.result() for f in futures}
+        print(f"🔥 {len(pids)} worker(s) prêts en {time.perf_counter() - debut:.1f}s")
+
+    def soumettre(self, pdf_bytes, config_path=None):
+        """Nouveau job, ou None si la file est pleine (le client doit réessayer plus tard)."""
+        if not self._places.acquire(blocking=False):
+            return None
+        job = None
+        try:
+            job = JobContext(root=self.jobs_dir)
+            pdf_path = job.path("document.pdf")
+            with open(pdf_path, 'wb') as f:
+                f.write(pdf_bytes)
+            entree = {"job_id": job.job_id, "statut": "en_attente", "config": config_path, "soumis": time.time()}
+            future = self.pool.submit(_traiter_job, pdf_path, config_path)
+        except Exception:
+            if job is not None:
+                job.cleanup()
+            self._places.release()
+            raise
+
+        fini = threading.Event()
+        with self._lock:
+            self._jobs[job.job_id] = (entree, future, fini)
+            self._oublier_anciens()
+        future.add_done_callback(lambda f: self._terminer(job, entree, f, fini))
+        return job.job_id
+
+    def _terminer(self, job, entree, future, fini):
+        try:
+            infos = future.result()
+        except Exception as e:
+            # Worker tué (BrokenProcessPool...) ou job annulé à l'arrêt
+            infos = {"statut": "erreur", "erreur": f"{type(e).__name__}: {e}"}
+        infos["termine"] = time.time()
+        job.cleanup()
+        self._places.release()
+        with self._lock:
+            entree.update(infos)
+        fini.set()
+
+    def _oublier_anciens(self):
+        termines = [job_id for job_id, (_, _, fini) in self._jobs.items() if fini.is_set()]
+        for job_id in termines[:max(0, len(self._jobs) - self.keep_jobs)]:
+            del self._jobs[job_id]
+
+    def attendre(self, job_id, timeout=None):
+        """État final du job ; lève TimeoutError s'il tourne encore après `timeout` secondes."""
+        with self._lock:
+            _, _, fini = self._jobs[job_id]
+        if not fini.wait(timeout):
+            raise TimeoutError(job_id)
+        return self.etat(job_id)
+
+    def etat(self, job_id):
+        """Copie de l'état du job, None s'il est inconnu (ou oublié)."""
+        with self._lock:
+            trouve = self._jobs.get(job_id)
+            if trouve is None:
+                return None
+            entree, future, fini = trouve
+            etat = dict(entree)
+        if not fini.is_set() and future.running():
+            etat["statut"] = "en_cours"
+        return etat
+
+    def sante(self):
+        with self._lock:
+            en_cours = sum(1 for _, _, fini in self._jobs.values() if not fini.is_set())
+        return {"workers": self.workers, "capacite": self.capacite, "jobs_en_cours": en_cours,
+                "places_libres": self.capacite - en_cours}
+
+    def fermer(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ExtractionHandler(BaseHTTPRequestHandler):
+    server_version = "OCRExtract/1.0"
+
+    # --- Réponses ----------------------------------------------------------
+
+    def _json(self, code, payload, headers=None):
+        corps = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(corps)))
+        for nom, valeur in (headers or {}).items():
+            self.send_header(nom, valeur)
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def _erreur(self, code, message, headers=None):
+        self._json(code, {"erreur": message}, headers)
+
+    def _sature(self):
+        self._erreur(503, "File d'attente pleine, réessayer plus tard", {"Retry-After": str(self.server.retry_after)})
+
+    # --- Lecture de la requête ---------------------------------------------
+
+    def _lire_pdf(self, max_bytes):
+        """Corps de la requête (PDF brut), ou None après avoir répondu l'erreur."""
+        longueur = self.headers.get("Content-Length")
+        if longueur is None:
+            self._erreur(411, "Content-Length requis")
+            return None
+        try:
+            longueur = int(longueur)
+        except ValueError:
+            longueur = -1
+        if longueur < 0:
+            self._erreur(400, f"Content-Length invalide : {self.headers.get('Content-Length')!r}")
+            return None
+        if longueur > max_bytes:
+            self._erreur(413, f"PDF trop volumineux (> {max_bytes / (1024 * 1024):g} Mo)")
+            return None
+        corps = self.rfile.read(longueur)
+        if not corps.startswith(b"%PDF"):
+            self._erreur(400, "Le corps de la requête doit être un PDF (Content-Type: application/pdf)")
+            return None
+        return corps
+
+    def _config(self, query):
+        """(ok, chemin de config) depuis ?config=<nom> ; (True, None) : détection automatique."""
+        noms = parse_qs(query).get("config")
+        if not noms:
+            return True, None
+        config_path = self.server.configs.get(noms[0])
+        if config_path is None:
+            self._erreur(400, f"Config inconnue : {noms[0]} (disponibles : {', '.join(self.server.configs)})")
+            return False, None
+        return True, config_path
+
+    # --- Routes ------------------------------------------------------------
+
+    def do_GET(self):
+        chemin = urlsplit(self.path).path.rstrip("/")
+        if chemin == "/health":
+            self._json(200, self.server.service.sante())
+        elif chemin.startswith("/jobs/"):
+            etat = self.server.service.etat(chemin[len("/jobs/"):])
+            if etat is None:
+                self._erreur(404, "Job inconnu")
+            else:
+                self._json(200, etat)
+        else:
+            self._erreur(404, "Route inconnue")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        chemin = url.path.rstrip("/")
+        if chemin not in ("/jobs", "/extract"):
+            self._erreur(404, "Route inconnue")
+            return
+
+        synchrone = chemin == "/extract"
+        ok, config_path = self._config(url.query)
+        if not ok:
+            return
+        pdf = self._lire_pdf(self.server.max_sync_bytes if synchrone else self.server.max_upload_bytes)
+        if pdf is None:
+            return
+
+        job_id = self.server.service.soumettre(pdf, config_path)
+        if job_id is None:
+            self._sature()
+            return
+        url_job = f"/jobs/{job_id}"
+
+        if not synchrone:
+            self._json(202, {"job_id": job_id, "statut": "en_attente", "url": url_job}, {"Location": url_job})
+            return
+
+        try:
+            etat = self.server.service.attendre(job_id, timeout=self.server.sync_timeout)
+        except TimeoutError:
+            # Le job continue : le client peut suivre son statut
+            self._json(504, {"erreur": "Extraction trop longue", "job_id": job_id, "url": url_job}, {"Location": url_job})
+            return
+        self._json(200 if etat["statut"] == "termine" else 422, etat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service HTTP d'extraction PDF → JSON avec workers préchauffés")
+    parser.add_argument("--host", default="127.0.0.1", help="Adresse d'écoute")
+    parser.add_argument("--port", type=int, default=8000, help="Port d'écoute")
+    parser.add_argument("--workers", type=int, default=0, help="Extractions en parallèle (0 = un par cœur)")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Jobs acceptés en attente au-delà des workers (ensuite : 503)")
+    parser.add_argument("--config", help="Fichier YAML imposé à tous les documents (sinon ?config= ou détection)")
+    parser.add_argument("--config-map", help="YAML/JSON banque → fichier de config (ex. uba: configs/uba_scan.releve.yaml)")
+    parser.add_argument("--no-cache", action="store_true", help="Ne pas utiliser le cache OCR")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Dossier du cache OCR")
+    parser.add_argument("--jobs-dir", default=os.path.join(DEFAULT_JOBS_DIR, "api"), help="Dossier des PDF reçus (un sous-dossier par job)")
+    parser.add_argument("--max-upload-mb", type=float, default=DEFAULT_MAX_UPLOAD_MB, help="Taille maximale d'un PDF sur /jobs")
+    parser.add_argument("--max-sync-mb", type=float, default=DEFAULT_MAX_SYNC_MB, help="Taille maximale d'un PDF sur /extract")
+    parser.add_argument("--sync-timeout", type=float, default=DEFAULT_SYNC_TIMEOUT,
+                        help="Secondes d'attente sur /extract avant de répondre 504 (le job continue)")
+    parser.add_argument("--keep-jobs", type=int, default=DEFAULT_KEEP_JOBS, help="Jobs terminés gardés en mémoire")
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging(args.log_level, args.trace_file)
+
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    config_map = charger_config_map(args.config_map)
+    configs = lister_configs()
+    a_precharger = [args.config] if args.config else sorted(set(configs.values()) | set(config_map.values()))
+
+    options = {
+        "log_level": args.log_level,
+        "trace_file": args.trace_file,
+        "config": args.config,
+        "config_map": config_map,
+        "artifacts": False,
+        "cache_dir": None if args.no_cache else args.cache_dir,
+        # Parallélisme par document : pas de pool OCR par page en plus
+        "page_workers": 1
+    }
+    service = ServiceExtraction(workers, args.queue_size, options=options, config_paths=a_precharger,
+                                jobs_dir=args.jobs_dir, keep_jobs=args.keep_jobs)
+    print(f"⚙️ {len(a_precharger)} config(s) préchargée(s) dans {workers} worker(s)")
+    # Workers démarrés avant le serveur : aucun fork une fois les threads HTTP lancés
+    service.prechauffer()
+
+    server = ThreadingHTTPServer((args.host, args.port), ExtractionHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.configs = configs
+    server.max_upload_bytes = int(args.max_upload_mb * 1024 * 1024)
+    server.max_sync_bytes = int(args.max_sync_mb * 1024 * 1024)
+    server.sync_timeout = args.sync_timeout
+    server.retry_after = 5
+
+    print(f"🌐 Service d'extraction sur http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("🛑 Arrêt du service")
+    finally:
+        server.server_close()
+        service.fermer()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,12 @@ import fitz
 import cv2
 import numpy as np
 from PIL import Image, ImageEnhance
-import pytesseract
 import io
 import os
 from typing import Optional
 
+from ocr_engine import get_engine
+
 BANQUES_VARIANTES = {
     "nsia": ["nsia", "n.s.i.a", "nouvelle société", "interafricaine"],
     "coris": ["coris", "coris bank"],
@@ -29,22 +30,40 @@ BANQUES_VARIANTES = {
     "biic": ["biic", "banque internationale pour l'industrie"]
 }
 
-def detect_bank_name(pdf_path: str, debug: bool = False) -> str:
+# Résolution de l'en-tête OCRisé (fitz.Matrix(3, 3) = 3 × 72 DPI) : les seuils
+# de taille des contours (extract_title_like_text) sont calibrés pour elle
+DPI_DETECTION = 216
+
+def detect_bank_name(pdf_path: str, debug: bool = False, provider=None) -> str:
     if not os.path.exists(pdf_path):
         return "inconnu"
 
-    doc = fitz.open(pdf_path)
-    if len(doc) == 0:
+    if provider is not None:
+        # Réutilise la page 1 déjà rendue par le PageImageProvider partagé
+        if len(provider) == 0:
+            return "inconnu"
+        image = provider.get(0)
+        provider.release(0, "banque")
+        dpi = provider.dpi
+    else:
+        doc = fitz.open(pdf_path)
+        if len(doc) == 0:
+            doc.close()
+            return "inconnu"
+
+        page = doc[0]
+        zoom = DPI_DETECTION / 72
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+        image = Image.open(io.BytesIO(pix.tobytes("png")))
         doc.close()
-        return "inconnu"
-
-    page = doc[0]
-    pix = page.get_pixmap(matrix=fitz.Matrix(3, 3))
-    image = Image.open(io.BytesIO(pix.tobytes("png")))
-    doc.close()
+        dpi = DPI_DETECTION
 
     width, height = image.size
     header = image.crop((0, 0, width, int(height * 0.25)))
+    if dpi != DPI_DETECTION:
+        # Page partagée rendue pour l'OCR (300 DPI par défaut) : en-tête ramené à l'échelle de détection
+        facteur = DPI_DETECTION / dpi
+        header = header.resize((round(header.width * facteur), round(header.height * facteur)), Image.LANCZOS)
 
     variantes_texte = []
 
@@ -73,7 +92,7 @@ def detect_bank_name(pdf_path: str, debug: bool = False) -> str:
 
 def ocr(image: Image.Image) -> str:
     try:
-        return pytesseract.image_to_string(image, config="--oem 3 --psm 6 -l fra+eng").lower()
+        return get_engine().image_to_string(image, lang="fra+eng", psm=6, oem=3).lower()
     except:
         return ""
 
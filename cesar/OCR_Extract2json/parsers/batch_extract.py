@@ -0,0 +1,283 @@
+import argparse
+import copy
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import yaml
+
+from bank_detector import detect_bank_name
+from extract_data import charger_config_yaml, ecrire_resultat
+from job_context import JobContext
+from page_images import PageImageProvider, raster_settings
+from pipeline import CONSOMMATEUR_PIPELINE, ExtractionPipeline
+from ocr_cache import DEFAULT_CACHE_DIR, OcrCache
+from log_config import add_logging_arguments, configure_logging
+
+CONFIG_DIR = "configs"
+
+# Pipelines déjà construits dans ce processus : chemin YAML → (version du fichier, pipeline)
+_PIPELINES = {}
+_OPTIONS_WORKER = {}
+
+
+def lister_documents(input_dir=None, manifest=None):
+    """
+    Retourne la liste des documents à traiter sous forme de dicts
+    {"pdf": ..., "config": ... (optionnel), "output": ... (optionnel)}.
+    """
+    if input_dir:
+        return [{"pdf": str(p)} for p in sorted(Path(input_dir).rglob("*.pdf"))]
+
+    documents = []
+    if manifest.endswith(".jsonl"):
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for ligne in f:
+                ligne = ligne.strip()
+                if ligne:
+                    documents.append(json.loads(ligne))
+    else:
+        with open(manifest, 'r', encoding='utf-8', newline='') as f:
+            documents = [dict(row) for row in csv.DictReader(f)]
+
+    for i, doc in enumerate(documents):
+        if not doc.get("pdf"):
+            raise ValueError(f"❌ Ligne {i + 1} du manifeste sans colonne 'pdf'")
+    return documents
+
+
+def charger_config_map(config_map_path):
+    """Fichier YAML/JSON banque → fichier de config (ex. uba: configs/uba_scan.releve.yaml)."""
+    if not config_map_path:
+        return {}
+    with open(config_map_path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+
+def detecter_config(pdf_path, config_map, provider):
+    """
+    Détection automatique de la banque, puis config_map, sinon
+    configs/<banque>.releve.yaml. Retourne (chemin_config, banque_detectee).
+    """
+    banque = detect_bank_name(pdf_path, provider=provider)
+    if banque in config_map:
+        return config_map[banque], banque
+
+    chemin = os.path.join(CONFIG_DIR, f"{banque}.releve.yaml")
+    if banque != "inconnu" and os.path.exists(chemin):
+        return chemin, banque
+    return None, banque
+
+
+def _init_batch_worker(options):
+    _OPTIONS_WORKER.update(options)
+    configure_logging(options.get("log_level", "INFO"), options.get("trace_file"))
+
+
+def _version_config(config_path):
+    st = os.stat(config_path)
+    return st.st_mtime_ns, st.st_size
+
+
+def obtenir_pipeline(config_path):
+    """
+    Réutilise le pipeline déjà construit dans ce processus pour ce YAML. Si
+    le fichier a changé sur disque (date ou taille), tout le pipeline est
+    reconstruit (prétraitement, OCR, tableaux, plan) et l'ancien est fermé.
+    """
+    version = _version_config(config_path)
+    cached = _PIPELINES.get(config_path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    if cached is not None:
+        print(f"🔄 Config modifiée, pipeline reconstruit : {config_path}")
+        cached[1].close()
+    config = copy.deepcopy(charger_config_yaml(config_path))
+    if _OPTIONS_WORKER.get("page_workers") is not None:
+        config.setdefault("ocr", {})["workers"] = _OPTIONS_WORKER["page_workers"]
+    pipeline = ExtractionPipeline(
+        config,
+        config_path=config_path,
+        save_ocr=_OPTIONS_WORKER.get("artifacts", False),
+        visualize=_OPTIONS_WORKER.get("artifacts", False),
+        cache=OcrCache(_OPTIONS_WORKER["cache_dir"]) if _OPTIONS_WORKER.get("cache_dir") else None
+    )
+    _PIPELINES[config_path] = (version, pipeline)
+    return pipeline
+
+
+class ConfigIntrouvable(ValueError):
+    """Aucune configuration YAML pour la banque détectée."""
+
+
+def extraire_document(pdf_path, config_path=None, job=None, infos=None):
+    """
+    Extrait un PDF avec le pipeline déjà chargé dans ce processus (voir
+    obtenir_pipeline). Retourne (résultat, pipeline).
+
+    config_path : config imposée, sinon --config, sinon détection automatique.
+    job : JobContext où écrire les artefacts (s'ils sont activés).
+    infos : dict complété au fil de l'eau (config, banque), même en cas d'échec.
+    """
+    infos = {} if infos is None else infos
+    config_path = config_path or _OPTIONS_WORKER.get("config")
+    provider = None
+    try:
+        if config_path is None:
+            # La page 1 rendue pour la détection de banque (rasterisation par
+            # défaut) est réutilisée par le pipeline si sa config garde ces réglages
+            provider = PageImageProvider(pdf_path, consumers=[CONSOMMATEUR_PIPELINE, "banque"])
+            config_path, infos["banque"] = detecter_config(pdf_path, _OPTIONS_WORKER.get("config_map", {}), provider)
+            if config_path is None:
+                raise ConfigIntrouvable(f"Aucune configuration pour la banque '{infos['banque']}'")
+
+        infos["config"] = config_path
+        pipeline = obtenir_pipeline(config_path)
+        if provider is not None and (provider.dpi, provider.engine) != raster_settings(pipeline.config):
+            # Config avec sa propre section `rasterization` : les pages sont rendues à nouveau
+            provider.close()
+            provider = None
+        if provider is None:
+            provider = pipeline.open_pages(pdf_path)
+        return pipeline.run(pdf_path, provider=provider, job=job), pipeline
+    finally:
+        if provider is not None:
+            provider.close()
+
+
+def traiter_document(doc, output_path):
+    """Traite un document et retourne sa ligne de rapport (n'échoue jamais)."""
+    debut = time.perf_counter()
+    rapport = {"pdf": doc["pdf"], "config": None, "banque": None, "output": None, "statut": "erreur"}
+
+    try:
+        # Artefacts dans un dossier propre au document : deux PDF de même nom ne s'écrasent pas
+        job = None
+        if _OPTIONS_WORKER.get("artifacts"):
+            job = JobContext(prefix=Path(doc["pdf"]).stem, keep=True)
+            rapport["artefacts"] = job.dir
+        # Priorité : colonne 'config' du manifeste, puis --config, puis détection automatique
+        result, pipeline = extraire_document(doc["pdf"], doc.get("config"), job=job, infos=rapport)
+
+        ecrire_resultat(result, output_path)
+        rapport.update({
+            "statut": "ok",
+            "output": output_path,
+            "nb_transactions": len(result.get("transactions", [])),
+            "nb_lignes_exclues": len(result.get("lignes_exclues", [])),
+            "durees": pipeline.timings
+        })
+    except ConfigIntrouvable as e:
+        rapport["erreur"] = str(e)
+    except Exception as e:
+        rapport["erreur"] = f"{type(e).__name__}: {e}"
+    finally:
+        rapport["duree"] = round(time.perf_counter() - debut, 3)
+
+    return rapport
+
+
+def construire_sorties(documents, output_dir):
+    """Chemin de sortie unique par document, même si deux PDF ont le même nom."""
+    vus = {}
+    sorties = []
+    for doc in documents:
+        if doc.get("output"):
+            sorties.append(doc["output"])
+            continue
+        stem = Path(doc["pdf"]).stem
+        vus[stem] = vus.get(stem, 0) + 1
+        suffixe = "" if vus[stem] == 1 else f"_{vus[stem]}"
+        sorties.append(os.path.join(output_dir, f"{stem}{suffixe}_structured.json"))
+    return sorties
+
+
+def traiter_lot(documents, output_dir, workers=1, config=None, config_map=None, artifacts=False, cache_dir=DEFAULT_CACHE_DIR,
+                log_level="INFO", trace_file=None):
+    options = {
+        "log_level": log_level,
+        "trace_file": trace_file,
+        "config": config,
+        "config_map": config_map or {},
+        "artifacts": artifacts,
+        "cache_dir": cache_dir,
+        # Parallélisme par document : pas de pool OCR par page en plus
+        "page_workers": 1 if workers > 1 else None
+    }
+    sorties = construire_sorties(documents, output_dir)
+    rapports = [None] * len(documents)
+    debut = time.perf_counter()
+
+    if workers <= 1:
+        _init_batch_worker(options)
+        for i, (doc, sortie) in enumerate(zip(documents, sorties)):
+            rapports[i] = traiter_document(doc, sortie)
+            print(f"[{i + 1}/{len(documents)}] {rapports[i]['statut']} — {doc['pdf']}")
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker, initargs=(options,)) as pool:
+            futures = {
+                pool.submit(traiter_document, doc, sortie): i
+                for i, (doc, sortie) in enumerate(zip(documents, sorties))
+            }
+            for n, future in enumerate(as_completed(futures), start=1):
+                i = futures[future]
+                rapports[i] = future.result()
+                print(f"[{n}/{len(documents)}] {rapports[i]['statut']} — {documents[i]['pdf']}")
+
+    duree = time.perf_counter() - debut
+    nb_ok = sum(1 for r in rapports if r["statut"] == "ok")
+    return {
+        "nb_documents": len(documents),
+        "nb_ok": nb_ok,
+        "nb_erreurs": len(documents) - nb_ok,
+        "workers": workers,
+        "duree_totale": round(duree, 3),
+        "documents": rapports
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extraction par lot : un dossier de PDF ou un manifeste CSV/JSONL"
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input-dir", help="Dossier contenant les PDF (parcouru récursivement)")
+    source.add_argument("--manifest", help="Manifeste CSV ou JSONL (colonnes : pdf, config, output)")
+    parser.add_argument("--config", help="Fichier YAML à appliquer à tous les documents (sinon détection automatique)")
+    parser.add_argument("--config-map", help="YAML/JSON banque → fichier de config (ex. uba: configs/uba_scan.releve.yaml)")
+    parser.add_argument("--output-dir", default="data/output", help="Dossier des JSON structurés et du rapport")
+    parser.add_argument("--workers", type=int, default=1, help="Documents traités en parallèle (0 = un par cœur)")
+    parser.add_argument("--artifacts", action="store_true", help="Écrire aussi les JSON OCR et les PDF annotés (un dossier par document sous data/jobs)")
+    parser.add_argument("--no-cache", action="store_true", help="Ne pas utiliser le cache OCR")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Dossier du cache OCR")
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging(args.log_level, args.trace_file)
+
+    documents = lister_documents(input_dir=args.input_dir, manifest=args.manifest)
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    print(f"📚 {len(documents)} document(s) à traiter avec {workers} worker(s)")
+
+    rapport = traiter_lot(
+        documents,
+        args.output_dir,
+        workers=workers,
+        config=args.config,
+        config_map=charger_config_map(args.config_map),
+        artifacts=args.artifacts,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        log_level=args.log_level,
+        trace_file=args.trace_file
+    )
+
+    rapport_path = os.path.join(args.output_dir, "rapport_batch.json")
+    ecrire_resultat(rapport, rapport_path)
+    print(f"✅ {rapport['nb_ok']}/{rapport['nb_documents']} document(s) extraits en {rapport['duree_totale']:.1f}s → {rapport_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,21 @@ import json
 import argparse
 import yaml
 import re
+import logging
 from datetime import datetime
 
+import numpy as np
+
+from log_config import add_logging_arguments, configure_logging
+from word_store import WordStore, words_path
+from parsing_plan import ParsingPlan, compile_plan, load_plan
+from table_index import parse_table_name, query_tables, record_table
+
+logger = logging.getLogger("document_parser")
+
+# Dossier partagé des JSON OCR (et des tableaux) hors JobContext
+DEFAULT_OCR_DIR = "data/ocr"
+
 def load_yaml(yaml_path):
     with open(yaml_path, 'r', encoding='utf-8') as f:
         return yaml.safe_load(f)
@@ -13,6 +26,23 @@ def load_ocr_json(json_path):
     with open(json_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
+def load_ocr_words(json_path):
+    """
+    Mots OCR d'un fichier : le .words.npz écrit à côté du JSON s'il est à
+    jour (chargement sans parser le JSON), sinon le JSON lui-même.
+    """
+    npz_path = words_path(json_path)
+    try:
+        if os.path.getmtime(npz_path) >= os.path.getmtime(json_path):
+            return WordStore.load(npz_path)
+    except (OSError, ValueError):
+        pass
+    return WordStore.from_pages(load_ocr_json(json_path))
+
+def as_word_store(ocr_data):
+    """WordStore d'un JSON OCR déjà chargé (liste de pages) ou WordStore tel quel."""
+    return ocr_data if isinstance(ocr_data, WordStore) else WordStore.from_pages(ocr_data)
+
 def normalize_value(field_name, value, normalisation):
     rules = normalisation.get(field_name, {})
 
@@ -37,252 +67,223 @@ def normalize_date(date_str, normalisation):
     except:
         return date_str
 
-def extract_field(words, field_name, field_conf, normalisation):
-    anchor_sequence = field_conf.get('anchor_sequence')
-    anchor_text = field_conf.get('anchor')
-    direction = field_conf.get('direction', 'right')
-    regex = field_conf.get('regex', '.+')
-    offset = field_conf.get('offset', 0)
-    concat = field_conf.get('concat', False)
-    concat_until = field_conf.get('concat_until')
-    max_x = field_conf.get('max_x')
-    min_x = field_conf.get('min_x')
-    min_y = field_conf.get('min_y')
-    max_y = field_conf.get('max_y')
-    tol_x = field_conf.get('tolerance_x', 5)
-    tol_y = field_conf.get('tolerance_y', 50)
-    page_constraint = field_conf.get('page')  # Nouveau
-
-    if page_constraint is not None:
-        words = [w for w in words if w['page'] == page_constraint]
-
-    print(f"\n🔍 Extraction du champ : {field_name}")
+def normalize_field_value(field, value):
+    """Comme normalize_value, avec les règles déjà résolues dans le FieldPlan."""
+    if field.supprimer_espaces:
+        value = value.replace(' ', '')
+
+    if field.convertir_en_float:
+        value = value.replace(',', '.')
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+    return value
+
+def extract_field(store, field):
+    """
+    Extrait un champ simple à partir de son FieldPlan (voir parsing_plan.compile_field).
+    store : WordStore du document (voir word_store).
+    """
+    min_x, max_x, min_y, max_y = field.min_x, field.max_x, field.min_y, field.max_y
+    regex = field.regex
+    offset = field.offset
+
+    # Mots lisibles par le champ (sa page, ou tout le document), dans l'ordre de lecture
+    positions = store.page_indices(field.page)
+
+    # Calculé une fois par champ : sans DEBUG, les boucles ne formatent rien
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("🔍 Extraction du champ : %s", field.name)
     
-    if not anchor_text and not anchor_sequence:
-        print(f"🔎 Pas d’ancre définie → recherche directe dans la zone min_x:{min_x}, max_x:{max_x}, min_y:{min_y}, max_y:{max_y}")
+    if not field.anchor and not field.anchor_sequence:
+        if debug:
+            logger.debug("🔎 Pas d’ancre définie → recherche directe dans la zone min_x:%s, max_x:%s, min_y:%s, max_y:%s",
+                         min_x, max_x, min_y, max_y)
         
         # Tous les mots dans la zone, sans filtrer par regex
-        all_candidates_in_zone = [
-            w for w in words
-            if (min_x is None or w['x'] >= min_x) and (max_x is None or w['x'] <= max_x)
-            and (min_y is None or w['y'] >= min_y) and (max_y is None or w['y'] <= max_y)
-        ]
-        print(f"🟡 Tous les mots candidats dans la zone : {[w['text'] for w in all_candidates_in_zone]}")
+        all_candidates_in_zone = store.query(field.page, x_min=min_x, x_max=max_x, y_min=min_y, y_max=max_y)
+        if debug:
+            logger.debug("🟡 Tous les mots candidats dans la zone : %s", [w['text'] for w in all_candidates_in_zone])
         
         # Maintenant on applique la regex
-        regex_matched_candidates = [w for w in all_candidates_in_zone if re.search(regex, w['text'])]
-        print(f"🟢 Mots qui matchent la regex : {[w['text'] for w in regex_matched_candidates]}")
+        regex_matched_candidates = [w for w in all_candidates_in_zone if regex.search(w['text'])]
+        if debug:
+            logger.debug("🟢 Mots qui matchent la regex : %s", [w['text'] for w in regex_matched_candidates])
         
         if regex_matched_candidates:
             value = " ".join(w['text'] for w in regex_matched_candidates)
-            print(f"✅ Valeur extraite (sans ancre) : {value}")
-            return normalize_value(field_name, value, normalisation)
+            logger.info("✅ %s (sans ancre) : %s", field.name, value, extra={"trace": {"event": "champ", "champ": field.name, "valeur": value}})
+            return normalize_field_value(field, value)
         else:
-            print("❌ Aucune valeur trouvée dans la zone après filtrage regex")
+            logger.info("❌ %s : aucune valeur trouvée dans la zone après filtrage regex", field.name,
+                        extra={"trace": {"event": "champ_vide", "champ": field.name}})
         return None
 
+    def log_rejet(w, raison):
+        logger.debug("❌ %s rejeté (%s)", w['text'], raison,
+                     extra={"trace": {"event": "rejet", "champ": field.name, "mot": w['text'], "x": w['x'], "y": w['y'], "raison": raison}})
+
     def match_and_collect(w):
         if min_x is not None and w['x'] < min_x:
-            print(f"❌ {w['text']} rejeté (x trop petit : {w['x']} < {min_x})")
+            if debug:
+                log_rejet(w, f"x trop petit : {w['x']} < {min_x}")
             return False
         if max_x is not None and w['x'] > max_x:
-            print(f"❌ {w['text']} rejeté (x trop grand : {w['x']} > {max_x})")
+            if debug:
+                log_rejet(w, f"x trop grand : {w['x']} > {max_x}")
             return False
         if min_y is not None and w['y'] < min_y:
-            print(f"❌ {w['text']} rejeté (y trop petit : {w['y']} < {min_y})")
+            if debug:
+                log_rejet(w, f"y trop petit : {w['y']} < {min_y}")
             return False
         if max_y is not None and w['y'] > max_y:
-            print(f"❌ {w['text']} rejeté (y trop grand : {w['y']} > {max_y})")
+            if debug:
+                log_rejet(w, f"y trop grand : {w['y']} > {max_y}")
             return False
 
-        if re.search(regex, w['text']):
+        if regex.search(w['text']):
             return True
-        else:
-            print(f"❌ {w['text']} rejeté (ne matche pas la regex : {regex})")
-            return False
+        if debug:
+            log_rejet(w, f"ne matche pas la regex : {regex.pattern}")
+        return False
     
     def find_anchor_word():
-        if anchor_sequence:
-            print(f"🔗 Recherche de l'ancre multiple : {anchor_sequence}")
-            for i in range(len(words) - len(anchor_sequence) + 1):
-                if all(anchor_sequence[j].lower() in words[i + j]['text'].lower()
-                       for j in range(len(anchor_sequence))):
-                    print(f"✅ Ancre multiple trouvée : {[words[i + j]['text'] for j in range(len(anchor_sequence))]}")
-                    return words[i + offset]
-            print("❌ Aucune ancre multiple trouvée")
+        """Indice (dans le store) du mot d'ancrage décalé de `offset`, ou None."""
+        n = len(positions)
+        if field.anchor_sequence:
+            sequence = field.anchor_sequence_lower
+            if debug:
+                logger.debug("🔗 Recherche de l'ancre multiple : %s", list(field.anchor_sequence))
+            # Début i retenu si le j-ème mot après i contient le j-ème fragment, pour tout j
+            debuts = np.ones(max(n - len(sequence) + 1, 0), dtype=bool)
+            for j, fragment in enumerate(sequence):
+                debuts &= store.contains_mask(fragment)[positions][j:j + len(debuts)]
+            trouves = np.flatnonzero(debuts)
+            if len(trouves):
+                i = int(trouves[0])
+                if debug:
+                    logger.debug("✅ Ancre multiple trouvée : %s", [w['text'] for w in store.words(positions[i:i + len(sequence)])])
+                return int(positions[i + offset])
+            logger.debug("❌ Aucune ancre multiple trouvée")
             return None
 
-        if anchor_text:
-            print(f"🔗 Recherche de l'ancre simple : {anchor_text}")
-            for i, word in enumerate(words):
-                if anchor_text.lower() in word['text'].lower():
-                    if min_y is not None and word['y'] < min_y:
-                        continue
-                    if max_y is not None and word['y'] > max_y:
-                        continue
-                    print(f"✅ Ancre simple trouvée : {word['text']} à (x={word['x']}, y={word['y']})")
-                    return words[i + offset] if i + offset < len(words) else word
-            print("❌ Aucune ancre simple trouvée")
+        if field.anchor:
+            if debug:
+                logger.debug("🔗 Recherche de l'ancre simple : %s", field.anchor)
+            masque = store.contains_mask(field.anchor_lower)[positions]
+            y = store.columns["y"][positions]
+            if min_y is not None:
+                masque &= y >= min_y
+            if max_y is not None:
+                masque &= y <= max_y
+            trouves = np.flatnonzero(masque)
+            if len(trouves):
+                i = int(trouves[0])
+                if debug:
+                    word = store.word(int(positions[i]))
+                    logger.debug("✅ Ancre simple trouvée : %s à (x=%s, y=%s)", word['text'], word['x'], word['y'])
+                return int(positions[i + offset] if i + offset < n else positions[i])
+            logger.debug("❌ Aucune ancre simple trouvée")
         return None
 
-    def extract_by_direction(anchor_word):
-        anchor_x = anchor_word['x']
-        anchor_y = anchor_word['y']
-        anchor_page = anchor_word['page']
-
-        if direction == 'right_xy':
-            print("📐 Recherche en direction: right_xy")
-            candidates = [
-                w for w in words
-                if w['page'] == anchor_page and
-                   w['x'] > anchor_x + tol_x and
-                   abs(w['y'] - anchor_y) < tol_y
-            ]
-            print(f"🔎 {len(candidates)} mots candidats trouvés (avant regex): {[w['text'] for w in candidates]}")
+    def extract_by_direction(anchor_index):
+        anchor_word = store.word(anchor_index)
+        if field.strategy is not None:
+            if debug:
+                logger.debug("📐 Recherche en direction: %s", field.direction)
+            candidates = field.strategy(field, anchor_word, store)
 
             matched_words = []
             for w in candidates:
                 if match_and_collect(w):
-                    print(f"✔️ Match accepté : {w['text']} (x={w['x']}, y={w['y']})")
+                    if debug:
+                        logger.debug("✔️ Match accepté : %s (x=%s, y=%s)", w['text'], w['x'], w['y'])
                     matched_words.append(w['text'])
 
             if matched_words:
-                value = " ".join(matched_words)
-                print(f"➡️ Valeur extraite : {value}")
-                return value
-
-        elif direction == 'line_right':
-            print("📐 Recherche en direction: line_right")
-            anchor_line = anchor_word['line_num']
-            candidates = [
-                w for w in words
-                if w['page'] == anchor_page and
-                   w['line_num'] == anchor_line and
-                   w['x'] > anchor_x
-            ]
-            print(f"🔎 {len(candidates)} mots candidats trouvés (avant regex): {[w['text'] for w in candidates]}")
-
-            matched_words = [w['text'] for w in candidates if match_and_collect(w)]
-
-            if matched_words:
-                value = " ".join(matched_words)
-                print(f"➡️ Valeur extraite : {value}")
-                return value
-
-        elif direction == 'nearby_xy':
-            print("📐 Recherche en direction: nearby_xy")
-            candidates = [
-                w for w in words
-                if w['page'] == anchor_page and
-                   abs(w['x'] - anchor_x) <= tol_x and
-                   abs(w['y'] - anchor_y) <= tol_y
-            ]
-            print(f"🔎 {len(candidates)} mots candidats trouvés (avant regex): {[w['text'] for w in candidates]}")
-
-            matched_words = [w['text'] for w in candidates if match_and_collect(w)]
-
-            if matched_words:
-                value = " ".join(matched_words)
-                print(f"➡️ Valeur extraite : {value}")
-                return value
-        
-        elif direction == 'below':
-            print("📐 Recherche en direction: below")
-            candidates = [
-                w for w in words
-                if w['page'] == anchor_page and
-                w['y'] > anchor_y and
-                w['y'] <= anchor_y + tol_y and
-                (min_x is None or w['x'] >= min_x) and
-                (max_x is None or w['x'] <= max_x)
-            ]
-            print(f"🔎 {len(candidates)} mots candidats trouvés (en dessous): {[w['text'] for w in candidates]}")
-            
-                # 🔍 Log des mots proches en x mais rejetés par y
-            debug_rejected_y = [
-                w for w in words
-                if w['page'] == anchor_page and
-                abs(w['x'] - anchor_x) <= tol_x and
-                not (w['y'] > anchor_y and w['y'] <= anchor_y + tol_y)
-            ]
-            for w in debug_rejected_y:
-                print(f"❌ {w['text']} rejeté (y={w['y']}, anchor_y={anchor_y}, tol_y={tol_y})")
-
-
-            matched_words = [w['text'] for w in candidates if match_and_collect(w)]
-
-            if matched_words:
-                value = " ".join(matched_words)
-                print(f"➡️ Valeur extraite : {value}")
-                return value
-
+                return " ".join(matched_words)
 
         # Fallback
-        print("🔁 Méthode fallback utilisée (séquence brute)")
-        search_range = words[words.index(anchor_word):words.index(anchor_word) + 50]
-        print(f"🔎 Mots testés dans le fallback : {[w['text'] for w in search_range]}")
-
-        if concat:
+        logger.debug("🔁 Méthode fallback utilisée (séquence brute)")
+        debut = int(np.searchsorted(positions, anchor_index))
+        search_range = store.words(positions[debut:debut + 50])
+        if debug:
+            logger.debug("🔎 Mots testés dans le fallback : %s", [w['text'] for w in search_range])
+
+        if field.concat:
+            concat_until = field.concat_until_lower
             texts = []
             for w in search_range:
                 if w is anchor_word:
                     continue
-                if concat_until and concat_until.lower() in w['text'].lower():
+                if concat_until and concat_until in w['text'].lower():
                     break
                 if match_and_collect(w):
                     texts.append(w['text'])
             if texts:
-                value = " ".join(texts)
-                print(f"➡️ Valeur extraite (fallback concat) : {value}")
-                return value
+                logger.debug("➡️ Valeur extraite par le fallback concat")
+                return " ".join(texts)
         else:
             for w in search_range:
-                match = re.search(regex, w['text'])
+                match = regex.search(w['text'])
                 if match:
-                    value = match.group(0)
-                    print(f"➡️ Valeur extraite (fallback regex) : {value}")
-                    return value
+                    logger.debug("➡️ Valeur extraite par le fallback regex")
+                    return match.group(0)
 
         return None
 
-    anchor_word = find_anchor_word()
-    if not anchor_word:
-        print("⚠️ Aucun mot d'ancrage trouvé → champ ignoré")
+    anchor_index = find_anchor_word()
+    if anchor_index is None:
+        logger.info("⚠️ %s : aucun mot d'ancrage trouvé → champ ignoré", field.name,
+                    extra={"trace": {"event": "ancre_absente", "champ": field.name}})
         return None
 
-    raw_value = extract_by_direction(anchor_word)
+    raw_value = extract_by_direction(anchor_index)
     if raw_value is not None:
-        return normalize_value(field_name, raw_value, normalisation)
+        logger.info("✅ %s : %s", field.name, raw_value, extra={"trace": {"event": "champ", "champ": field.name, "valeur": raw_value}})
+        return normalize_field_value(field, raw_value)
 
-    print("❌ Aucune valeur extraite")
+    logger.info("❌ %s : aucune valeur extraite", field.name, extra={"trace": {"event": "champ_vide", "champ": field.name}})
     return None
 
-def extract_tokens_by_column_regex(line_text, columns_order, columns_regex, separator="!"):
-    print("\n🔍 Ligne originale reçue :", repr(line_text))
+def extract_tokens_by_column_regex(line_text, columns_regex, separator="!"):
+    """
+    columns_regex : tuples (colonne, regex compilée ou None) dans l'ordre
+    des colonnes (TransactionPlan.columns_regex).
+    """
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("🔍 Ligne originale reçue : %r", line_text)
     tokens = []
     remaining = line_text
 
-    for idx, col_name in enumerate(columns_order):
-        pattern = columns_regex.get(col_name)
+    for idx, (col_name, pattern) in enumerate(columns_regex):
 
         # 🔁 Si pas de regex définie pour cette colonne → on split le reste
         if not pattern:
-            print(f"\n✂️ Aucune regex pour colonne '{col_name}' → split brut par '{separator}'")
+            if debug:
+                logger.debug("✂️ Aucune regex pour colonne '%s' → split brut par '%s'", col_name, separator)
             rest_parts = [p.strip() for p in remaining.strip().split(separator) if p.strip()]
-            expected_rest = len(columns_order) - len(tokens)
+            expected_rest = len(columns_regex) - len(tokens)
 
             if len(rest_parts) < expected_rest:
-                print(f"❌ Trop peu de champs restants après split brut ({len(rest_parts)} vs {expected_rest})")
+                if debug:
+                    logger.debug("❌ Trop peu de champs restants après split brut (%d vs %d)", len(rest_parts), expected_rest)
                 return None
 
             tokens.extend(rest_parts[:expected_rest])
-            print(f"✅ Tokens finaux après split brut : {tokens}")
+            if debug:
+                logger.debug("✅ Tokens finaux après split brut : %s", tokens)
             return tokens
 
-        print(f"\n🔎 Recherche pour colonne [{idx}] '{col_name}' avec regex: {pattern}")
+        if debug:
+            logger.debug("🔎 Recherche pour colonne [%d] '%s' avec regex: %s", idx, col_name, pattern.pattern)
         found = False
 
-        for match in re.finditer(pattern, remaining):
+        for match in pattern.finditer(remaining):
             start, end = match.span()
             if match.lastgroup == "val":
                 matched_text = match.group("val")
@@ -294,58 +295,64 @@ def extract_tokens_by_column_regex(line_text, columns_order, columns_regex, sepa
             
             # ✅ Si le caractère juste avant le match est suspect (ex: '1', 'I', 'l'), on ignore ce caractère
             if start > 0 and remaining[start - 1] in "1Il!":
-                print(f"⚠️ Correction OCR probable (caractère suspect avant match) → on garde : '{matched_text}' (index {start})")
+                if debug:
+                    logger.debug("⚠️ Correction OCR probable (caractère suspect avant match) → on garde : '%s' (index %d)", matched_text, start)
                 tokens.append(matched_text)
                 remaining = remaining[end:].strip()
                 found = True
                 break
 
             # ✅ Match normal
-            print(f"✅ Trouvé: '{matched_text}'")
+            if debug:
+                logger.debug("✅ Trouvé: '%s'", matched_text)
             tokens.append(matched_text)
             remaining = remaining[end:].strip()
             found = True
             break
 
         if not found:
-            print(f"❌ Aucune correspondance pour la colonne '{col_name}' → ligne rejetée")
+            if debug:
+                logger.debug("❌ Aucune correspondance pour la colonne '%s' → ligne rejetée", col_name)
             return {"status": "error", "reason": f"Échec sur colonne '{col_name}'", "line": line_text}
 
 
-        print(f"✂️ Texte restant: {repr(remaining)}")
+        if debug:
+            logger.debug("✂️ Texte restant: %r", remaining)
 
-    print("\n✅ Tous les tokens extraits avec succès :", tokens)
+    if debug:
+        logger.debug("✅ Tous les tokens extraits avec succès : %s", tokens)
     return {"status": "success", "tokens": tokens}
 
-def extract_transactions_with_separator(words, transaction_conf, normalisation):
-    print("\n📄 Début extraction des transactions (mode with_separator)")
-
-    separator = transaction_conf.get("separator", "!")
-    columns_order = transaction_conf.get("columns_order", [])
-    columns_regex = transaction_conf.get("columns_regex", {})
-    x_min = transaction_conf.get("start_line_x_min")
-    x_max = transaction_conf.get("start_line_x_max")
-    y_min = transaction_conf.get("start_line_y_min")
-    y_max = transaction_conf.get("start_line_y_max")
-    y_tolerance = transaction_conf.get("y_tolerance", 5)
-    start_line_regex = re.compile(transaction_conf.get("start_line_regex"))
+def extract_transactions_with_separator(store, tx):
+    logger.info("📄 Début extraction des transactions (mode with_separator)")
+    debug = logger.isEnabledFor(logging.DEBUG)
+
+    separator = tx.separator
+    columns_order = tx.columns_order
+    x_min = tx.start_line_x_min
+    x_max = tx.start_line_x_max
+    y_min = tx.start_line_y_min
+    y_max = tx.start_line_y_max
+    y_tolerance = tx.y_tolerance
+    start_line_regex = tx.start_line_regex
+
+    # Débuts de ligne candidats (bornes + regex) calculés sur les colonnes, dans l'ordre (page, y, x)
+    x, y = store.columns["x"], store.columns["y"]
+    candidats = store.regex_mask(start_line_regex)
+    if x_min is not None:
+        candidats &= x >= x_min
+    if x_max is not None:
+        candidats &= x <= x_max
+    if y_min is not None:
+        candidats &= y >= y_min
+    if y_max is not None:
+        candidats &= y <= y_max
+    ordre = store.sorted_order()
 
-    sorted_words = sorted(words, key=lambda w: (w["page"], w["y"], w["x"]))
     transactions = []
     visited_lines = set()
     lignes_exclues = []
-    for word in sorted_words:
-        if x_min is not None and word["x"] < x_min:
-            continue
-        if x_max is not None and word["x"] > x_max:
-            continue
-        if y_min is not None and word["y"] < y_min:
-            continue
-        if y_max is not None and word["y"] > y_max:
-            continue
-        if not start_line_regex.search(word["text"]):
-            continue
-
+    for word in store.words(ordre[candidats[ordre]]):
         page = word["page"]
         anchor_y = word["y"]
         line_key = (page, anchor_y)
@@ -355,20 +362,20 @@ def extract_transactions_with_separator(words, transaction_conf, normalisation):
 
         y_band_min = anchor_y - y_tolerance
         y_band_max = anchor_y + y_tolerance
-        line_words = [
-            w for w in sorted_words
-            if w["page"] == page and y_band_min <= w["y"] <= y_band_max
-        ]
+        line_words = store.words(store.band_indices(page, y_band_min, y_band_max))
 
         line_words_sorted = sorted(line_words, key=lambda w: w["x"])
         line_text = " ".join(w["text"] for w in line_words_sorted)
 
-        print(f"\n📞 Ligne détectée brute (p{page} y={anchor_y}) : {line_text}")
+        if debug:
+            logger.debug("📞 Ligne détectée brute (p%s y=%s) : %s", page, anchor_y, line_text)
 
         # 👉 Appel à ta fonction existante
-        result = extract_tokens_by_column_regex(line_text, columns_order, columns_regex, separator)
+        result = extract_tokens_by_column_regex(line_text, tx.columns_regex, separator)
         if result["status"] != "success":
-            print(f"⚠️ Ligne ignorée : {result['reason']}")
+            if debug:
+                logger.debug("⚠️ Ligne ignorée : %s", result['reason'],
+                             extra={"trace": {"event": "ligne_exclue", "page": page, "y": anchor_y, "texte": line_text, "raison": result['reason']}})
             lignes_exclues.append({
                 "page": page,
                 "y": anchor_y,
@@ -379,7 +386,9 @@ def extract_transactions_with_separator(words, transaction_conf, normalisation):
 
         tokens = result["tokens"]
         if len(tokens) != len(columns_order):
-            print(f"⚠️ Ligne ignorée : nombre de champs incorrect ({len(tokens)} vs {len(columns_order)})")
+            if debug:
+                logger.debug("⚠️ Ligne ignorée : nombre de champs incorrect (%d vs %d)", len(tokens), len(columns_order),
+                             extra={"trace": {"event": "ligne_exclue", "page": page, "y": anchor_y, "texte": line_text, "raison": "Nombre de champs incorrect"}})
             lignes_exclues.append({
                 "page": page,
                 "y": anchor_y,
@@ -389,35 +398,131 @@ def extract_transactions_with_separator(words, transaction_conf, normalisation):
             continue
 
         transaction = {col_name: tokens[i] for i, col_name in enumerate(columns_order)}
-        print(f"✅ Transaction extraite : {transaction}")
+        if debug:
+            logger.debug("✅ Transaction extraite : %s", transaction,
+                         extra={"trace": {"event": "transaction", "page": page, "y": anchor_y, "transaction": transaction}})
         transactions.append(transaction)
 
-    print(f"\n✅ Total transactions extraites (with_separator): {len(transactions)}")
-    print(f"❌ Total lignes exclues : {len(lignes_exclues)}")
+    logger.info("✅ Total transactions extraites (with_separator): %d", len(transactions))
+    logger.info("❌ Total lignes exclues : %d", len(lignes_exclues))
     return {
         "transactions": transactions,
         "lignes_exclues": lignes_exclues
     }
 
-def extract_transactions(words, transaction_conf, normalisation):
-    print("\n📄 Début extraction des transactions")
-    
-    if transaction_conf.get("mode") == "with_separator":
-        return extract_transactions_with_separator(words, transaction_conf, normalisation)
-
-    columns = transaction_conf['columns']
-    start_line_regex = re.compile(transaction_conf['start_line_regex'])
-    start_line_x_max = transaction_conf.get('start_line_x_max', None)
-    start_line_x_min = transaction_conf.get('start_line_x_min', None)
-    start_line_y_min_raw = transaction_conf.get('start_line_y_min', None)  # <- changé
-    start_line_y_max = transaction_conf.get('start_line_y_max', None)
-    y_tol_above = transaction_conf.get('y_tolerance_above', 5)
-    y_tol_below = transaction_conf.get('y_tolerance_below', 10)
-
-    print(f"🔍 Regex de départ : {transaction_conf['start_line_regex']}")
-    print(f"🔍 Nombre total de mots dans le document : {len(words)}")
+def extract_transactions_from_grid(grid, tx):
+    """
+    Transactions d'un tableau réglé déjà découpé en cellules (voir
+    table_cropper.detect_grid) : grid = {"page", "rows": [{"y", "cells"}]}.
+    La colonne i de la grille est columns_order[i] : aucune reconstruction
+    par x_min/x_max ni par séparateur. Une rangée dont la première cellule
+    vérifie start_line_regex ouvre une transaction ; une rangée dont la
+    première cellule est vide complète la précédente (libellé sur plusieurs
+    lignes) ; les autres (en-têtes, totaux) sont exclues. columns_regex,
+    s'il est défini pour une colonne, extrait la valeur de la cellule.
+    """
+    logger.info("📄 Début extraction des transactions (mode grid)")
+    debug = logger.isEnabledFor(logging.DEBUG)
+    columns_order = tx.columns_order
+    page = grid.get("page")
+
+    transactions = []
+    lignes_exclues = []
+    current_transaction = None
+    for row in grid.get("rows", []):
+        cells = [c.strip() for c in row["cells"]]
+        if not any(cells):
+            continue
+        line_text = " | ".join(cells)
+        raison = None
+
+        if len(cells) < len(columns_order):
+            raison = "Nombre de colonnes incorrect"
+        elif not cells[0]:
+            if current_transaction is None:
+                raison = "Suite de ligne sans transaction"
+            else:
+                for col_name, cell in zip(columns_order, cells):
+                    if cell:
+                        current_transaction[col_name] = (current_transaction[col_name] + " " + cell).strip()
+                if debug:
+                    logger.debug("  ➕ Suite de ligne : %s", line_text)
+                continue
+        elif not tx.start_line_regex.search(cells[0]):
+            raison = "Première cellule hors start_line_regex"
+
+        if raison is None:
+            transaction = {}
+            for (col_name, pattern), cell in zip(tx.columns_regex, cells):
+                if pattern is None:
+                    transaction[col_name] = cell
+                    continue
+                match = pattern.search(cell)
+                if not match:
+                    raison = f"Échec sur colonne '{col_name}'"
+                    break
+                transaction[col_name] = match.group(1) if match.lastindex else match.group()
+
+        if raison is not None:
+            if debug:
+                logger.debug("⚠️ Ligne ignorée : %s", raison,
+                             extra={"trace": {"event": "ligne_exclue", "page": page, "y": row.get("y"), "texte": line_text, "raison": raison}})
+            lignes_exclues.append({"page": page, "y": row.get("y"), "texte": line_text, "raison": raison})
+            # Les suites de ligne qui viennent après une rangée exclue ne complètent rien
+            current_transaction = None
+            continue
+
+        if debug:
+            logger.debug("✅ Transaction extraite : %s", transaction,
+                         extra={"trace": {"event": "transaction", "page": page, "y": row.get("y"), "transaction": transaction}})
+        transactions.append(transaction)
+        current_transaction = transaction
+
+    logger.info("✅ Total transactions extraites (grid): %d", len(transactions))
+    logger.info("❌ Total lignes exclues : %d", len(lignes_exclues))
+    return {
+        "transactions": transactions,
+        "lignes_exclues": lignes_exclues
+    }
+
+def extract_transactions(store, tx):
+    """
+    store : WordStore des mots à analyser (document ou tableau).
+    tx : TransactionPlan (voir parsing_plan.compile_transactions).
+    """
+    logger.info("📄 Début extraction des transactions")
     
-    sorted_words = sorted(words, key=lambda w: (w['page'], w['y'], w['x']))
+    if tx.mode == "with_separator":
+        return extract_transactions_with_separator(store, tx)
+
+    columns = tx.columns
+    start_line_regex = tx.start_line_regex
+    start_line_x_max = tx.start_line_x_max
+    start_line_x_min = tx.start_line_x_min
+    start_line_y_max = tx.start_line_y_max
+    y_tol_above = tx.y_tol_above
+    y_tol_below = tx.y_tol_below
+
+    debug = logger.isEnabledFor(logging.DEBUG)
+    logger.debug("🔍 Regex de départ : %s", start_line_regex.pattern)
+    logger.debug("🔍 Nombre total de mots dans le document : %d", len(store))
+
+    # Mots qui peuvent ouvrir une transaction (regex + bornes, start_line_y_min par page),
+    # calculés sur les colonnes : seuls ceux-là sont parcourus, dans l'ordre (page, y, x)
+    x, y, pages = store.columns["x"], store.columns["y"], store.columns["page"]
+    candidats = store.regex_mask(start_line_regex)
+    if start_line_x_max is not None:
+        candidats &= x <= start_line_x_max
+    if start_line_x_min is not None:
+        candidats &= x >= start_line_x_min
+    if start_line_y_max is not None:
+        candidats &= y <= start_line_y_max
+    for page in np.unique(pages).tolist():
+        start_line_y_min = tx.start_line_y_min_for(page)
+        if start_line_y_min is not None:
+            candidats &= (pages != page) | (y >= start_line_y_min)
+    ordre = store.sorted_order()
+
     transactions = []
     anchor_y = None
     current_transaction = None
@@ -425,35 +530,21 @@ def extract_transactions(words, transaction_conf, normalisation):
     last_anchor_y = None
     last_anchor_page = None
 
-    for i, word in enumerate(sorted_words):
+    for word in store.words(ordre[candidats[ordre]]):
         # Empêche de détecter deux transactions sur la même ligne OCR
         if last_anchor_y is not None and abs(word['y'] - last_anchor_y) < 5 and word['page'] == last_anchor_page:
             continue
 
-        # Gestion de start_line_y_min par page
         page = word['page']
-        if isinstance(start_line_y_min_raw, dict):
-            start_line_y_min = start_line_y_min_raw.get(page, start_line_y_min_raw.get("default"))
-        else:
-            start_line_y_min = start_line_y_min_raw
-
         text = word['text']
-        is_start_line_candidate = (
-            start_line_regex.search(text) and
-            (start_line_x_max is None or word['x'] <= start_line_x_max) and
-            (start_line_x_min is None or word['x'] >= start_line_x_min) and
-            (start_line_y_min is None or word['y'] >= start_line_y_min) and
-            (start_line_y_max is None or word['y'] <= start_line_y_max)
-        )
-
-        if not is_start_line_candidate:
-            continue
 
         # Nouvelle transaction détectée
         anchor_y = word['y']
-        current_transaction = {col: "" for col in columns}
+        current_transaction = {col.name: "" for col in columns}
         transactions.append(current_transaction)
-        print(f"\n🧾 Nouvelle transaction détectée : {text} (y = {anchor_y})")
+        if debug:
+            logger.debug("🧾 Nouvelle transaction détectée : %s (y = %s)", text, anchor_y,
+                         extra={"trace": {"event": "transaction", "page": page, "y": anchor_y, "ancre": text}})
 
         last_anchor_y = word['y']
         last_anchor_page = word['page']
@@ -463,25 +554,23 @@ def extract_transactions(words, transaction_conf, normalisation):
         y_max = anchor_y + y_tol_below
 
         # On récupère les mots dans la bande verticale définie
-        line_words = [
-            w for w in sorted_words
-            if w['page'] == page and y_min <= w['y'] <= y_max
-        ]
+        line_words = store.words(store.band_indices(page, y_min, y_max))
 
         # Et on les trie de gauche à droite
         line_words = sorted(line_words, key=lambda w: w['x'])
 
         for w in line_words:
-            for col_name, col_conf in columns.items():
+            for col in columns:
                 if (
-                    col_conf['x_min'] <= w['x'] <= col_conf['x_max']
-                    and ('y_min' not in col_conf or w['y'] >= col_conf['y_min'])
-                    and ('y_max' not in col_conf or w['y'] <= col_conf['y_max'])
+                    col.x_min <= w['x'] <= col.x_max
+                    and (col.y_min is None or w['y'] >= col.y_min)
+                    and (col.y_max is None or w['y'] <= col.y_max)
                 ):
-                    if 'regex' in col_conf and not re.search(col_conf['regex'], w['text']):
+                    if col.regex is not None and not col.regex.search(w['text']):
                         continue
-                    current_transaction[col_name] += " " + w['text']
-                    print(f"  ➕ {w['text']} → {col_name}")
+                    current_transaction[col.name] += " " + w['text']
+                    if debug:
+                        logger.debug("  ➕ %s → %s", w['text'], col.name)
                     break
 
     # Nettoyage des champs
@@ -489,7 +578,7 @@ def extract_transactions(words, transaction_conf, normalisation):
         for k, v in tx.items():
             tx[k] = v.strip()
 
-    print(f"\n✅ Total transactions extraites : {len(transactions)}")
+    logger.info("✅ Total transactions extraites : %d", len(transactions))
     return {
         "transactions": transactions,
         "lignes_exclues": []
@@ -500,31 +589,25 @@ def natural_sort_key(s):
     return [int(text) if text.isdigit() else text.lower() for text in re.split(r'(\d+)', s)]
 
 
-def find_matching_tables_sorted(ocr_dir, base_prefix, filter_all=None, filter_any=None):
+def is_grid(data):
+    """Grille de cellules (voir extract_transactions_from_grid) plutôt que mots OCR."""
+    return isinstance(data, dict) and "rows" in data
+
+def table_text(data):
+    if is_grid(data):
+        return " ".join(cell for row in data["rows"] for cell in row["cells"])
+    return " ".join(as_word_store(data).texts())
+
+def filter_tables_sorted(tables, filter_all=None, filter_any=None):
     """
-    Retourne la liste triée de tuples (filename, data) des tableaux OCR 
-    contenant tous les mots de filter_all et/ou au moins un mot de filter_any.
+    Filtre une liste de tuples (nom, data) de tableaux OCR selon filter_all /
+    filter_any, puis la trie par nom (tri naturel). data : JSON OCR (liste
+    de pages), WordStore ou grille de cellules.
     """
     matched = []
 
-    for fname in os.listdir(ocr_dir):
-        if not fname.endswith(".json"):
-            continue
-        if "_p" not in fname or "_tab" not in fname:
-            continue
-        if not fname.startswith(base_prefix):
-            continue
-
-        path = os.path.join(ocr_dir, fname)
-        data = load_ocr_json(path)
-
-        full_text = " ".join(
-            w['text']
-            for page in data
-            for block in page.get('blocks', [])
-            for line in block.get('lines', [])
-            for w in line.get('words', [])
-        ).lower()
+    for fname, data in tables:
+        full_text = table_text(data).lower()
 
         if filter_all and not all(word.lower() in full_text for word in filter_all):
             continue
@@ -534,59 +617,102 @@ def find_matching_tables_sorted(ocr_dir, base_prefix, filter_all=None, filter_an
         matched.append((fname, data))
 
     if not matched:
-        print("⚠️ Aucun tableau OCR ne correspond aux filtres")
+        logger.warning("⚠️ Aucun tableau OCR ne correspond aux filtres")
         return []
 
     # 🔤 Tri naturel (alphanumérique)
     matched_sorted = sorted(matched, key=lambda x: natural_sort_key(x[0]))
 
-    print(f"✅ {len(matched_sorted)} tableau(x) retenu(s) après filtre et tri naturel.")
+    logger.info("✅ %d tableau(x) retenu(s) après filtre et tri naturel.", len(matched_sorted))
     for fname, _ in matched_sorted:
-        print(f"  ➕ {fname}")
+        logger.debug("  ➕ %s", fname)
 
     return matched_sorted
 
-def parse_document(ocr_json, yaml_config, ocr_json_path):
+
+def find_matching_tables_sorted(ocr_dir, base_prefix, filter_all=None, filter_any=None, grid=False):
+    """
+    Retourne la liste triée de tuples (filename, WordStore) des tableaux OCR 
+    contenant tous les mots de filter_all et/ou au moins un mot de filter_any.
+    grid : lire les grilles de cellules (<tableau>.grid.json) à la place.
+
+    Les tableaux sont choisis par l'index du dossier (voir table_index) : seuls
+    les fichiers retenus sont chargés. Sans index à jour pour ce document, le
+    dossier est parcouru comme avant et l'index complété au passage.
+    """
+    indexes = query_tables(ocr_dir, base_prefix, filter_all, filter_any, grid=grid)
+    if indexes is not None:
+        logger.info("✅ %d tableau(x) retenu(s) via l'index.", len(indexes))
+        return [
+            (fname, load_ocr_json(os.path.join(ocr_dir, fname)) if grid else load_ocr_words(os.path.join(ocr_dir, fname)))
+            for fname in indexes
+        ]
+
+    tables = []
+
+    for fname in os.listdir(ocr_dir):
+        if not fname.endswith(".json"):
+            continue
+        if "_p" not in fname or "_tab" not in fname:
+            continue
+        if not fname.startswith(base_prefix):
+            continue
+        if fname.endswith(".grid.json") != grid:
+            continue
+
+        path = os.path.join(ocr_dir, fname)
+        data = load_ocr_json(path) if grid else load_ocr_words(path)
+        tables.append((fname, data))
+        parsed = parse_table_name(fname)
+        if parsed and parsed[0] == base_prefix:
+            record_table(path, table_text(data))
+
+    return filter_tables_sorted(tables, filter_all, filter_any)
+
+def parse_document(ocr_json, yaml_config, ocr_json_path, tables=None, ocr_dir=DEFAULT_OCR_DIR):
+    """
+    ocr_json : JSON OCR déjà chargé (liste de pages) ou WordStore (voir
+    load_ocr_words), interrogé en colonnes sans un dict par mot.
+    yaml_config : ParsingPlan déjà compilé (voir parsing_plan.load_plan) ou
+    config YAML brute, compilée à la volée.
+    tables : liste optionnelle de tuples (nom, data) de tableaux OCR déjà en
+    mémoire. Si absente, les tableaux sont relus depuis ocr_dir (dossier OCR
+    du job, sinon data/ocr), dont l'index tables.sqlite est mis à jour.
+    """
+    plan = yaml_config if isinstance(yaml_config, ParsingPlan) else compile_plan(yaml_config)
     output = {}
 
-    all_words = []
-    for page in ocr_json:
-        for block in page.get('blocks', []):
-            for line in block.get('lines', []):
-                all_words.extend(line.get('words', []))
-
-    structure = yaml_config.get('structure', {})
-    normalisation = yaml_config.get('normalisation', {})
-
-    champs_simples = structure.get('champs_simples', {})
-    for field_name, field_conf in champs_simples.items():
-        output[field_name] = extract_field(all_words, field_name, field_conf, normalisation)
-
-    transactions_conf = structure.get('transactions')
-    if transactions_conf:
-        source = transactions_conf.get('source', 'document')
-        if source == 'table':
-            base_prefix = os.path.splitext(os.path.basename(ocr_json_path))[0]
-            ocr_table_data = find_matching_tables_sorted(
-                ocr_dir="data/ocr",
-                base_prefix=base_prefix,
-                filter_all=transactions_conf.get('filter_contains'),
-                filter_any=transactions_conf.get('filter_contains_any')
-            )
+    # Mots en colonnes, construits une seule fois pour tous les champs simples
+    store = as_word_store(ocr_json)
+
+    for field in plan.fields:
+        output[field.name] = extract_field(store, field)
+
+    tx = plan.transactions
+    if tx:
+        if tx.source == 'table':
+            if tables is not None:
+                ocr_table_data = filter_tables_sorted(tables, filter_all=tx.filter_all, filter_any=tx.filter_any)
+            else:
+                base_prefix = os.path.splitext(os.path.basename(ocr_json_path))[0]
+                ocr_table_data = find_matching_tables_sorted(
+                    ocr_dir=ocr_dir,
+                    base_prefix=base_prefix,
+                    filter_all=tx.filter_all,
+                    filter_any=tx.filter_any,
+                    grid=tx.mode == "grid"
+                )
 
             all_transactions = []
             all_excluded = []
             fichiers_tables = []
 
             for fname, data in ocr_table_data:
-                print(f"📄 Analyse du tableau : {fname}")
-                table_words = []
-                for page in data:
-                    for block in page.get('blocks', []):
-                        for line in block.get('lines', []):
-                            table_words.extend(line.get('words', []))
-
-                result = extract_transactions(table_words, transactions_conf, normalisation)
+                logger.info("📄 Analyse du tableau : %s", fname)
+                if is_grid(data):
+                    result = extract_transactions_from_grid(data, tx)
+                else:
+                    result = extract_transactions(as_word_store(data), tx)
                 all_transactions.extend(result.get("transactions", []))
                 all_excluded.extend(result.get("lignes_exclues", []))
                 fichiers_tables.append(fname)
@@ -596,13 +722,14 @@ def parse_document(ocr_json, yaml_config, ocr_json_path):
             output['fichiers_tables'] = fichiers_tables
 
         else:
-            result = extract_transactions(all_words, transactions_conf, normalisation)
+            result = extract_transactions(store, tx)
             output['transactions'] = result.get("transactions", [])
             output['lignes_exclues'] = result.get("lignes_exclues", [])
     else:
         output['transactions'] = []
 
-    print(f"Total transaction extraires : {len(output['transactions'])}, Total transaction exclues : {len(output['lignes_exclues'])}")
+    logger.info("Total transaction extraires : %d, Total transaction exclues : %d",
+                len(output['transactions']), len(output['lignes_exclues']))
     return output
 
 
@@ -611,13 +738,16 @@ if __name__ == "__main__":
     parser.add_argument('--ocr-json', required=True, help='Fichier OCR JSON')
     parser.add_argument('--yaml-config', required=True, help='Fichier YAML de configuration')
     parser.add_argument('--output', required=True, help='Fichier de sortie JSON structuré')
+    parser.add_argument('--ocr-dir', help='Dossier des tableaux OCR (défaut : dossier du fichier --ocr-json)')
+    add_logging_arguments(parser)
 
     args = parser.parse_args()
+    configure_logging(args.log_level, args.trace_file)
 
-    ocr_data = load_ocr_json(args.ocr_json)
-    config = load_yaml(args.yaml_config)
+    ocr_data = load_ocr_words(args.ocr_json)
+    plan = load_plan(args.yaml_config)
 
-    result = parse_document(ocr_data, config, args.ocr_json)
+    result = parse_document(ocr_data, plan, args.ocr_json, ocr_dir=args.ocr_dir or os.path.dirname(args.ocr_json) or ".")
 
 
     os.makedirs(os.path.dirname(args.output), exist_ok=True)
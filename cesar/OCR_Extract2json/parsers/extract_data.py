@@ -1,11 +1,14 @@
 import argparse
 import os
-import subprocess
 import yaml
 from pathlib import Path
-import tempfile
 import json
 
+from pipeline import ExtractionPipeline
+from job_context import JobContext
+from ocr_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_SIZE_MB, OcrCache
+from log_config import add_logging_arguments, configure_logging
+
 def charger_config_yaml(yaml_path):
     with open(yaml_path, 'r', encoding='utf-8') as f:
         return yaml.safe_load(f)
@@ -13,42 +16,10 @@ def charger_config_yaml(yaml_path):
 def construire_nom_base(pdf_path):
     return Path(pdf_path).stem
 
-def lancer_ocr(pdf_path, psm, oem, preprocess=True, preprocessing_params=None):
-    args = ["python3", "parsers/ocr_reader.py", pdf_path, "--psm", str(psm), "--oem", str(oem)]
-    temp_file = None
-
-    if not preprocess:
-        args.append("--no-preprocess")
-    elif preprocessing_params:
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".json", mode='w', encoding='utf-8')
-        json.dump(preprocessing_params, temp_file)
-        temp_file.close()
-        args.extend(["--with-preprocessing-config", temp_file.name])
-
-    try:
-        subprocess.run(args, check=True)
-    finally:
-        if temp_file:
-            os.remove(temp_file.name)
-
-def lancer_crop_tables(pdf_path, preprocess=True):
-    args = ["python3", "parsers/table_cropper.py", pdf_path]
-    if not preprocess:
-        args.append("--no-preprocess")
-    subprocess.run(args, check=True)
-
-def trouver_tableaux_detectes(nom_base):
-    dossier_tables = Path("data/tables_detected")
-    return sorted([str(p) for p in dossier_tables.glob(f"{nom_base}_p*_tab*.pdf")])
-
-def lancer_parsing(ocr_json_path, yaml_path, output_path):
-    args = [
-        "python3", "parsers/document_parser.py",
-        "--ocr-json", ocr_json_path,
-        "--yaml-config", yaml_path,
-        "--output", output_path
-    ]
-    subprocess.run(args, check=True)
+def ecrire_resultat(result, output_path):
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
 
 
 def main():
@@ -58,7 +29,15 @@ def main():
     parser.add_argument("--pdf", required=True, help="Chemin vers le fichier PDF")
     parser.add_argument("--config", required=True, help="Fichier de configuration YAML")
     parser.add_argument("--output", required=False, help="Chemin de sortie du fichier JSON")
+    parser.add_argument("--no-cache", action="store_true", help="Ne pas utiliser le cache OCR")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Dossier du cache OCR")
+    dossiers = parser.add_mutually_exclusive_group()
+    dossiers.add_argument("--job-dir", help="Dossier de travail de cette extraction : JSON OCR, tableaux et PDF annoté (défaut : dossier unique sous data/jobs)")
+    dossiers.add_argument("--shared-dirs", action="store_true", help="Écrire JSON OCR, tableaux et PDF annoté dans les dossiers partagés data/ocr et data/ocr_visualization")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_SIZE_MB, help="Taille maximale du cache OCR (Mo)")
+    add_logging_arguments(parser)
     args = parser.parse_args()
+    configure_logging(args.log_level, args.trace_file)
 
     config = charger_config_yaml(args.config)
     nom_base = construire_nom_base(args.pdf)
@@ -66,51 +45,20 @@ def main():
     print(f"📄 Fichier PDF : {args.pdf}")
     print(f"⚙️ Fichier de configuration : {args.config}")
 
-    preprocess_pdf_flag = config.get("preprocess_pdf", False)
-    preprocess_tables_flag = config.get("preprocess_tables", False)
-    crop_tables = config.get("crop_tables", False)
-    preprocessing_params = config.get("preprocessing_params")
-
-    ocr_pdf_config = config.get("ocr", {}).get("pdf", {})
-    psm_pdf = ocr_pdf_config.get("psm", 3)
-    oem_pdf = ocr_pdf_config.get("oem", 3)
-
-    ocr_tables_config = config.get("ocr", {}).get("tables", {})
-    psm_tables = ocr_tables_config.get("psm", 3)
-    oem_tables = ocr_tables_config.get("oem", 3)
-
-    print("🔍 Lancement de l'OCR sur le PDF complet...")
-    lancer_ocr(
-        args.pdf,
-        psm=psm_pdf,
-        oem=oem_pdf,
-        preprocess=preprocess_pdf_flag,
-        preprocessing_params=preprocessing_params
-    )
-
-    if crop_tables:
-        print("✂️ Découpage des tableaux...")
-        lancer_crop_tables(args.pdf, preprocess=preprocess_pdf_flag)
-
-        tableaux = trouver_tableaux_detectes(nom_base)
-        print(f"📁 {len(tableaux)} tableau(x) trouvé(s)")
-        for tab_path in tableaux:
-            print(f"🔍 OCR sur le tableau : {tab_path}")
-            lancer_ocr(
-                tab_path,
-                psm=psm_tables,
-                oem=oem_tables,
-                preprocess=preprocess_tables_flag,
-                preprocessing_params=preprocessing_params
-            )
-
-    ocr_json_principal = f"data/ocr/{nom_base}.json"
+    cache = None if args.no_cache else OcrCache(args.cache_dir, max_size_mb=args.cache_max_mb)
+    # Par défaut un dossier par exécution : deux PDF de même nom traités en même temps ne s'écrasent pas
+    if args.shared_dirs:
+        job = None
+    else:
+        job = JobContext(path=args.job_dir) if args.job_dir else JobContext(prefix=nom_base, keep=True)
+        print(f"📁 Dossier de travail : {job.dir}")
+    with ExtractionPipeline(config, config_path=args.config, cache=cache) as pipeline:
+        result = pipeline.run(args.pdf, job=job)
 
     # 🔄 Gère la sortie personnalisée si elle est spécifiée
     output_path = args.output if args.output else f"data/output/{nom_base}_structured.json"
 
-    print(f"🧬 Parsing des données OCR vers fichier structuré...")
-    lancer_parsing(ocr_json_principal, args.config, output_path)
+    ecrire_resultat(result, output_path)
     print(f"✅ Extraction terminée → {output_path}")
 
 if __name__ == "__main__":
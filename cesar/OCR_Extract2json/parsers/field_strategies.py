@@ -0,0 +1,88 @@
+"""
+Stratégies de recherche des champs simples, une par valeur de `direction`.
+
+Chaque stratégie reçoit le FieldPlan du champ, le mot d'ancrage et le
+WordStore du document, et retourne les mots candidats (avant regex) dans
+l'ordre de lecture OCR. Le filtrage par bornes/regex et la concaténation
+sont communs et restent dans document_parser.extract_field.
+"""
+import logging
+
+logger = logging.getLogger("field_strategies")
+
+
+def candidates_right_xy(field, anchor_word, index):
+    anchor_x = anchor_word['x']
+    anchor_y = anchor_word['y']
+    candidates = [
+        w for w in index.query(anchor_word['page'], x_min=anchor_x + field.tol_x,
+                               y_min=anchor_y - field.tol_y, y_max=anchor_y + field.tol_y)
+        if w['x'] > anchor_x + field.tol_x and
+           abs(w['y'] - anchor_y) < field.tol_y
+    ]
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🔎 %d mots candidats trouvés (avant regex): %s", len(candidates), [w['text'] for w in candidates])
+    return candidates
+
+
+def candidates_line_right(field, anchor_word, index):
+    anchor_x = anchor_word['x']
+    anchor_line = anchor_word['line_num']
+    candidates = [
+        w for w in index.query(anchor_word['page'], x_min=anchor_x)
+        if w['line_num'] == anchor_line and
+           w['x'] > anchor_x
+    ]
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🔎 %d mots candidats trouvés (avant regex): %s", len(candidates), [w['text'] for w in candidates])
+    return candidates
+
+
+def candidates_nearby_xy(field, anchor_word, index):
+    anchor_x = anchor_word['x']
+    anchor_y = anchor_word['y']
+    candidates = [
+        w for w in index.query(anchor_word['page'], x_min=anchor_x - field.tol_x, x_max=anchor_x + field.tol_x,
+                               y_min=anchor_y - field.tol_y, y_max=anchor_y + field.tol_y)
+        if abs(w['x'] - anchor_x) <= field.tol_x and
+           abs(w['y'] - anchor_y) <= field.tol_y
+    ]
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🔎 %d mots candidats trouvés (avant regex): %s", len(candidates), [w['text'] for w in candidates])
+    return candidates
+
+
+def candidates_below(field, anchor_word, index):
+    anchor_x = anchor_word['x']
+    anchor_y = anchor_word['y']
+    anchor_page = anchor_word['page']
+    candidates = [
+        w for w in index.query(anchor_page, x_min=field.min_x, x_max=field.max_x,
+                               y_min=anchor_y, y_max=anchor_y + field.tol_y)
+        if w['y'] > anchor_y
+    ]
+    if not logger.isEnabledFor(logging.DEBUG):
+        return candidates
+
+    logger.debug("🔎 %d mots candidats trouvés (en dessous): %s", len(candidates), [w['text'] for w in candidates])
+
+    # 🔍 Log des mots proches en x mais rejetés par y (requête faite seulement en DEBUG)
+    debug_rejected_y = [
+        w for w in index.query(anchor_page, x_min=anchor_x - field.tol_x, x_max=anchor_x + field.tol_x)
+        if abs(w['x'] - anchor_x) <= field.tol_x and
+        not (w['y'] > anchor_y and w['y'] <= anchor_y + field.tol_y)
+    ]
+    for w in debug_rejected_y:
+        logger.debug("❌ %s rejeté (y=%s, anchor_y=%s, tol_y=%s)", w['text'], w['y'], anchor_y, field.tol_y)
+
+    return candidates
+
+
+# Direction YAML → stratégie. Une direction absente (ex. 'right') n'a pas
+# de stratégie : extract_field passe directement au fallback séquentiel.
+DIRECTION_STRATEGIES = {
+    'right_xy': candidates_right_xy,
+    'line_right': candidates_line_right,
+    'nearby_xy': candidates_nearby_xy,
+    'below': candidates_below,
+}
@@ -0,0 +1,96 @@
+"""
+Dossier de travail propre à une extraction.
+
+Chaque JobContext possède un dossier unique (créé par mkdtemp, donc sans
+collision entre processus ni entre deux PDF de même nom) où les étapes
+écrivent leurs fichiers intermédiaires : pages prétraitées, tableaux
+découpés, JSON OCR, PDF annotés. Deux extractions en parallèle sur la
+même machine n'écrivent donc jamais dans les mêmes fichiers.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+DEFAULT_JOBS_DIR = "data/jobs"
+
+# Sous-dossiers utilisés par les étapes
+PREPROCESSED = "preprocessed"
+TABLES = "tables"
+OCR = "ocr"
+VISUALIZATION = "ocr_visualization"
+
+
+class JobContext:
+    """
+    root : dossier sous lequel le dossier du job est créé.
+    prefix : début du nom du dossier (ex. nom du PDF), suivi d'un suffixe unique.
+    path : dossier existant à utiliser tel quel (ex. --job-dir), jamais supprimé.
+    keep : garder le dossier à la sortie du `with` (artefacts à consulter).
+    """
+
+    def __init__(self, root=DEFAULT_JOBS_DIR, prefix="", path=None, keep=False):
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self.dir = path
+            keep = True
+        else:
+            os.makedirs(root, exist_ok=True)
+            self.dir = tempfile.mkdtemp(prefix=f"{prefix}_" if prefix else "", dir=root)
+        self.job_id = os.path.basename(os.path.normpath(self.dir))
+        self.keep = keep
+
+    def subdir(self, name):
+        """Sous-dossier `name` du job, créé au besoin."""
+        path = os.path.join(self.dir, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def path(self, *parts):
+        """Chemin d'un fichier du job ; son dossier parent est créé au besoin."""
+        path = os.path.join(self.dir, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def cleanup(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if not self.keep:
+            self.cleanup()
+        return False
+
+    def __repr__(self):
+        return f"JobContext({self.dir!r})"
+
+
+def _derniere_ecriture(path):
+    """Date de la dernière écriture dans le dossier ou l'un de ses fichiers."""
+    dates = [os.path.getmtime(path)]
+    for dossier, _, fichiers in os.walk(path):
+        dates.extend(os.path.getmtime(os.path.join(dossier, nom)) for nom in fichiers)
+    return max(dates)
+
+
+def purge_jobs(root, max_age_s):
+    """
+    Supprime les dossiers de job de `root` où rien n'a été écrit depuis
+    max_age_s secondes (jobs gardés avec keep=True puis abandonnés).
+    Retourne le nombre de dossiers supprimés.
+    """
+    if not os.path.isdir(root):
+        return 0
+    limite = time.time() - max_age_s
+    supprimes = 0
+    for entree in os.scandir(root):
+        try:
+            if entree.is_dir() and _derniere_ecriture(entree.path) < limite:
+                shutil.rmtree(entree.path, ignore_errors=True)
+                supprimes += 1
+        except OSError:
+            # Dossier supprimé entre-temps par une autre session
+            continue
+    return supprimes
@@ -0,0 +1,80 @@
+import json
+import logging
+import sys
+
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+# Loggers du parsing passés en DEBUG quand une trace est demandée
+TRACED_LOGGERS = ("document_parser", "field_strategies")
+
+# Handlers installés par configure_logging (retirés à chaque reconfiguration)
+_HANDLERS = []
+
+
+class JsonLinesHandler(logging.Handler):
+    """
+    Trace machine : une ligne JSON par enregistrement (horodatage, niveau,
+    logger, message) plus les champs passés via extra={"trace": {...}}
+    (champ, mot, raison du rejet, transaction...). Fichier ouvert en ajout,
+    une écriture par ligne : plusieurs processus peuvent y écrire.
+    """
+
+    def __init__(self, path):
+        super().__init__(level=logging.DEBUG)
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def emit(self, record):
+        try:
+            entry = {
+                "ts": round(record.created, 6),
+                "level": record.levelname,
+                "logger": record.name,
+                "pid": record.process,
+                "message": record.getMessage(),
+            }
+            entry.update(getattr(record, "trace", None) or {})
+            self._file.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            self._file.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        try:
+            self._file.close()
+        finally:
+            super().close()
+
+
+def configure_logging(level="INFO", trace_file=None):
+    """
+    Console (stdout, messages seuls) au niveau demandé ; avec trace_file,
+    les loggers du parsing passent en DEBUG et tout est aussi écrit en JSONL.
+    Sans DEBUG, les boucles du parser ne formatent aucun message.
+    """
+    root = logging.getLogger()
+    for handler in _HANDLERS:
+        root.removeHandler(handler)
+        handler.close()
+    _HANDLERS.clear()
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(level)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    _HANDLERS.append(console)
+
+    if trace_file:
+        _HANDLERS.append(JsonLinesHandler(trace_file))
+
+    for handler in _HANDLERS:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+    for name in TRACED_LOGGERS:
+        logging.getLogger(name).setLevel(logging.DEBUG if trace_file else logging.NOTSET)
+
+
+def add_logging_arguments(parser):
+    parser.add_argument("--log-level", default="INFO", choices=LOG_LEVELS,
+                        help="Niveau de log (DEBUG = détail mot par mot du parsing)")
+    parser.add_argument("--trace-file", help="Trace JSONL du parsing (rejets, tokens, transactions) pour déboguer une config")
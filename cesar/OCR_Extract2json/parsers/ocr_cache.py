@@ -0,0 +1,220 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = "data/cache/ocr"
+DEFAULT_MAX_SIZE_MB = 1024
+
+
+def image_digest(image):
+    """Empreinte SHA-256 des pixels d'une image (PIL ou numpy), forme et type compris."""
+    arr = np.ascontiguousarray(np.asarray(image))
+    h = hashlib.sha256()
+    h.update(f"{arr.shape}|{arr.dtype.str}|".encode())
+    h.update(arr.data)
+    return h.hexdigest()
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class OcrCache:
+    """
+    Cache disque, adressé par contenu, des sorties `image_to_data` par page.
+
+    Clé = SHA-256(empreinte des pixels de la page + config de prétraitement
+    + psm + oem + langue). Les entrées sont des JSON gzip répartis en
+    sous-dossiers ; la date de modification sert d'horodatage LRU et les
+    entrées les plus anciennes sont supprimées dès que la taille dépasse
+    max_size_mb.
+
+    Des alias (empreinte du PDF, page, dpi, moteur) → empreinte d'image
+    permettent de retrouver une page sans la rasteriser à nouveau.
+
+    La taille totale est tenue à jour dans le fichier `taille` du cache
+    (incrémenté à chaque écriture, recalculé exactement par prune) : une
+    écriture ne parcourt jamais le dossier, sauf la toute première sur un
+    cache qui n'a pas encore ce fichier.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(page_digest, preprocessing=None, psm=None, oem=None, lang='fra', regions=None, engine=None,
+                 reocr=None):
+        """
+        regions : bandes OCRisées (OCR par zones), absentes de la clé pour un OCR pleine page.
+        engine : moteur OCR autre que pytesseract (voir ocr_engine), absent de la clé sinon.
+        reocr : réglages de la relecture des lignes peu sûres (voir ocr_refine), si activée.
+        """
+        params = {"preprocessing": preprocessing, "psm": psm, "oem": oem, "lang": lang}
+        if regions is not None:
+            params["regions"] = regions
+        if engine is not None:
+            params["engine"] = engine
+        if reocr is not None:
+            params["reocr"] = reocr
+        params = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(f"{page_digest}|{params}".encode()).hexdigest()
+
+    def _path(self, kind, key):
+        return os.path.join(self.cache_dir, kind, key[:2], f"{key}.json.gz")
+
+    def _read(self, path):
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        try:
+            os.utime(path)  # LRU : l'entrée devient la plus récente
+        except OSError:
+            pass
+        return data
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Écriture atomique : un lecteur concurrent ne voit jamais un fichier partiel
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        taille = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        return taille
+
+    def get(self, key):
+        data = self._read(self._path("pages", key))
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def _taille_path(self):
+        return os.path.join(self.cache_dir, "taille")
+
+    def _lire_taille(self):
+        try:
+            with open(self._taille_path(), 'r', encoding='utf-8') as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _ecrire_taille(self, total):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(str(total))
+        os.replace(tmp_path, self._taille_path())
+
+    def put(self, key, ocr_data):
+        taille = self._write(self._path("pages", key), ocr_data)
+        # Total partagé entre processus : deux écritures simultanées peuvent
+        # en perdre une, la prochaine purge remet le compte exact
+        with self._lock:
+            total = self._lire_taille()
+            if total is not None:
+                total += taille
+                self._ecrire_taille(total)
+        if total is None or total > self.max_bytes:
+            self.prune()
+
+    def get_alias(self, pdf_digest, page_index, dpi, engine):
+        data = self._read(self._path("alias", self._alias_key(pdf_digest, page_index, dpi, engine)))
+        return data.get("page_digest") if data else None
+
+    def set_alias(self, pdf_digest, page_index, dpi, engine, page_digest):
+        self._write(self._path("alias", self._alias_key(pdf_digest, page_index, dpi, engine)), {"page_digest": page_digest})
+
+    @staticmethod
+    def _alias_key(pdf_digest, page_index, dpi, engine):
+        return hashlib.sha256(f"{pdf_digest}|{page_index}|{dpi}|{engine}".encode()).hexdigest()
+
+    def entries(self):
+        """Liste des entrées (chemin, taille, date d'accès) triées de la plus ancienne à la plus récente."""
+        result = []
+        for root, _, files in os.walk(self.cache_dir):
+            for fname in files:
+                if not fname.endswith(".json.gz"):
+                    continue
+                path = os.path.join(root, fname)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                result.append((path, st.st_size, st.st_mtime))
+        result.sort(key=lambda e: e[2])
+        return result
+
+    def stats(self):
+        entries = self.entries()
+        pages = [e for e in entries if os.sep + "pages" + os.sep in e[0]]
+        total = sum(e[1] for e in entries)
+        return {
+            "cache_dir": self.cache_dir,
+            "entrees_pages": len(pages),
+            "entrees_alias": len(entries) - len(pages),
+            "taille_mb": round(total / (1024 * 1024), 2),
+            "taille_max_mb": round(self.max_bytes / (1024 * 1024), 2),
+            "plus_ancienne": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entries[0][2])) if entries else None,
+            "plus_recente": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entries[-1][2])) if entries else None,
+        }
+
+    def prune(self, max_bytes=None):
+        """Supprime les entrées les moins récemment utilisées jusqu'à passer sous max_bytes."""
+        limite = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        supprimees = 0
+        for path, taille, _ in entries:
+            if total <= limite:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= taille
+            supprimees += 1
+        with self._lock:
+            self._ecrire_taille(total)
+        return supprimees
+
+    def clear(self):
+        return self.prune(max_bytes=0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspecter ou purger le cache OCR")
+    parser.add_argument("action", choices=["stats", "list", "prune", "clear"])
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Dossier du cache OCR")
+    parser.add_argument("--max-size-mb", type=float, default=DEFAULT_MAX_SIZE_MB, help="Taille maximale conservée par 'prune'")
+    args = parser.parse_args()
+
+    cache = OcrCache(args.cache_dir, max_size_mb=args.max_size_mb)
+
+    if args.action == "stats":
+        print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
+    elif args.action == "list":
+        for path, taille, mtime in cache.entries():
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(mtime))}  {taille / 1024:8.1f} Ko  {path}")
+    elif args.action == "prune":
+        print(f"🧹 {cache.prune()} entrée(s) supprimée(s)")
+    elif args.action == "clear":
+        print(f"🧹 {cache.clear()} entrée(s) supprimée(s)")
@@ -0,0 +1,156 @@
+"""
+Moteurs OCR interchangeables derrière une même interface :
+
+- `pytesseract` : lance le binaire tesseract à chaque appel (image écrite
+  dans un fichier temporaire, modèle de langue rechargé, TSV relu) ;
+- `tesserocr` : API C de Tesseract gardée initialisée dans chaque thread
+  (une instance par langue/oem), images passées en mémoire depuis numpy.
+  Le modèle n'est chargé qu'au premier appel du worker.
+
+Le moteur par défaut se choisit avec la variable d'environnement
+OCR_ENGINE ; le pipeline le prend dans `ocr.engine` du YAML.
+"""
+import os
+import threading
+
+import numpy as np
+import pytesseract
+from pytesseract import Output
+
+MOTEURS_OCR = ("pytesseract", "tesserocr")
+DEFAULT_ENGINE = os.environ.get("OCR_ENGINE", "pytesseract")
+
+# Colonnes de la sortie TSV de Tesseract, dans l'ordre (le texte est la dernière)
+COLONNES_TSV = ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+                "left", "top", "width", "height", "conf", "text")
+
+# Moteurs déjà créés dans ce processus (un par nom)
+_ENGINES = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def build_tesseract_config(psm=None, oem=None):
+    config = ""
+    if psm is not None:
+        config += f"--psm {psm} "
+    if oem is not None:
+        config += f"--oem {oem}"
+    return config.strip()
+
+
+class PytesseractEngine:
+    """Un processus tesseract par appel (comportement historique)."""
+
+    name = "pytesseract"
+
+    def image_to_data(self, image, lang='fra', psm=None, oem=None):
+        """Sortie brute `image_to_data` (dict de listes) pour une image PIL ou un tableau numpy."""
+        return pytesseract.image_to_data(
+            image,
+            output_type=Output.DICT,
+            lang=lang,
+            config=build_tesseract_config(psm, oem)
+        )
+
+    def image_to_string(self, image, lang='fra', psm=None, oem=None):
+        return pytesseract.image_to_string(image, lang=lang, config=build_tesseract_config(psm, oem))
+
+    def osd(self, image, dpi=None):
+        """(rotation à appliquer en degrés, confiance) d'après l'OSD de Tesseract."""
+        config = "--psm 0" + (f" --dpi {dpi}" if dpi else "")
+        osd = pytesseract.image_to_osd(image, config=config, output_type=Output.DICT)
+        return int(osd["rotate"]), float(osd["orientation_conf"])
+
+
+class TesserocrEngine:
+    """
+    API Tesseract persistante : une PyTessBaseAPI par thread et par
+    (langue, oem), réutilisée d'un appel à l'autre. Les workers OCR étant
+    des processus, chacun garde ses propres instances jusqu'à sa fin.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self):
+        try:
+            import tesserocr
+        except ImportError as e:
+            raise RuntimeError("❌ Moteur OCR 'tesserocr' indisponible : pip install tesserocr") from e
+        self._tesserocr = tesserocr
+        self._local = threading.local()
+
+    def _api(self, lang, oem=None, psm=None):
+        apis = getattr(self._local, "apis", None)
+        if apis is None:
+            apis = self._local.apis = {}
+        cle = (lang, oem)
+        api = apis.get(cle)
+        if api is None:
+            kwargs = {"lang": lang}
+            if oem is not None:
+                kwargs["oem"] = self._tesserocr.OEM(oem)
+            api = apis[cle] = self._tesserocr.PyTessBaseAPI(**kwargs)
+        api.SetPageSegMode(self._tesserocr.PSM.AUTO if psm is None else self._tesserocr.PSM(psm))
+        return api
+
+    @staticmethod
+    def _set_image(api, image, dpi=None):
+        """Passe les pixels à Tesseract sans fichier : tableau uint8 contigu (gris, RGB ou RGBA)."""
+        pixels = np.ascontiguousarray(np.asarray(image), dtype=np.uint8)
+        height, width = pixels.shape[:2]
+        bytes_per_pixel = 1 if pixels.ndim == 2 else pixels.shape[2]
+        api.SetImageBytes(pixels.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+        if dpi:
+            api.SetSourceResolution(int(dpi))
+
+    def image_to_data(self, image, lang='fra', psm=None, oem=None):
+        api = self._api(lang, oem, psm)
+        self._set_image(api, image)
+        api.Recognize()
+        return parse_tsv(api.GetTSVText(0))
+
+    def image_to_string(self, image, lang='fra', psm=None, oem=None):
+        api = self._api(lang, oem, psm)
+        self._set_image(api, image)
+        return api.GetUTF8Text()
+
+    def osd(self, image, dpi=None, lang='fra'):
+        api = self._api(lang, psm=self._tesserocr.PSM.OSD_ONLY)
+        self._set_image(api, image, dpi=dpi)
+        result = api.DetectOrientationScript()
+        if not result:
+            raise RuntimeError("OSD : orientation non détectée")
+        # orient_deg : orientation du texte ; `rotate` de tesseract --psm 0 : rotation qui la corrige
+        return (360 - int(result["orient_deg"])) % 360, float(result["orient_conf"])
+
+
+def parse_tsv(tsv):
+    """
+    TSV de Tesseract (sans en-tête, comme GetTSVText) → dict de listes au
+    format pytesseract `Output.DICT` : colonnes numériques converties en int.
+    """
+    data = {colonne: [] for colonne in COLONNES_TSV}
+    numeriques = COLONNES_TSV[:-1]
+    for ligne in tsv.splitlines():
+        if not ligne:
+            continue
+        cellules = ligne.split("\t", len(COLONNES_TSV) - 1)
+        if len(cellules) < len(COLONNES_TSV):
+            cellules.append("")
+        for colonne, valeur in zip(numeriques, cellules):
+            data[colonne].append(int(float(valeur)))
+        data["text"].append(cellules[-1])
+    return data
+
+
+def get_engine(name=None):
+    """Moteur OCR `name` (défaut : OCR_ENGINE), créé une fois par processus."""
+    name = name or DEFAULT_ENGINE
+    if name not in MOTEURS_OCR:
+        raise ValueError(f"Moteur OCR inconnu : {name} (attendu : {MOTEURS_OCR})")
+
+    with _ENGINES_LOCK:
+        engine = _ENGINES.get(name)
+        if engine is None:
+            engine = _ENGINES[name] = TesserocrEngine() if name == "tesserocr" else PytesseractEngine()
+        return engine
@@ -2,103 +2,276 @@ import os
 import json
 import argparse
 import pytesseract
-from pdf2image import convert_from_path
-from pytesseract import Output
-from collections import defaultdict
-import subprocess
-from preprocess_image import preprocess_pdf
+import sys
+import fitz
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from preprocess_image import preprocess_pdf, preprocessed_dir
+from page_images import PageImageProvider
+from job_context import OCR, VISUALIZATION, JobContext
+from ocr_engine import MOTEURS_OCR, build_tesseract_config, get_engine
+from word_store import WordStore, words_path
+from table_index import record_table
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from visualize_ocr import visualize_ocr_to_pdf
 
 pytesseract.pytesseract.tesseract_cmd = '/opt/homebrew/bin/tesseract'
 
-def ocr_pdf_to_json(pdf_path, output_dir, use_preprocessing=True, psm=None, oem=None, preprocessing_params=None):
-    if use_preprocessing:
-        pages = preprocess_pdf(pdf_path, save_images=True, debug=False, params=preprocessing_params)
-    else:
-        print("⚠️ Prétraitement désactivé — OCR sur le PDF brut.")
-        pages = convert_from_path(pdf_path, dpi=300)
-
-    config = ""
-    if psm is not None:
-        config += f"--psm {psm} "
-    if oem is not None:
-        config += f"--oem {oem}"
-
-    results = []
-    for page_num, image in enumerate(pages):
-        ocr_data = pytesseract.image_to_data(
-            image,
-            output_type=Output.DICT,
-            lang='fra',
-            config=config.strip()
-        )
-
-        blocks = defaultdict(lambda: defaultdict(list))
-        block_dimensions = {}
-
-        for i in range(len(ocr_data['text'])):
-            word = ocr_data['text'][i].strip()
-            if not word:
-                continue
-
-            word_info = {
-                "text": word,
-                "x": ocr_data['left'][i],
-                "y": ocr_data['top'][i],
-                "width": ocr_data['width'][i],
-                "height": ocr_data['height'][i],
-                "page": page_num + 1,
-                "line_num": ocr_data['line_num'][i],
-                "block_num": ocr_data['block_num'][i],
-                "word_num": ocr_data['word_num'][i],
-                "conf": ocr_data['conf'][i]
-            }
+def build_page_result(ocr_data, page_num):
+    blocks = defaultdict(lambda: defaultdict(list))
+    block_dimensions = {}
+
+    for i in range(len(ocr_data['text'])):
+        word = ocr_data['text'][i].strip()
+        if not word:
+            continue
+
+        word_info = {
+            "text": word,
+            "x": ocr_data['left'][i],
+            "y": ocr_data['top'][i],
+            "width": ocr_data['width'][i],
+            "height": ocr_data['height'][i],
+            "page": page_num,
+            "line_num": ocr_data['line_num'][i],
+            "block_num": ocr_data['block_num'][i],
+            "word_num": ocr_data['word_num'][i],
+            "conf": ocr_data['conf'][i]
+        }
 
-            block_id = ocr_data['block_num'][i]
-            line_id = ocr_data['line_num'][i]
-            blocks[block_id][line_id].append(word_info)
-
-            if block_id not in block_dimensions:
-                block_dimensions[block_id] = {
-                    "x_min": word_info['x'],
-                    "y_min": word_info['y'],
-                    "x_max": word_info['x'] + word_info['width'],
-                    "y_max": word_info['y'] + word_info['height']
-                }
-            else:
-                dims = block_dimensions[block_id]
-                dims['x_min'] = min(dims['x_min'], word_info['x'])
-                dims['y_min'] = min(dims['y_min'], word_info['y'])
-                dims['x_max'] = max(dims['x_max'], word_info['x'] + word_info['width'])
-                dims['y_max'] = max(dims['y_max'], word_info['y'] + word_info['height'])
-
-        page_blocks = []
-        for block_id, lines in blocks.items():
-            block_data = {
-                "block_num": block_id,
-                "x": block_dimensions[block_id]['x_min'],
-                "y": block_dimensions[block_id]['y_min'],
-                "width": block_dimensions[block_id]['x_max'] - block_dimensions[block_id]['x_min'],
-                "height": block_dimensions[block_id]['y_max'] - block_dimensions[block_id]['y_min'],
-                "lines": []
+        block_id = ocr_data['block_num'][i]
+        line_id = ocr_data['line_num'][i]
+        blocks[block_id][line_id].append(word_info)
+
+        if block_id not in block_dimensions:
+            block_dimensions[block_id] = {
+                "x_min": word_info['x'],
+                "y_min": word_info['y'],
+                "x_max": word_info['x'] + word_info['width'],
+                "y_max": word_info['y'] + word_info['height']
             }
-            for line_id, words in lines.items():
-                block_data["lines"].append({
-                    "line_num": line_id,
-                    "words": words
-                })
-            page_blocks.append(block_data)
-
-        results.append({
-            "page": page_num + 1,
-            "blocks": page_blocks
-        })
-
-    os.makedirs(output_dir, exist_ok=True)
-    base_name = os.path.basename(pdf_path).replace('.pdf', '.json')
-    output_path = os.path.join(output_dir, base_name)
+        else:
+            dims = block_dimensions[block_id]
+            dims['x_min'] = min(dims['x_min'], word_info['x'])
+            dims['y_min'] = min(dims['y_min'], word_info['y'])
+            dims['x_max'] = max(dims['x_max'], word_info['x'] + word_info['width'])
+            dims['y_max'] = max(dims['y_max'], word_info['y'] + word_info['height'])
+
+    page_blocks = []
+    for block_id, lines in blocks.items():
+        block_data = {
+            "block_num": block_id,
+            "x": block_dimensions[block_id]['x_min'],
+            "y": block_dimensions[block_id]['y_min'],
+            "width": block_dimensions[block_id]['x_max'] - block_dimensions[block_id]['x_min'],
+            "height": block_dimensions[block_id]['y_max'] - block_dimensions[block_id]['y_min'],
+            "lines": []
+        }
+        for line_id, words in lines.items():
+            block_data["lines"].append({
+                "line_num": line_id,
+                "words": words
+            })
+        page_blocks.append(block_data)
+
+    return {
+        "page": page_num,
+        "blocks": page_blocks
+    }
+
+def ocr_page_data(image, psm=None, oem=None, lang='fra', engine=None):
+    """Sortie brute `image_to_data` (dict de listes) pour une image, par le moteur `engine` (voir ocr_engine)."""
+    return get_engine(engine).image_to_data(image, lang=lang, psm=psm, oem=oem)
+
+def read_text_layer(doc, page_index, dpi=300, min_words=10):
+    """
+    Lit la couche texte native d'une page PDF (PyMuPDF) et la renvoie au
+    format `image_to_data`, coordonnées ramenées à l'espace `dpi` utilisé
+    par les YAML. Retourne None si la page n'a pas de texte exploitable
+    (page scannée) : il faut alors passer par Tesseract.
+    """
+    page = doc[page_index]
+    words = page.get_text("words")
+
+    lisibles = [w for w in words if any(c.isalnum() for c in w[4])]
+    if len(lisibles) < min_words:
+        return None
+    # Polices sans table d'encodage : texte extrait illisible
+    if sum(w[4].count("\ufffd") for w in words) > len(words) * 0.05:
+        return None
+
+    scale = dpi / 72.0
+    matrix = page.rotation_matrix
+    ocr_data = {key: [] for key in ("text", "left", "top", "width", "height", "line_num", "block_num", "word_num", "conf")}
+    for x0, y0, x1, y1, text, block_no, line_no, word_no in words:
+        rect = fitz.Rect(x0, y0, x1, y1) * matrix
+        ocr_data["text"].append(text)
+        ocr_data["left"].append(int(round(rect.x0 * scale)))
+        ocr_data["top"].append(int(round(rect.y0 * scale)))
+        ocr_data["width"].append(int(round(rect.width * scale)))
+        ocr_data["height"].append(int(round(rect.height * scale)))
+        # Tesseract numérote à partir de 1
+        ocr_data["block_num"].append(block_no + 1)
+        ocr_data["line_num"].append(line_no + 1)
+        ocr_data["word_num"].append(word_no + 1)
+        ocr_data["conf"].append(100)
+    return ocr_data
+
+def ocr_page(image, page_num, psm=None, oem=None, lang='fra', engine=None):
+    return build_page_result(ocr_page_data(image, psm=psm, oem=oem, lang=lang, engine=engine), page_num)
+
+def resolve_workers(workers):
+    if workers is None:
+        return 1
+    if workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+def _init_ocr_worker(omp_threads):
+    # Tesseract lit OMP_THREAD_LIMIT : sans limite, chaque worker lance autant
+    # de threads OpenMP que de cœurs et les processus se marchent dessus.
+    os.environ["OMP_THREAD_LIMIT"] = str(omp_threads)
+
+@contextmanager
+def _omp_limit(omp_threads):
+    """OMP_THREAD_LIMIT posé le temps d'un OCR séquentiel, puis remis à sa valeur d'avant."""
+    if omp_threads is None:
+        yield
+        return
+    avant = os.environ.get("OMP_THREAD_LIMIT")
+    _init_ocr_worker(omp_threads)
+    try:
+        yield
+    finally:
+        if avant is None:
+            os.environ.pop("OMP_THREAD_LIMIT", None)
+        else:
+            os.environ["OMP_THREAD_LIMIT"] = avant
+
+def _ocr_page_task(image, psm, oem, lang, engine):
+    return ocr_page_data(image, psm=psm, oem=oem, lang=lang, engine=engine)
 
+def open_ocr_pool(workers, omp_threads=None):
+    """
+    Pool de processus OCR réutilisable d'un appel à l'autre (à fermer par
+    l'appelant avec shutdown()). None si workers <= 1 : OCR séquentiel.
+    """
+    workers = resolve_workers(workers)
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker, initargs=(omp_threads or 1,))
+
+def ocr_images_data(pages, psm=None, oem=None, lang='fra', workers=1, omp_threads=None, engine=None, pool=None):
+    """
+    Sorties brutes `image_to_data` d'une liste d'images, dans l'ordre.
+
+    workers > 1 : les pages sont envoyées à un pool de processus borné (au
+    plus 2 pages en attente par worker) et les résultats sont remis dans
+    l'ordre des pages. workers <= 0 : un worker par cœur.
+    omp_threads : threads OpenMP autorisés par appel Tesseract (1 par défaut
+    en mode parallèle). En séquentiel, la limite ne vaut que pour cet appel.
+    engine : moteur OCR (voir ocr_engine) ; avec tesserocr, chaque worker
+    garde son moteur initialisé d'une page à l'autre.
+    pool : pool ouvert par open_ocr_pool et gardé d'un appel à l'autre
+    (workers et modèles déjà chargés) ; il n'est pas fermé ici.
+    """
+    if pool is None:
+        workers = min(resolve_workers(workers), max(len(pages), 1))
+    else:
+        workers = resolve_workers(workers)
+
+    if not pages or (pool is None and workers <= 1):
+        with _omp_limit(omp_threads):
+            return [ocr_page_data(image, psm=psm, oem=oem, lang=lang, engine=engine) for image in pages]
+
+    print(f"⚡ OCR parallèle : {len(pages)} page(s) sur {workers} worker(s)")
+    if pool is None:
+        with open_ocr_pool(workers, omp_threads) as pool:
+            return _ocr_pool_borne(pool, pages, psm, oem, lang, engine, workers * 2)
+    return _ocr_pool_borne(pool, pages, psm, oem, lang, engine, workers * 2)
+
+def _ocr_pool_borne(pool, pages, psm, oem, lang, engine, max_en_vol):
+    """Soumission bornée (max_en_vol pages en attente), résultats dans l'ordre des pages."""
+    results = [None] * len(pages)
+    en_vol = deque()
+    for index, image in enumerate(pages):
+        if len(en_vol) >= max_en_vol:
+            done_index, future = en_vol.popleft()
+            results[done_index] = future.result()
+        en_vol.append((index, pool.submit(_ocr_page_task, image, psm, oem, lang, engine)))
+    for index, future in en_vol:
+        results[index] = future.result()
+    return results
+
+def ocr_images(pages, psm=None, oem=None, lang='fra', workers=1, omp_threads=None, page_numbers=None, engine=None):
+    """OCR d'une liste d'images (page 1 = pages[0], sauf si page_numbers est fourni)."""
+    if page_numbers is None:
+        page_numbers = [page_num + 1 for page_num in range(len(pages))]
+    data = ocr_images_data(pages, psm=psm, oem=oem, lang=lang, workers=workers, omp_threads=omp_threads, engine=engine)
+    return [build_page_result(ocr_data, page_num) for ocr_data, page_num in zip(data, page_numbers)]
+
+def save_ocr_json(results, output_path):
+    """
+    JSON OCR lisible, plus sa version en colonnes (<nom>.words.npz, voir
+    word_store) que document_parser charge sans relire le JSON. Les
+    tableaux sont aussi ajoutés à l'index du dossier (voir table_index).
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(results, f, ensure_ascii=False, indent=2)
+    store = WordStore.from_pages(results)
+    store.save(words_path(output_path))
+    # Tableau (<pdf>_p<n>_tab<i>.json) : enregistré dans l'index du dossier
+    record_table(output_path, " ".join(store.texts()))
+    return output_path
+
+def ocr_pdf_to_json(pdf_path, output_dir, use_preprocessing=True, psm=None, oem=None, preprocessing_params=None, provider=None,
+                    workers=1, omp_threads=None, use_text_layer=False, engine=None, job=None):
+    """job : JobContext où sont sauvegardées les pages prétraitées (voir preprocess_image.preprocessed_dir)."""
+    if provider is None:
+        provider = PageImageProvider(pdf_path, dpi=300)
+
+    natives = [None] * len(provider)
+    if use_text_layer:
+        with fitz.open(pdf_path) as doc:
+            natives = [read_text_layer(doc, i, dpi=provider.dpi) for i in range(len(doc))]
+        print(f"📝 Couche texte native exploitable sur {sum(d is not None for d in natives)}/{len(natives)} page(s)")
+
+    # Seules les pages sans couche texte exploitable sont prétraitées puis OCRisées
+    a_ocr = [i for i, data in enumerate(natives) if data is None]
+    if not a_ocr:
+        pages = []
+    elif use_preprocessing:
+        pages = preprocess_pdf(pdf_path, save_images=True, debug=False, params=preprocessing_params, provider=provider,
+                               job=job, indices=a_ocr)
+    else:
+        print("⚠️ Prétraitement désactivé — OCR sur le PDF brut.")
+        pages = [provider.get(i) for i in a_ocr]
+        for i in a_ocr:
+            provider.release(i, "ocr")
+
+    if use_preprocessing and len(a_ocr) < len(natives):
+        # Pages natives : image brute à côté des pages prétraitées, pour que la
+        # visualisation (page_<n>.png) garde une image par page
+        out_dir = preprocessed_dir(job)
+        for i, data in enumerate(natives):
+            if data is not None:
+                provider.get(i).save(os.path.join(out_dir, f"page_{i + 1}.png"))
+                provider.release(i, "pretraitement")
+
+    # Pages numériques : la couche texte remplace Tesseract page par page
+    ocr_results = ocr_images(
+        pages, psm=psm, oem=oem, workers=workers, omp_threads=omp_threads,
+        page_numbers=[i + 1 for i in a_ocr], engine=engine
+    )
+    results = [build_page_result(data, i + 1) if data is not None else None for i, data in enumerate(natives)]
+    for i, page_result in zip(a_ocr, ocr_results):
+        results[i] = page_result
+
+    base_name = os.path.basename(pdf_path).replace('.pdf', '.json')
+    output_path = save_ocr_json(results, os.path.join(output_dir, base_name))
 
     print(f"OCR terminé pour {pdf_path} → {output_path}")
     return output_path
@@ -106,11 +279,18 @@ def ocr_pdf_to_json(pdf_path, output_dir, use_preprocessing=True, psm=None, oem=
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="OCR un PDF et sauvegarder le résultat en JSON.")
     parser.add_argument("pdf_path", help="Chemin vers le fichier PDF à traiter")
-    parser.add_argument("--output-dir", default="data/ocr", help="Répertoire où sauvegarder le JSON OCR")
+    parser.add_argument("--output-dir", help="Répertoire où sauvegarder le JSON OCR (défaut : ocr/ du dossier de travail, data/ocr avec --shared-dirs)")
     parser.add_argument("--no-preprocess", action="store_true", help="Désactiver le prétraitement OCR")
     parser.add_argument("--psm", type=int, help="Page Segmentation Mode de Tesseract")
     parser.add_argument("--oem", type=int, help="OCR Engine Mode")
     parser.add_argument("--with-preprocessing-config", help="Chemin vers un fichier JSON contenant les paramètres de preprocessing")
+    parser.add_argument("--text-layer", action="store_true", help="Lire la couche texte native des pages numériques au lieu de lancer Tesseract")
+    parser.add_argument("--workers", type=int, default=1, help="Nombre de processus OCR en parallèle (0 = un par cœur)")
+    parser.add_argument("--omp-threads", type=int, help="Threads OpenMP par appel Tesseract (OMP_THREAD_LIMIT)")
+    parser.add_argument("--engine", choices=MOTEURS_OCR, help="Moteur OCR (défaut : variable OCR_ENGINE, sinon pytesseract)")
+    dossiers = parser.add_mutually_exclusive_group()
+    dossiers.add_argument("--job-dir", help="Dossier de travail de cette extraction (défaut : dossier unique sous data/jobs)")
+    dossiers.add_argument("--shared-dirs", action="store_true", help="JSON OCR et PDF annoté dans les dossiers partagés data/ocr et data/ocr_visualization")
 
     args = parser.parse_args()
 
@@ -119,27 +299,45 @@ if __name__ == "__main__":
         with open(args.with_preprocessing_config, 'r', encoding='utf-8') as f:
             preprocessing_params = json.load(f)
 
+    # Une seule rasterisation partagée par l'OCR et la visualisation
+    consumers = ["pretraitement"] if not args.no_preprocess else ["ocr", "visualisation"]
+    provider = PageImageProvider(args.pdf_path, dpi=300, consumers=consumers)
+    # Un dossier par exécution (pages prétraitées, JSON OCR, PDF annoté) ; avec
+    # --shared-dirs il ne garde que les pages prétraitées et est supprimé à la fin
+    prefixe = os.path.splitext(os.path.basename(args.pdf_path))[0]
+    job = JobContext(path=args.job_dir) if args.job_dir else JobContext(prefix=prefixe, keep=not args.shared_dirs)
+    if args.shared_dirs:
+        output_dir, visualization_dir = args.output_dir or "data/ocr", "data/ocr_visualization"
+    else:
+        output_dir, visualization_dir = args.output_dir or job.subdir(OCR), job.subdir(VISUALIZATION)
+        print(f"📁 Dossier de travail : {job.dir}")
+
     output_json_path = ocr_pdf_to_json(
         args.pdf_path,
-        args.output_dir,
+        output_dir,
         use_preprocessing=not args.no_preprocess,
         psm=args.psm,
         oem=args.oem,
-        preprocessing_params=preprocessing_params
+        preprocessing_params=preprocessing_params,
+        provider=provider,
+        workers=args.workers,
+        omp_threads=args.omp_threads,
+        use_text_layer=args.text_layer,
+        engine=args.engine,
+        job=job
     )
 
     try:
         print(f"[OCR_READER]: Launching Tesseract with psm={args.psm}, oem={args.oem} and preprocess={preprocessing_params}")
-        script_dir = os.path.dirname(__file__)
-        visualize_script = os.path.join(script_dir, "../scripts", "visualize_ocr.py")
-        command = ["python3", visualize_script, output_json_path]
 
         if not args.no_preprocess:
-            command += ["--image-dir", "data/tmp_preprocessed"]
+            visualize_ocr_to_pdf(output_json_path, output_dir=visualization_dir, image_dir=preprocessed_dir(job))
         else:
-            command += [args.pdf_path]
-
-        subprocess.run(command, check=True)
+            visualize_ocr_to_pdf(output_json_path, output_dir=visualization_dir, pdf_path=args.pdf_path, provider=provider)
 
     except Exception as e:
         print(f"❌ Erreur lors de la visualisation OCR : {e}")
+    finally:
+        provider.close()
+        if not job.keep:
+            job.cleanup()
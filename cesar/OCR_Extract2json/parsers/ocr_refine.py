@@ -0,0 +1,178 @@
+"""
+Seconde passe OCR sur les seules lignes de faible confiance.
+
+Après l'OCR d'une image, les lignes dont la confiance moyenne des mots est
+sous `min_conf` sont découpées (avec une marge) et relues avec d'autres
+réglages : psm 7 (une ligne), agrandissement, binarisation... Pour chaque
+ligne, la variante de meilleure confiance moyenne remplace les mots
+d'origine si elle fait mieux ; les coordonnées sont ramenées dans l'image
+d'origine et la ligne garde ses numéros de bloc/paragraphe/ligne.
+"""
+import copy
+
+import cv2
+import numpy as np
+from PIL import Image
+
+DEFAULT_REOCR = {
+    "enabled": False,
+    "min_conf": 60,       # confiance moyenne (0-100) sous laquelle une ligne est relue
+    "padding": 8,         # marge en pixels autour de la ligne découpée
+    "max_lines": 200,     # plafond de lignes relues par image (les moins sûres d'abord)
+    "variants": [
+        {"psm": 7, "scale": 2},
+        {"psm": 7, "scale": 2, "binarize": True},
+    ],
+}
+
+
+def reocr_settings(ocr_config):
+    """Réglages `ocr.reocr` du YAML complétés par les valeurs par défaut."""
+    settings = copy.deepcopy(DEFAULT_REOCR)
+    settings.update((ocr_config or {}).get("reocr") or {})
+    return settings
+
+
+def _cle_ligne(data, i):
+    return data["block_num"][i], data.get("par_num", data["block_num"])[i], data["line_num"][i]
+
+
+def _mots(data):
+    """Indices des mots (texte non vide, confiance connue) de la sortie `image_to_data`."""
+    return [i for i, texte in enumerate(data["text"]) if str(texte).strip() and float(data["conf"][i]) >= 0]
+
+
+def _confiance(data, indices):
+    return sum(float(data["conf"][i]) for i in indices) / len(indices) if indices else -1.0
+
+
+def low_conf_lines(data, min_conf, max_lines=None):
+    """
+    Lignes dont la confiance moyenne est < min_conf : liste de
+    (clé de ligne, indices des mots, confiance, boîte (x0, y0, x1, y1)),
+    les moins sûres en premier.
+    """
+    lignes = {}
+    for i in _mots(data):
+        lignes.setdefault(_cle_ligne(data, i), []).append(i)
+
+    faibles = []
+    for cle, indices in lignes.items():
+        score = _confiance(data, indices)
+        if score >= min_conf:
+            continue
+        boite = (
+            min(data["left"][i] for i in indices),
+            min(data["top"][i] for i in indices),
+            max(data["left"][i] + data["width"][i] for i in indices),
+            max(data["top"][i] + data["height"][i] for i in indices),
+        )
+        faibles.append((cle, indices, score, boite))
+
+    faibles.sort(key=lambda ligne: ligne[2])
+    return faibles[:max_lines] if max_lines else faibles
+
+
+def variant_image(pixels, boite, padding, variant):
+    """
+    Découpe de la ligne préparée pour une variante. Retourne (image PIL,
+    (x0, y0) de la découpe dans l'image d'origine, facteur d'agrandissement).
+    """
+    hauteur, largeur = pixels.shape[:2]
+    x0, y0 = max(0, boite[0] - padding), max(0, boite[1] - padding)
+    x1, y1 = min(largeur, boite[2] + padding), min(hauteur, boite[3] + padding)
+    decoupe = pixels[y0:y1, x0:x1]
+
+    scale = variant.get("scale", 1) or 1
+    if variant.get("binarize") or scale != 1:
+        if decoupe.ndim == 3:
+            decoupe = cv2.cvtColor(decoupe, cv2.COLOR_RGB2GRAY)
+        if scale != 1:
+            decoupe = cv2.resize(decoupe, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        if variant.get("binarize"):
+            _, decoupe = cv2.threshold(decoupe, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return Image.fromarray(np.ascontiguousarray(decoupe)), (x0, y0), scale
+
+
+def _mots_variante(data, origine, scale):
+    """Mots d'une relecture ramenés dans les coordonnées de l'image d'origine."""
+    x0, y0 = origine
+    return [
+        {
+            "text": data["text"][i],
+            "left": x0 + int(round(data["left"][i] / scale)),
+            "top": y0 + int(round(data["top"][i] / scale)),
+            "width": int(round(data["width"][i] / scale)),
+            "height": int(round(data["height"][i] / scale)),
+            "conf": data["conf"][i],
+        }
+        for i in _mots(data)
+    ]
+
+
+def _remplacer_lignes(data, remplacements):
+    """
+    Nouvelle sortie `image_to_data` où les mots de chaque ligne remplacée
+    sont substitués, à la place de son premier mot, par ceux de la relecture.
+    """
+    premier = {indices[0]: (indices, mots) for indices, mots in remplacements}
+    retires = {i for indices, _ in remplacements for i in indices}
+    resultat = {cle: [] for cle in data}
+
+    for i in range(len(data["text"])):
+        if i in premier:
+            indices, mots = premier[i]
+            for numero, mot in enumerate(mots, start=1):
+                for cle in data:
+                    if cle in mot:
+                        resultat[cle].append(mot[cle])
+                    elif cle == "word_num":
+                        resultat[cle].append(numero)
+                    else:
+                        # level, page_num, block_num, par_num, line_num : ceux de la ligne d'origine
+                        resultat[cle].append(data[cle][i])
+        if i in retires:
+            continue
+        for cle in data:
+            resultat[cle].append(data[cle][i])
+    return resultat
+
+
+def refine_ocr_data(images, datas, settings, ocr_fn):
+    """
+    Relit les lignes de faible confiance de chaque image et garde la
+    meilleure lecture par ligne.
+
+    ocr_fn(images, psm, oem) : OCR d'une liste d'images, sorties
+    `image_to_data` dans l'ordre (ex. ocr_reader.ocr_images_data) ; toutes
+    les lignes d'une variante passent en un seul appel.
+    Retourne (nouvelles sorties, nombre de lignes relues, nombre remplacées).
+    """
+    lignes = []  # (index image, indices des mots, confiance, boîte)
+    for n, data in enumerate(datas):
+        for _, indices, score, boite in low_conf_lines(data, settings["min_conf"], settings.get("max_lines")):
+            lignes.append((n, indices, score, boite))
+    if not lignes:
+        return list(datas), 0, 0
+
+    pixels = {n: np.asarray(images[n]) for n in {ligne[0] for ligne in lignes}}
+    meilleures = [(score, None) for _, _, score, _ in lignes]
+    for variant in settings["variants"]:
+        decoupes = [variant_image(pixels[n], boite, settings["padding"], variant) for n, _, _, boite in lignes]
+        relectures = ocr_fn([image for image, _, _ in decoupes], variant.get("psm", 7), variant.get("oem"))
+        for k, (relecture, (_, origine, scale)) in enumerate(zip(relectures, decoupes)):
+            mots = _mots_variante(relecture, origine, scale)
+            score = sum(float(m["conf"]) for m in mots) / len(mots) if mots else -1.0
+            if score > meilleures[k][0]:
+                meilleures[k] = (score, mots)
+
+    remplacements = {}
+    for (n, indices, _, _), (_, mots) in zip(lignes, meilleures):
+        if mots is not None:
+            remplacements.setdefault(n, []).append((indices, mots))
+
+    resultats = [
+        _remplacer_lignes(data, remplacements[n]) if n in remplacements else data
+        for n, data in enumerate(datas)
+    ]
+    return resultats, len(lignes), sum(len(r) for r in remplacements.values())
@@ -0,0 +1,102 @@
+"""
+OCR limité aux zones utiles d'une page, déduites du plan de parsing.
+
+Chaque champ simple borné en y (min_y/max_y) et la zone des lignes de
+transaction (start_line_y_min/max) donnent une bande horizontale pleine
+largeur : l'ancre d'un champ peut être n'importe où en x sur sa ligne.
+Un champ à ancre sans concat peut finir dans le fallback d'extract_field
+(premier mot qui matche parmi les 50 suivant l'ancre, sans borne y) : sa
+page est alors OCRisée en entier.
+Seules ces bandes (plus une marge) passent par Tesseract ; les mots sont
+ensuite ramenés dans les coordonnées de la page, si bien que
+document_parser les lit sans changement.
+"""
+
+# Marge (pixels à 300 DPI) ajoutée autour de chaque bande : au moins une
+# hauteur de texte, pour qu'un mot coupé au bord reste hors des bornes YAML.
+DEFAULT_MARGIN = 50
+
+CLES_OCR = ("text", "left", "top", "width", "height", "line_num", "block_num", "word_num", "conf")
+
+
+def _bande(y_min, y_max, margin):
+    return (None if y_min is None else y_min - margin, None if y_max is None else y_max + margin)
+
+
+def _lit_hors_bornes(field):
+    """Vrai si le champ peut lire un mot hors de [min_y, max_y] (fallback regex d'extract_field)."""
+    return bool(field.anchor or field.anchor_sequence) and not field.concat
+
+
+def plan_bands(plan, page, margin=DEFAULT_MARGIN):
+    """
+    Bandes (y_min, y_max) à OCRiser sur la page `page` (1-based) ; une borne
+    à None va jusqu'au bord de la page. Retourne None si le plan a besoin de
+    la page entière (champ sans bornes y, ou pouvant lire hors de ses bornes,
+    applicable à cette page), et une liste vide si aucune règle ne lit cette page.
+    """
+    bandes = []
+    for field in plan.fields:
+        if field.page is not None and field.page != page:
+            continue
+        if field.min_y is None or field.max_y is None or _lit_hors_bornes(field):
+            return None
+        bandes.append(_bande(field.min_y, field.max_y, margin))
+
+    tx = plan.transactions
+    if tx is not None and tx.source != 'table':
+        if tx.mode == "with_separator":
+            dessus = dessous = tx.y_tolerance
+        else:
+            dessus, dessous = tx.y_tol_above, tx.y_tol_below
+        y_min = tx.start_line_y_min_for(page)
+        y_max = tx.start_line_y_max
+        bandes.append(_bande(
+            None if y_min is None else y_min - dessus,
+            None if y_max is None else y_max + dessous,
+            margin
+        ))
+    return bandes
+
+
+def clip_bands(bands, height):
+    """Bandes bornées à [0, height], triées et fusionnées quand elles se chevauchent."""
+    bornees = sorted(
+        (max(0, int(y0 or 0)), min(height, int(height if y1 is None else y1)))
+        for y0, y1 in bands
+    )
+    fusion = []
+    for y0, y1 in bornees:
+        if y1 <= y0:
+            continue
+        if fusion and y0 <= fusion[-1][1]:
+            fusion[-1] = (fusion[-1][0], max(fusion[-1][1], y1))
+        else:
+            fusion.append((y0, y1))
+    return fusion
+
+
+def crop_bands(image, bands):
+    """Découpe une image PIL en bandes pleine largeur (y0, y1)."""
+    return [image.crop((0, y0, image.width, y1)) for y0, y1 in bands]
+
+
+def merge_band_data(datas, bands):
+    """
+    Assemble les sorties `image_to_data` des bandes d'une page en une seule :
+    `top` est décalé de l'origine de la bande et les numéros de bloc de
+    chaque bande suivent ceux de la précédente, pour que (bloc, ligne)
+    reste unique sur la page.
+    """
+    fusion = {cle: [] for cle in CLES_OCR}
+    decalage_bloc = 0
+    for data, (y0, _) in zip(datas, bands):
+        blocs = data.get("block_num", [])
+        for cle, valeurs in data.items():
+            if cle == "top":
+                valeurs = [v + y0 for v in valeurs]
+            elif cle == "block_num":
+                valeurs = [v + decalage_bloc for v in valeurs]
+            fusion.setdefault(cle, []).extend(valeurs)
+        decalage_bloc += max(blocs, default=0)
+    return fusion
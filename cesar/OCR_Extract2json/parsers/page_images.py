@@ -0,0 +1,139 @@
+import threading
+
+from PIL import Image
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+MOTEURS_RASTERISATION = ("pdf2image", "fitz")
+
+
+def raster_settings(config):
+    """(dpi, moteur) demandés par la section `rasterization` d'une config YAML."""
+    raster_conf = (config or {}).get("rasterization", {})
+    return raster_conf.get("dpi", 300), raster_conf.get("engine", "pdf2image")
+
+
+class PageImageProvider:
+    """
+    Rend chaque page d'un PDF une seule fois, à la résolution demandée, et
+    garde l'image en cache pour toutes les étapes qui en ont besoin
+    (prétraitement, OCR, tableaux, visualisation, détection de banque).
+
+    consumers : noms des étapes qui vont lire les pages. Une page est
+    retirée du cache dès que tous ses consommateurs l'ont libérée via
+    release(). Sans consommateurs déclarés, les pages restent en cache
+    jusqu'à close().
+
+    L'orientation de chaque page (OSD) est aussi détectée au plus une fois
+    et conservée jusqu'à close(), même après éviction de l'image.
+    """
+
+    def __init__(self, pdf_path, dpi=300, consumers=None, engine="pdf2image"):
+        if engine not in MOTEURS_RASTERISATION:
+            raise ValueError(f"Moteur de rasterisation inconnu : {engine} (attendu : {MOTEURS_RASTERISATION})")
+
+        self.pdf_path = pdf_path
+        self.dpi = dpi
+        self.engine = engine
+        self.consumers = frozenset(consumers or ())
+        self.renders = 0
+
+        self._lock = threading.Lock()
+        self._page_locks = {}
+        self._cache = {}
+        self._orientations = {}
+        self._pending = {}
+        self._fitz_doc = None
+        self._page_count = None
+
+    @classmethod
+    def from_config(cls, pdf_path, config, consumers=None):
+        dpi, engine = raster_settings(config)
+        return cls(pdf_path, dpi=dpi, consumers=consumers, engine=engine)
+
+    def __len__(self):
+        if self._page_count is None:
+            if self.engine == "fitz":
+                self._page_count = len(self._document())
+            else:
+                self._page_count = pdfinfo_from_path(self.pdf_path)["Pages"]
+        return self._page_count
+
+    def _document(self):
+        if self._fitz_doc is None:
+            import fitz
+            self._fitz_doc = fitz.open(self.pdf_path)
+        return self._fitz_doc
+
+    def _render(self, index):
+        self.renders += 1
+        if self.engine == "fitz":
+            pix = self._document()[index].get_pixmap(dpi=self.dpi)
+            return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        return convert_from_path(self.pdf_path, dpi=self.dpi, first_page=index + 1, last_page=index + 1)[0]
+
+    def get(self, index):
+        """Retourne l'image PIL (RGB) de la page `index` (0-based), rendue au plus une fois."""
+        if index < 0 or index >= len(self):
+            raise IndexError(f"Page {index + 1} hors du document ({len(self)} pages)")
+
+        with self._lock:
+            if index in self._cache:
+                return self._cache[index]
+            page_lock = self._page_locks.setdefault(index, threading.RLock())
+
+        # Verrou par page : deux étapes concurrentes ne rendent pas la même page deux fois
+        with page_lock:
+            with self._lock:
+                if index in self._cache:
+                    return self._cache[index]
+            image = self._render(index)
+            with self._lock:
+                self._cache[index] = image
+                self._pending.setdefault(index, set(self.consumers))
+            return image
+
+    def orientation(self, index, detect):
+        """
+        (rotation, confiance) de la page `index`, calculée une seule fois par
+        detect(image, dpi=...) (ex. preprocess_image.detect_orientation) puis partagée
+        par toutes les étapes.
+        """
+        with self._lock:
+            if index in self._orientations:
+                return self._orientations[index]
+            page_lock = self._page_locks.setdefault(index, threading.RLock())
+
+        with page_lock:
+            with self._lock:
+                if index in self._orientations:
+                    return self._orientations[index]
+            value = detect(self.get(index), dpi=self.dpi)
+            with self._lock:
+                self._orientations[index] = value
+            return value
+
+    def release(self, index, consumer):
+        """Signale que `consumer` n'a plus besoin de la page ; l'évince si plus personne n'en a besoin."""
+        with self._lock:
+            pending = self._pending.get(index)
+            if pending is None:
+                return
+            pending.discard(consumer)
+            if not pending and self.consumers:
+                self._cache.pop(index, None)
+
+    def iter_pages(self, consumer=None):
+        """Itère sur (index, image) en libérant chaque page pour `consumer` après usage."""
+        for index in range(len(self)):
+            yield index, self.get(index)
+            if consumer is not None:
+                self.release(index, consumer)
+
+    def close(self):
+        with self._lock:
+            self._cache.clear()
+            self._orientations.clear()
+            self._pending.clear()
+        if self._fitz_doc is not None:
+            self._fitz_doc.close()
+            self._fitz_doc = None
@@ -0,0 +1,224 @@
+import os
+import re
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Callable, Mapping, Optional, Pattern, Tuple
+
+import yaml
+
+from field_strategies import DIRECTION_STRATEGIES
+
+# Plans déjà compilés dans ce processus : chemin absolu → ((mtime_ns, taille), plan)
+_PLANS = {}
+_PLANS_LOCK = threading.Lock()
+
+
+@dataclass(frozen=True)
+class FieldPlan:
+    """Un champ simple (`structure.champs_simples.<nom>`) avec ses valeurs par défaut résolues."""
+    name: str
+    anchor: Optional[str]
+    anchor_lower: Optional[str]
+    anchor_sequence: Optional[Tuple[str, ...]]
+    anchor_sequence_lower: Optional[Tuple[str, ...]]
+    direction: str
+    strategy: Optional[Callable]
+    regex: Pattern
+    offset: int
+    concat: bool
+    concat_until_lower: Optional[str]
+    min_x: Optional[float]
+    max_x: Optional[float]
+    min_y: Optional[float]
+    max_y: Optional[float]
+    tol_x: float
+    tol_y: float
+    page: Optional[int]
+    supprimer_espaces: bool
+    convertir_en_float: bool
+
+
+@dataclass(frozen=True)
+class ColumnPlan:
+    """Une colonne du mode par défaut des transactions (bornes x/y, regex optionnelle)."""
+    name: str
+    x_min: float
+    x_max: float
+    y_min: Optional[float]
+    y_max: Optional[float]
+    regex: Optional[Pattern]
+
+
+@dataclass(frozen=True)
+class TransactionPlan:
+    """Section `structure.transactions` compilée."""
+    source: str
+    mode: Optional[str]
+    filter_all: Optional[Tuple[str, ...]]
+    filter_any: Optional[Tuple[str, ...]]
+    start_line_regex: Pattern
+    start_line_x_min: Optional[float]
+    start_line_x_max: Optional[float]
+    start_line_y_min: Optional[float]
+    start_line_y_min_by_page: Optional[Mapping]
+    start_line_y_max: Optional[float]
+    # Mode par défaut (colonnes par position)
+    columns: Tuple[ColumnPlan, ...]
+    y_tol_above: float
+    y_tol_below: float
+    # Mode with_separator
+    separator: str
+    columns_order: Tuple[str, ...]
+    columns_regex: Tuple[Tuple[str, Optional[Pattern]], ...]
+    y_tolerance: float
+
+    def start_line_y_min_for(self, page):
+        """start_line_y_min effectif pour une page (valeur unique ou dict par page avec 'default')."""
+        if self.start_line_y_min_by_page is None:
+            return self.start_line_y_min
+        return self.start_line_y_min_by_page.get(page, self.start_line_y_min)
+
+
+@dataclass(frozen=True)
+class ParsingPlan:
+    """
+    Configuration YAML de parsing compilée une fois : regex précompilées,
+    valeurs par défaut résolues et stratégie choisie pour chaque champ.
+    Immuable, donc partageable entre documents et threads.
+    """
+    fields: Tuple[FieldPlan, ...]
+    transactions: Optional[TransactionPlan]
+    source_path: Optional[str] = None
+
+
+def _compile(pattern):
+    return re.compile(pattern) if pattern else None
+
+
+def _tuple_or_none(values):
+    return tuple(values) if values else None
+
+
+def compile_field(name, field_conf, normalisation):
+    anchor = field_conf.get('anchor')
+    anchor_sequence = _tuple_or_none(field_conf.get('anchor_sequence'))
+    direction = field_conf.get('direction', 'right')
+    concat_until = field_conf.get('concat_until')
+    rules = normalisation.get(name, {}) or {}
+
+    return FieldPlan(
+        name=name,
+        anchor=anchor or None,
+        anchor_lower=anchor.lower() if anchor else None,
+        anchor_sequence=anchor_sequence,
+        anchor_sequence_lower=tuple(a.lower() for a in anchor_sequence) if anchor_sequence else None,
+        direction=direction,
+        strategy=DIRECTION_STRATEGIES.get(direction),
+        regex=re.compile(field_conf.get('regex', '.+')),
+        offset=field_conf.get('offset', 0),
+        concat=bool(field_conf.get('concat', False)),
+        concat_until_lower=concat_until.lower() if concat_until else None,
+        min_x=field_conf.get('min_x'),
+        max_x=field_conf.get('max_x'),
+        min_y=field_conf.get('min_y'),
+        max_y=field_conf.get('max_y'),
+        tol_x=field_conf.get('tolerance_x', 5),
+        tol_y=field_conf.get('tolerance_y', 50),
+        page=field_conf.get('page'),
+        supprimer_espaces=bool(rules.get('supprimer_espaces')),
+        convertir_en_float=bool(rules.get('convertir_en_float')),
+    )
+
+
+# Filtres de tableaux reconnus dans `transactions` (voir document_parser.filter_tables_sorted)
+FILTRES_TABLEAUX = ('filter_contains', 'filter_contains_any')
+
+
+def compile_transactions(transaction_conf):
+    inconnus = sorted(cle for cle in transaction_conf if cle.startswith('filter_') and cle not in FILTRES_TABLEAUX)
+    if inconnus:
+        raise ValueError(f"❌ Filtre(s) de tableaux inconnu(s) : {', '.join(inconnus)} "
+                         f"(attendus : {', '.join(FILTRES_TABLEAUX)})")
+    source = transaction_conf.get('source', 'document')
+    if transaction_conf.get('mode') == 'grid' and source != 'table':
+        # Les grilles de cellules ne viennent que des tableaux découpés (crop_tables)
+        raise ValueError(f"❌ mode: grid exige source: table (source actuelle : {source})")
+
+    y_min_raw = transaction_conf.get('start_line_y_min')
+    if isinstance(y_min_raw, dict):
+        y_min, y_min_by_page = y_min_raw.get("default"), MappingProxyType(dict(y_min_raw))
+    else:
+        y_min, y_min_by_page = y_min_raw, None
+
+    columns = tuple(
+        ColumnPlan(
+            name=col_name,
+            x_min=col_conf['x_min'],
+            x_max=col_conf['x_max'],
+            y_min=col_conf.get('y_min'),
+            y_max=col_conf.get('y_max'),
+            regex=_compile(col_conf.get('regex')),
+        )
+        for col_name, col_conf in (transaction_conf.get('columns') or {}).items()
+    )
+    columns_regex = transaction_conf.get('columns_regex', {}) or {}
+    columns_order = tuple(transaction_conf.get('columns_order', []) or [])
+
+    return TransactionPlan(
+        source=source,
+        mode=transaction_conf.get('mode'),
+        filter_all=_tuple_or_none(transaction_conf.get('filter_contains')),
+        filter_any=_tuple_or_none(transaction_conf.get('filter_contains_any')),
+        start_line_regex=re.compile(transaction_conf['start_line_regex']),
+        start_line_x_min=transaction_conf.get('start_line_x_min'),
+        start_line_x_max=transaction_conf.get('start_line_x_max'),
+        start_line_y_min=y_min,
+        start_line_y_min_by_page=y_min_by_page,
+        start_line_y_max=transaction_conf.get('start_line_y_max'),
+        columns=columns,
+        y_tol_above=transaction_conf.get('y_tolerance_above', 5),
+        y_tol_below=transaction_conf.get('y_tolerance_below', 10),
+        separator=transaction_conf.get('separator', '!'),
+        columns_order=columns_order,
+        columns_regex=tuple((col, _compile(columns_regex.get(col))) for col in columns_order),
+        y_tolerance=transaction_conf.get('y_tolerance', 5),
+    )
+
+
+def compile_plan(config, source_path=None):
+    """Compile la partie parsing (structure + normalisation) d'une config YAML déjà chargée."""
+    structure = config.get('structure', {}) or {}
+    normalisation = config.get('normalisation', {}) or {}
+
+    fields = tuple(
+        compile_field(name, field_conf, normalisation)
+        for name, field_conf in (structure.get('champs_simples', {}) or {}).items()
+    )
+    transactions_conf = structure.get('transactions')
+    transactions = compile_transactions(transactions_conf) if transactions_conf else None
+
+    return ParsingPlan(fields=fields, transactions=transactions, source_path=source_path)
+
+
+def load_plan(yaml_path):
+    """
+    Plan compilé d'un fichier YAML, mis en cache par chemin et date de
+    modification : tant que le fichier ne change pas, le même plan est
+    renvoyé à tous les documents traités par ce processus.
+    """
+    path = os.path.abspath(yaml_path)
+    st = os.stat(path)
+    version = (st.st_mtime_ns, st.st_size)
+
+    with _PLANS_LOCK:
+        cached = _PLANS.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        plan = compile_plan(yaml.safe_load(f), source_path=path)
+
+    with _PLANS_LOCK:
+        _PLANS[path] = (version, plan)
+    return plan
@@ -0,0 +1,481 @@
+import json
+import os
+import sys
+import time
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from page_images import PageImageProvider
+from preprocess_image import (PREPROCESSING_VERSION, SANS_ROTATION, PreprocessingPipeline, detect_orientation,
+                              preprocessing_cache_params)
+import fitz
+
+from ocr_reader import build_page_result, ocr_images_data, open_ocr_pool, read_text_layer, save_ocr_json
+from job_context import OCR, VISUALIZATION
+from ocr_cache import file_digest, image_digest
+from ocr_engine import get_engine
+from ocr_refine import refine_ocr_data, reocr_settings
+from ocr_regions import DEFAULT_MARGIN, clip_bands, crop_bands, merge_band_data, plan_bands
+from table_index import record_table
+from table_cropper import cell_view, detect_grid, detect_table_regions
+from document_parser import parse_document, table_text
+from parsing_plan import compile_plan, load_plan
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from visualize_ocr import annotate_pages, save_annotated_pdf
+
+
+CONSOMMATEUR_PIPELINE = "pipeline"
+
+
+class ExtractionPipeline:
+    """
+    Pipeline d'extraction exécuté dans un seul processus :
+    rasterisation → prétraitement → OCR → découpage des tableaux → parsing.
+
+    Les étapes se passent les images de pages et les mots OCR en mémoire.
+    Seuls les artefacts de debug (JSON OCR, PDF annoté) sont écrits sur disque.
+    """
+
+    def __init__(self, config, config_path=None, ocr_dir="data/ocr",
+                 visualization_dir="data/ocr_visualization", save_ocr=True, visualize=True, cache=None):
+        """
+        cache : OcrCache optionnel. Les pages (et tableaux) déjà OCRisés avec
+        les mêmes pixels, le même prétraitement et les mêmes psm/oem sont
+        relus depuis le cache au lieu de repasser par Tesseract.
+        """
+        self.config = config
+        self.config_path = config_path
+        self.ocr_dir = ocr_dir
+        self.visualization_dir = visualization_dir
+        self.save_ocr = save_ocr
+        self.visualize = visualize
+        self.cache = cache
+        self.lang = 'fra'
+
+        self.preprocess_pdf_flag = config.get("preprocess_pdf", False)
+        self.preprocess_tables_flag = config.get("preprocess_tables", False)
+        self.crop_tables_flag = config.get("crop_tables", False)
+        self.preprocessing_params = config.get("preprocessing_params")
+        # Étapes de prétraitement activées, construites une fois pour tous les documents
+        self.pretraitement = PreprocessingPipeline(self.preprocessing_params)
+
+        ocr_pdf_config = config.get("ocr", {}).get("pdf", {})
+        self.psm_pdf = ocr_pdf_config.get("psm", 3)
+        self.oem_pdf = ocr_pdf_config.get("oem", 3)
+        self.text_layer = ocr_pdf_config.get("text_layer", False)
+        # OCR limité aux bandes lues par le YAML (voir ocr_regions)
+        self.ocr_regions = ocr_pdf_config.get("regions", False)
+        self.region_margin = ocr_pdf_config.get("region_margin", DEFAULT_MARGIN)
+
+        # Moteur OCR (pytesseract, tesserocr) : `ocr.engine`, sinon variable OCR_ENGINE
+        self.ocr_engine = get_engine(config.get("ocr", {}).get("engine")).name
+        self._cle_moteur = None if self.ocr_engine == "pytesseract" else self.ocr_engine
+        self._detect_orientation = partial(detect_orientation, engine=self.ocr_engine)
+        self.ocr_workers = config.get("ocr", {}).get("workers", 1)
+        # Seconde passe sur les lignes de faible confiance (pages et tableaux)
+        self.reocr = reocr_settings(config.get("ocr", {}))
+        self._cle_relecture = self.reocr if self.reocr["enabled"] else None
+        self.omp_threads = config.get("ocr", {}).get("omp_threads")
+        # Pool OCR ouvert au premier besoin et gardé jusqu'à close() : pages,
+        # tableaux et relectures passent par les mêmes workers déjà chargés
+        self._pool_ocr = None
+
+        ocr_tables_config = config.get("ocr", {}).get("tables", {})
+        self.psm_tables = ocr_tables_config.get("psm", 3)
+        self.oem_tables = ocr_tables_config.get("oem", 3)
+        # Mode grid : une cellule = une ligne de texte
+        self.psm_cellules = ocr_tables_config.get("cell_psm", 7)
+
+        # Config de parsing compilée une fois (partagée entre pipelines via load_plan)
+        self.plan = load_plan(config_path) if config_path else compile_plan(config)
+
+        self.timings = {}
+
+    @classmethod
+    def from_yaml(cls, yaml_path, **kwargs):
+        with open(yaml_path, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f)
+        return cls(config, config_path=yaml_path, **kwargs)
+
+    def close(self):
+        """Ferme les pools OCR et de prétraitement (rouverts au besoin si le pipeline resert)."""
+        if self._pool_ocr is not None:
+            self._pool_ocr.shutdown()
+            self._pool_ocr = None
+        self.pretraitement.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _chrono(self, etape, debut):
+        self.timings[etape] = self.timings.get(etape, 0.0) + time.perf_counter() - debut
+
+    def open_pages(self, pdf_path, extra_consumers=()):
+        """Crée le PageImageProvider partagé par toutes les étapes pour ce document."""
+        consumers = [CONSOMMATEUR_PIPELINE, *extra_consumers]
+        return PageImageProvider.from_config(pdf_path, self.config, consumers=consumers)
+
+    def _pretraiter(self, image, orientation=None):
+        """Prétraite une image et cumule la durée de chaque étape dans timings (pretraitement.<étape>)."""
+        etapes = {}
+        page = self.pretraitement.run(image, orientation=orientation, timings=etapes)
+        for etape, duree in etapes.items():
+            cle = f"pretraitement.{etape}"
+            self.timings[cle] = self.timings.get(cle, 0.0) + duree
+        return page
+
+    def _cle_page(self, provider, pdf_digest, index):
+        """Clé de cache d'une page, sans rasteriser si l'alias PDF → image est déjà connu."""
+        page_digest = self.cache.get_alias(pdf_digest, index, provider.dpi, provider.engine)
+        if page_digest is None:
+            debut = time.perf_counter()
+            raw = provider.get(index)
+            self._chrono("rasterisation", debut)
+            page_digest = image_digest(raw)
+            self.cache.set_alias(pdf_digest, index, provider.dpi, provider.engine, page_digest)
+        preprocessing = preprocessing_cache_params(self.preprocessing_params) if self.preprocess_pdf_flag else None
+        regions = None
+        if self.ocr_regions:
+            regions = self._bandes(index)
+            regions = "page" if regions is None else regions
+        return self.cache.make_key(
+            page_digest, {"enabled": self.preprocess_pdf_flag, "params": preprocessing, "version": PREPROCESSING_VERSION},
+            psm=self.psm_pdf, oem=self.oem_pdf, lang=self.lang, regions=regions, engine=self._cle_moteur,
+            reocr=self._cle_relecture
+        )
+
+    def _bandes(self, index):
+        """Bandes à OCRiser sur la page `index` (0-based), None pour la page entière."""
+        return plan_bands(self.plan, index + 1, margin=self.region_margin)
+
+    def rasterize_and_preprocess(self, provider):
+        """
+        Lit chaque page une seule fois depuis le provider, la prétraite si
+        demandé puis la libère : la page brute est évincée du cache dès que
+        le pipeline (et les éventuels autres consommateurs) n'en ont plus besoin.
+
+        Retourne (pages, cles, donnees_cache) : pour une page dont les mots
+        sont déjà connus (couche texte native ou cache OCR), le prétraitement
+        est sauté, et la rasterisation aussi si aucune étape ne réclame l'image.
+        Exception : avec visualize, une page du cache OCR est prétraitée quand
+        même, ses mots étant placés sur la page prétraitée.
+        """
+        if not self.preprocess_pdf_flag:
+            print("⚠️ Prétraitement désactivé — OCR sur le PDF brut.")
+
+        pdf_digest = file_digest(provider.pdf_path) if self.cache else None
+        doc = fitz.open(provider.pdf_path) if self.text_layer else None
+        pages, cles, donnees_cache = [], [], []
+        for index in range(len(provider)):
+            cle, cached = None, None
+            if doc is not None:
+                debut = time.perf_counter()
+                cached = read_text_layer(doc, index, dpi=provider.dpi)
+                self._chrono("couche_texte", debut)
+                if cached is not None:
+                    print(f"📝 Page {index + 1} : couche texte native utilisée, pas d'OCR")
+            # Mots du cache OCR : coordonnées de la page prétraitée (et redressée)
+            coords_pretraitees = False
+            if cached is None and self.cache:
+                cle = self._cle_page(provider, pdf_digest, index)
+                cached = self.cache.get(cle)
+                coords_pretraitees = cached is not None and self.preprocess_pdf_flag
+
+            if cached is not None and not self.crop_tables_flag and not (self.visualize and coords_pretraitees):
+                # Pas de prétraitement : la visualisation se fait sur la page brute
+                page = provider.get(index) if self.visualize else None
+            else:
+                debut = time.perf_counter()
+                raw = provider.get(index)
+                self._chrono("rasterisation", debut)
+                if self.preprocess_pdf_flag:
+                    debut = time.perf_counter()
+                    orientation = None
+                    if "deskew" in self.pretraitement.step_names:
+                        orientation = provider.orientation(index, self._detect_orientation)
+                    page = self._pretraiter(raw, orientation=orientation)
+                    self._chrono("pretraitement", debut)
+                else:
+                    page = raw
+
+            provider.release(index, CONSOMMATEUR_PIPELINE)
+            pages.append(page)
+            cles.append(cle)
+            donnees_cache.append(cached)
+
+        if doc is not None:
+            doc.close()
+        return pages, cles, donnees_cache
+
+    def _ocr_images(self, images, psm, oem):
+        """Sorties image_to_data des images, via le pool OCR du pipeline si workers > 1."""
+        if self._pool_ocr is None and images:
+            self._pool_ocr = open_ocr_pool(self.ocr_workers, self.omp_threads)
+        return ocr_images_data(
+            images, psm=psm, oem=oem, lang=self.lang, workers=self.ocr_workers,
+            omp_threads=self.omp_threads, engine=self.ocr_engine, pool=self._pool_ocr
+        )
+
+    def _ocr_bandes(self, images, bandes, psm, oem):
+        """
+        OCR des seules bandes utiles de chaque page : toutes les bandes du
+        document passent ensemble dans le pool OCR, puis chaque page est
+        réassemblée en coordonnées page.
+        """
+        decoupes, bandes_pages = [], []
+        pixels_ocr = pixels_total = 0
+        for image, bandes_page in zip(images, bandes):
+            bandes_page = [(0, image.height)] if bandes_page is None else clip_bands(bandes_page, image.height)
+            bandes_pages.append(bandes_page)
+            decoupes.extend(crop_bands(image, bandes_page))
+            pixels_ocr += sum(y1 - y0 for y0, y1 in bandes_page) * image.width
+            pixels_total += image.height * image.width
+        if pixels_total:
+            print(f"🎯 OCR par zones : {len(decoupes)} bande(s), {100 * pixels_ocr / pixels_total:.0f}% des pixels")
+
+        donnees = iter(self._ocr_images(decoupes, psm, oem))
+        return [merge_band_data([next(donnees) for _ in bandes_page], bandes_page) for bandes_page in bandes_pages]
+
+    def _relire(self, images, donnees, oem):
+        """Relit les lignes de faible confiance des images tout juste OCRisées (voir ocr_refine)."""
+        debut = time.perf_counter()
+
+        def ocr_decoupes(decoupes, psm, variant_oem):
+            return self._ocr_images(decoupes, psm, oem if variant_oem is None else variant_oem)
+
+        donnees, relues, ameliorees = refine_ocr_data(images, donnees, self.reocr, ocr_decoupes)
+        if relues:
+            print(f"🔁 Relecture : {ameliorees}/{relues} ligne(s) de faible confiance améliorée(s)")
+        self._chrono("relecture", debut)
+        return donnees
+
+    def _ocr_avec_cache(self, images, cles, donnees_cache, psm, oem, page_numbers, bandes=None):
+        """
+        OCR des seules images absentes du cache, puis construction des pages dans l'ordre.
+        bandes : bandes à OCRiser par image (OCR par zones), sinon images entières.
+        """
+        a_faire = [i for i, data in enumerate(donnees_cache) if data is None]
+        if len(a_faire) < len(images):
+            print(f"♻️ {len(images) - len(a_faire)}/{len(images)} image(s) sans OCR (cache ou couche texte)")
+
+        if bandes is None:
+            nouvelles = self._ocr_images([images[i] for i in a_faire], psm, oem)
+        else:
+            nouvelles = self._ocr_bandes([images[i] for i in a_faire], [bandes[i] for i in a_faire], psm, oem)
+        if self.reocr["enabled"] and nouvelles:
+            nouvelles = self._relire([images[i] for i in a_faire], nouvelles, oem)
+        donnees = list(donnees_cache)
+        for i, data in zip(a_faire, nouvelles):
+            donnees[i] = data
+            if self.cache and cles[i]:
+                self.cache.put(cles[i], data)
+
+        return [build_page_result(data, page_num) for data, page_num in zip(donnees, page_numbers)]
+
+    def ocr(self, pages, cles=None, donnees_cache=None):
+        debut = time.perf_counter()
+        results = self._ocr_avec_cache(
+            pages,
+            cles or [None] * len(pages),
+            donnees_cache or [None] * len(pages),
+            self.psm_pdf, self.oem_pdf,
+            page_numbers=[page_num + 1 for page_num in range(len(pages))],
+            bandes=[self._bandes(index) for index in range(len(pages))] if self.ocr_regions else None
+        )
+        self._chrono("ocr", debut)
+        return results
+
+    def crop_tables(self, pages, nom_base, ocr_dir=None):
+        """
+        Détecte les tableaux sur les pages déjà rendues (et prétraitées) et
+        passe chaque TableRegion à l'OCR comme vue numpy de sa page : ni
+        copie, ni conversion d'image. Retourne une liste de tuples (nom, data).
+        ocr_dir : dossier des JSON OCR des tableaux (défaut : self.ocr_dir).
+        """
+        tables = []
+        if not self.crop_tables_flag:
+            return tables
+        ocr_dir = ocr_dir or self.ocr_dir
+
+        debut = time.perf_counter()
+        if self.plan.transactions is not None and self.plan.transactions.mode == "grid":
+            tables = self._grilles_tables(pages, nom_base, ocr_dir)
+            self._chrono("tableaux", debut)
+            print(f"📁 {len(tables)} tableau(x) trouvé(s)")
+            return tables
+
+        noms_tables, images_tables, cles, donnees_cache = [], [], [], []
+        preprocessing = preprocessing_cache_params(self.preprocessing_params) if self.preprocess_tables_flag else None
+        # Pages déjà redressées par le prétraitement : pas de nouvel OSD par tableau
+        orientation_tables = SANS_ROTATION if self.preprocess_pdf_flag else None
+        for page_num, page in enumerate(pages):
+            image = np.asarray(page)
+            regions = detect_table_regions(image, page_num)
+            print(f"[📄] Page {page_num + 1} → {len(regions)} tableau(x) détecté(s)")
+
+            for region in regions:
+                roi = region.view(image)
+
+                cle, cached = None, None
+                if self.cache:
+                    cle = self.cache.make_key(
+                        image_digest(roi),
+                        {"enabled": self.preprocess_tables_flag, "params": preprocessing, "version": PREPROCESSING_VERSION},
+                        psm=self.psm_tables, oem=self.oem_tables, lang=self.lang, engine=self._cle_moteur,
+                        reocr=self._cle_relecture
+                    )
+                    cached = self.cache.get(cle)
+                if cached is None and self.preprocess_tables_flag:
+                    roi = self._pretraiter(roi, orientation=orientation_tables)
+
+                noms_tables.append(region.name(nom_base))
+                images_tables.append(roi)
+                cles.append(cle)
+                donnees_cache.append(cached)
+
+        # Les tableaux sont indépendants : même pool OCR que pour les pages.
+        # Chaque tableau est une page unique, comme l'ancien PDF découpé.
+        resultats = self._ocr_avec_cache(
+            images_tables, cles, donnees_cache, self.psm_tables, self.oem_tables,
+            page_numbers=[1] * len(images_tables)
+        )
+        for nom_table, page_result in zip(noms_tables, resultats):
+            print(f"🔍 OCR sur le tableau : {nom_table}")
+            data = [page_result]
+            if self.save_ocr:
+                save_ocr_json(data, os.path.join(ocr_dir, f"{nom_table}.json"))
+            tables.append((f"{nom_table}.json", data))
+
+        self._chrono("tableaux", debut)
+        print(f"📁 {len(tables)} tableau(x) trouvé(s)")
+        return tables
+
+    def _grilles_tables(self, pages, nom_base, ocr_dir):
+        """
+        Mode grid : chaque tableau réglé est découpé en cellules (traits des
+        masques de detect_tables) et toutes les cellules non vides de toutes
+        les pages passent à l'OCR en un seul lot, en psm ligne (cell_psm).
+        Retourne des tuples (nom.grid.json, {"page", "rows": [{"y", "cells"}]}).
+        """
+        orientation_tables = SANS_ROTATION if self.preprocess_pdf_flag else None
+        grilles, positions, cellules, cles, donnees_cache = [], [], [], [], []
+        for page_num, page in enumerate(pages):
+            image = np.asarray(page)
+            regions = detect_table_regions(image, page_num)
+            print(f"[📄] Page {page_num + 1} → {len(regions)} tableau(x) détecté(s)")
+
+            for region in regions:
+                roi = region.view(image)
+                if self.preprocess_tables_flag:
+                    # Le prétraitement rend une image PIL : grille et cellules se lisent sur le tableau numpy
+                    roi = np.asarray(self._pretraiter(roi, orientation=orientation_tables))
+                grille = detect_grid(roi, region)
+                if grille is None:
+                    print(f"⚠️ {region.name(nom_base)} : pas de grille réglée, ignoré en mode grid")
+                    continue
+
+                rows = [{"y": region.y + y0, "cells": [""] * len(grille.columns)} for y0, _ in grille.rows]
+                for r, c, box in grille.cells():
+                    cellule = cell_view(roi, box)
+                    if cellule is None:
+                        continue
+                    cle, cached = None, None
+                    if self.cache:
+                        # Pixels déjà prétraités : l'empreinte de la cellule suffit
+                        cle = self.cache.make_key(
+                            image_digest(cellule), {"cellule": True},
+                            psm=self.psm_cellules, oem=self.oem_tables, lang=self.lang, engine=self._cle_moteur,
+                            reocr=self._cle_relecture
+                        )
+                        cached = self.cache.get(cle)
+                    positions.append((rows, r, c))
+                    cellules.append(cellule)
+                    cles.append(cle)
+                    donnees_cache.append(cached)
+                grilles.append((f"{region.name(nom_base)}.grid.json", {"page": page_num + 1, "rows": rows}))
+
+        print(f"🔍 OCR de {len(cellules)} cellule(s) de tableau")
+        resultats = self._ocr_avec_cache(
+            cellules, cles, donnees_cache, self.psm_cellules, self.oem_tables,
+            page_numbers=[1] * len(cellules)
+        )
+        for (rows, r, c), page_result in zip(positions, resultats):
+            rows[r]["cells"][c] = " ".join(
+                w["text"] for block in page_result["blocks"] for line in block["lines"] for w in line["words"]
+            )
+
+        if self.save_ocr:
+            os.makedirs(ocr_dir, exist_ok=True)
+            for nom, grille in grilles:
+                path = os.path.join(ocr_dir, nom)
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(grille, f, ensure_ascii=False, indent=2)
+                record_table(path, table_text(grille))
+        return grilles
+
+    def parse(self, ocr_json, ocr_json_path, tables=None, ocr_dir=None):
+        """ocr_dir : dossier des tableaux OCR sur disque (celui du job), sinon self.ocr_dir."""
+        debut = time.perf_counter()
+        result = parse_document(ocr_json, self.plan, ocr_json_path, tables=tables if self.crop_tables_flag else None,
+                                ocr_dir=ocr_dir or self.ocr_dir)
+        self._chrono("parsing", debut)
+        return result
+
+    def annotate(self, pages, ocr_json, nom_base, visualization_dir=None):
+        if any(page is None for page in pages):
+            return
+        try:
+            annotated = annotate_pages(pages, ocr_json)
+            save_annotated_pdf(annotated, os.path.join(visualization_dir or self.visualization_dir, f"{nom_base}_annotated.pdf"))
+        except Exception as e:
+            print(f"❌ Erreur lors de la visualisation OCR : {e}")
+
+    def run(self, pdf_path, provider=None, job=None):
+        """
+        provider : PageImageProvider optionnel, déjà partagé avec d'autres
+        étapes (ex. détection de banque). Il doit déclarer le consommateur
+        CONSOMMATEUR_PIPELINE.
+        job : JobContext optionnel ; les artefacts (JSON OCR, tableaux, PDF
+        annoté) vont alors dans son dossier au lieu de ocr_dir /
+        visualization_dir, partagés par toutes les extractions.
+        """
+        self.timings = {}
+        nom_base = Path(pdf_path).stem
+
+        proprietaire = provider is None
+        if proprietaire:
+            provider = self.open_pages(pdf_path)
+        try:
+            pages, cles, donnees_cache = self.rasterize_and_preprocess(provider)
+        finally:
+            if proprietaire:
+                provider.close()
+
+        print("🔍 Lancement de l'OCR sur le PDF complet...")
+        ocr_json = self.ocr(pages, cles, donnees_cache)
+        ocr_dir = job.subdir(OCR) if job is not None else self.ocr_dir
+        ocr_json_path = os.path.join(ocr_dir, f"{nom_base}.json")
+        if self.save_ocr:
+            save_ocr_json(ocr_json, ocr_json_path)
+        if self.visualize:
+            self.annotate(pages, ocr_json, nom_base,
+                          visualization_dir=job.subdir(VISUALIZATION) if job is not None else None)
+
+        if self.crop_tables_flag:
+            print("✂️ Découpage des tableaux...")
+        tables = self.crop_tables(pages, nom_base, ocr_dir=ocr_dir)
+
+        print("🧬 Parsing des données OCR vers fichier structuré...")
+        result = self.parse(ocr_json, ocr_json_path, tables=tables, ocr_dir=ocr_dir)
+
+        resume = ", ".join(f"{etape} {duree:.2f}s" for etape, duree in self.timings.items())
+        print(f"⏱️ Durées : {resume}")
+        return result
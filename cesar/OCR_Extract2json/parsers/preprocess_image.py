@@ -1,61 +1,167 @@
 import cv2
 import numpy as np
-from pdf2image import convert_from_path
-from pytesseract import image_to_osd, Output
 from PIL import Image
 import os
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from page_images import PageImageProvider
+from job_context import PREPROCESSED
+from ocr_engine import get_engine
 
-def deskew(image, config=None):
-    import tempfile
-    import subprocess
-    import re
-    import os
+# À incrémenter quand le prétraitement change de résultat : fait partie des clés du cache OCR
+PREPROCESSING_VERSION = 4
 
-    confidence_threshold = 3.0
-    if isinstance(config, dict):
-        confidence_threshold = config.get("confidence_threshold", 3.0)
+# Côté le plus long de la copie réduite passée à l'OSD (~140 dpi pour une page A4 à 300 dpi)
+OSD_MAX_SIDE = 1600
 
-    try:
-        # 📁 Tempfile image
-        os.makedirs("data/tmp_osd", exist_ok=True)
-        tmp_img_path = os.path.join("data/tmp_osd", "deskew_input.png")
-        pil_img = Image.fromarray(image)
-        pil_img.save(tmp_img_path, dpi=(300, 300))
-
-        # 🧠 Tesseract OSD via CLI
-        result = subprocess.run(
-            ["tesseract", tmp_img_path, "stdout", "--psm", "0", "-l", "osd"],
-            capture_output=True,
-            text=True
-        )
+# Orientation « ne pas tourner » (OSD en échec, ou page déjà redressée)
+SANS_ROTATION = (0, 0.0)
 
-        if result.returncode != 0:
-            raise RuntimeError(f"Tesseract OSD CLI error: {result.stderr}")
 
-        osd_output = result.stdout
-        angle_match = re.search(r"Rotate: (\d+)", osd_output)
-        conf_match = re.search(r"Orientation confidence: ([0-9.]+)", osd_output)
+def detect_orientation(image, max_side=OSD_MAX_SIDE, dpi=300, engine=None):
+    """
+    Orientation de la page par l'OSD de Tesseract, sur une copie réduite en
+    niveaux de gris. Retourne (rotation en degrés, confiance) ; (0, 0.0) si
+    l'OSD échoue (trop peu de texte...), ce qui n'entraîne aucune rotation.
 
-        if not angle_match or not conf_match:
-            raise ValueError("OSD output parsing failed.")
+    Aucun fichier à chemin fixe : appelable en parallèle sur plusieurs pages
+    ou plusieurs documents. engine : moteur OCR (voir ocr_engine).
+    """
+    try:
+        img = np.asarray(image)
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
 
-        angle = float(angle_match.group(1))
-        confidence = float(conf_match.group(1))
+        h, w = gray.shape[:2]
+        scale = min(1.0, max_side / max(h, w))
+        if scale < 1.0:
+            gray = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
 
-        if confidence < confidence_threshold:
-            print(f"[⚠️] Confiance trop faible pour corriger l'inclinaison : {confidence:.2f}")
-            return image
+        return get_engine(engine).osd(gray, dpi=max(70, int(dpi * scale)))
+    except Exception as e:
+        print(f"[❌] OSD failed: {e}")
+        return SANS_ROTATION
+
+
+# Côté le plus long de la copie réduite utilisée pour l'estimation fine de l'inclinaison
+SKEW_MAX_SIDE = 1200
+# Nombre maximal de pixels d'encre projetés par angle candidat
+SKEW_MAX_POINTS = 50000
+
+
+def _score_projection(xs, ys, angle_deg, n_bins):
+    """Netteté du profil horizontal des pixels d'encre après rotation de `angle_deg`."""
+    a = np.deg2rad(angle_deg)
+    proj = np.rint(ys * np.cos(a) - xs * np.sin(a)).astype(np.int64)
+    proj -= proj.min()
+    hist = np.bincount(proj, minlength=n_bins).astype(np.float64)
+    return float(np.dot(hist, hist))
+
+
+def estimate_skew(image, coarse_angle=0, max_angle=3.0, precision=0.05, max_side=SKEW_MAX_SIDE):
+    """
+    Inclinaison fine de la page (en degrés, dans le sens de
+    cv2.getRotationMatrix2D) par profils de projection sur une copie réduite
+    et binarisée, après la rotation grossière `coarse_angle` de l'OSD.
+
+    Les pixels d'encre sont projetés sur l'axe vertical pour chaque angle
+    candidat : les lignes de texte et les traits de tableau donnent le
+    profil le plus « piqué » quand ils sont horizontaux. Recherche grossière
+    par pas de 0,5° puis affinage jusqu'à `precision`.
+    """
+    img = np.asarray(image)
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+
+    # Facteur de réduction entier : chemin rapide de INTER_AREA
+    factor = -(-max(gray.shape[:2]) // max_side)
+    if factor > 1:
+        gray = cv2.resize(gray, None, fx=1 / factor, fy=1 / factor, interpolation=cv2.INTER_AREA)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+
+    # Même sens que la rotation grossière appliquée par rotate_page (horaire)
+    binary = np.rot90(binary, k=-(int(coarse_angle) // 90) % 4)
+
+    ys, xs = np.nonzero(binary)
+    if len(xs) < 100:
+        return 0.0
+    # Un échantillon régulier suffit à la forme du profil
+    stride = max(1, len(xs) // SKEW_MAX_POINTS)
+    xs, ys = xs[::stride], ys[::stride]
+    xs = xs.astype(np.float64)
+    ys = ys.astype(np.float64)
+    n_bins = int(np.hypot(*binary.shape)) + 2
+
+    best, step = 0.0, 0.5
+    candidates = np.arange(-max_angle, max_angle + step / 2, step)
+    while True:
+        scores = [_score_projection(xs, ys, a, n_bins) for a in candidates]
+        best = float(candidates[int(np.argmax(scores))])
+        if step <= precision:
+            break
+        step = max(step / 5, precision)
+        candidates = np.arange(best - 5 * step, best + 5 * step + step / 2, step)
+
+    return round(best, 3) + 0.0
+
+
+def rotate_page(image, coarse_angle=0, fine_angle=0.0):
+    """
+    Rotation grossière (0/90/180/270° dans le sens horaire, convention OSD)
+    et correction fine en un seul warpAffine. Pour 90/270° l'image de sortie
+    a les dimensions transposées ; les coins découverts sont blancs.
+    """
+    h, w = image.shape[:2]
+    out_w, out_h = (h, w) if int(coarse_angle) % 180 == 90 else (w, h)
+
+    rot_mat = cv2.getRotationMatrix2D(((w - 1) / 2, (h - 1) / 2), fine_angle - coarse_angle, 1.0)
+    rot_mat[0, 2] += (out_w - w) / 2
+    rot_mat[1, 2] += (out_h - h) / 2
+
+    blanc = 255 if image.ndim == 2 else (255,) * image.shape[2]
+    return cv2.warpAffine(image, rot_mat, (out_w, out_h), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=blanc)
+
+
+def deskew(image, config=None, orientation=None):
+    """
+    Redresse la page : rotation 0/90/180/270° détectée par l'OSD, puis
+    inclinaison fine (quelques degrés) estimée par estimate_skew, appliquées
+    ensemble par rotate_page.
+
+    orientation : (rotation, confiance) déjà détectée pour cette page (ex.
+    via PageImageProvider.orientation) ; sinon l'OSD est lancé sur `image`.
+    """
+    config = config if isinstance(config, dict) else {}
+    confidence_threshold = config.get("confidence_threshold", 3.0)
+    fine_config = config.get("fine", {})
 
-        if angle == 0:
+    try:
+        if orientation is None:
+            orientation = detect_orientation(image)
+        angle, confidence = orientation
+
+        if angle != 0 and confidence < confidence_threshold:
+            print(f"[⚠️] Confiance trop faible pour corriger l'orientation : {confidence:.2f}")
+            angle = 0
+
+        fine_angle = 0.0
+        if fine_config.get("enabled", True):
+            fine_angle = estimate_skew(
+                image, coarse_angle=angle,
+                max_angle=fine_config.get("max_angle", 3.0),
+                precision=fine_config.get("precision", 0.05)
+            )
+            # En dessous du seuil, l'interpolation coûterait plus qu'elle ne rapporte
+            if abs(fine_angle) < fine_config.get("min_angle", 0.1):
+                fine_angle = 0.0
+
+        if angle == 0 and fine_angle == 0.0:
             print(f"[ℹ️] Aucune rotation nécessaire (angle détecté : 0°)")
             return image
 
-        (h, w) = image.shape[:2]
-        center = (w // 2, h // 2)
-        rot_mat = cv2.getRotationMatrix2D(center, -angle, 1.0)
-        rotated = cv2.warpAffine(image, rot_mat, (w, h), flags=cv2.INTER_LINEAR)
-        print(f"[↪] Rotation appliquée : {-angle}° (confiance : {confidence:.2f})")
+        rotated = rotate_page(image, coarse_angle=angle, fine_angle=fine_angle)
+        print(f"[↪] Rotation appliquée : {-angle}° + {fine_angle}° (confiance : {confidence:.2f})")
         return rotated
 
     except Exception as e:
@@ -63,87 +169,302 @@ def deskew(image, config=None):
         return image
 
 
-def remove_uniform_background_by_similarity(gray, taille_voisinage, tol, pourcentage_similaire):
-    h, w = gray.shape
-    result = gray.copy()
-
-    mean_local = cv2.blur(gray.astype(np.float32), (taille_voisinage, taille_voisinage))
-    diff = np.abs(gray.astype(np.float32) - mean_local)
-    similar_mask = (diff <= tol).astype(np.uint8)
-
-    kernel = np.ones((taille_voisinage, taille_voisinage), dtype=np.uint8)
-    voisins_similaires = cv2.filter2D(similar_mask, -1, kernel)
-
-    max_voisins = taille_voisinage * taille_voisinage
-    seuil_voisins = int(pourcentage_similaire * max_voisins)
-
-    masque_a_blanchir = voisins_similaires >= seuil_voisins
-    result[masque_a_blanchir] = 255
-
-    return result.astype(np.uint8)
-
-def preprocess_page(pil_img, params=None):
-    if params is None:
-        params = {}
-
-    img = np.array(pil_img)
-    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-
-    # Blur
-    if params.get("blur", {}).get("enabled", True):
-        ksize = params.get("blur", {}).get("kernel_size", 3)
-        gray = cv2.GaussianBlur(gray, (ksize, ksize), 0)
-
-    # Background cleaning
-    bg_params = params.get("background_cleaning", {})
-    taille_voisinage = bg_params.get("taille_voisinage", 10)
-    tol = bg_params.get("tol", 25)
-    pourcentage_similaire = bg_params.get("pourcentage_similaire", 0.35)
-    cleaned = remove_uniform_background_by_similarity(gray, taille_voisinage, tol, pourcentage_similaire)
-
-    # CLAHE
-    clahe_params = params.get("clahe", {})
-    clip_limit = clahe_params.get("clip_limit", 2.0)
-    tile_grid = clahe_params.get("tile_grid_size", 8)
-    clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_grid, tile_grid))
-    enhanced = clahe.apply(cleaned)
-
-    # Binarisation
-    binar_params = params.get("binarization", {})
-    if binar_params.get("enabled", False):
-        enhanced = cv2.adaptiveThreshold(
-            enhanced, 255,
-            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY,
-            binar_params.get("block_size", 11),
-            binar_params.get("C", 2)
-        )
+def _box_sums(padded, k):
+    """Somme de chaque fenêtre k×k (ancre k//2, comme cv2.blur) d'une image déjà bordée, en int32 exact."""
+    integral = cv2.integral(padded, sdepth=cv2.CV_32S)
+    return integral[k:, k:] - integral[:-k, k:] - integral[k:, :-k] + integral[:-k, :-k]
 
-    result = deskew(enhanced)
-    return Image.fromarray(result)
 
-def preprocess_pdf(pdf_path, save_images=True, debug=False, mode_doux=True, params=None):
-    print(f"🔧 Prétraitement du PDF : {pdf_path}")
-    raw_pages = convert_from_path(pdf_path, dpi=300)
-    processed_pages = []
+def _rows_with_border(image, start, stop, before, after):
+    """Lignes [start - before, stop + after) de `image`, bordées en BORDER_REFLECT_101 hors de l'image (et à gauche/droite)."""
+    h = image.shape[0]
+    lo, hi = max(0, start - before), min(h, stop + after)
+    return cv2.copyMakeBorder(
+        image[lo:hi], before - (start - lo), after - (hi - stop), before, after, cv2.BORDER_REFLECT_101
+    )
 
-    if save_images:
-        out_dir = "data/tmp_preprocessed"
-        os.makedirs(out_dir, exist_ok=True)
 
-    for i, pil_img in enumerate(raw_pages):
-        processed = preprocess_page(pil_img, params=params)
-        processed_pages.append(processed)
+def remove_uniform_background_by_similarity(gray, taille_voisinage, tol, pourcentage_similaire, out=None,
+                                            strip_rows=512):
+    """
+    Met à blanc tout pixel dont au moins `pourcentage_similaire` du voisinage
+    taille_voisinage × taille_voisinage est « similaire », un voisin étant
+    similaire si |g - moyenne locale| <= tol.
+
+    Tout est calculé en entiers à partir d'images intégrales :
+    |g·n − S| <= floor(tol·n) avec S la somme de la fenêtre et n sa taille,
+    puis comptage des voisins similaires par une seconde somme de fenêtre.
+    Aucune saturation quelle que soit la taille du voisinage, et les bords
+    suivent BORDER_REFLECT_101 comme cv2.blur / cv2.filter2D.
 
-        if save_images:
-            output_path = os.path.join("data/tmp_preprocessed", f"page_{i+1}.png")
-            processed.save(output_path)
-            print(f"📏 Sauvegardé : {output_path}")
+    La page est traitée par bandes de `strip_rows` lignes (avec leur halo),
+    ce qui borne la mémoire des tableaux int32 et les valeurs des intégrales.
+    out : buffer uint8 de sortie (peut être `gray` lui-même) ; par défaut une copie.
+    """
+    result = gray.copy() if out is None else out
 
-        if debug:
-            print(f"[👁️] Affichage de la page prétraitée {i + 1}")
-            cv2.imshow("Prétraitement OCR", np.array(processed))
-            cv2.waitKey(0)
-            cv2.destroyAllWindows()
+    k = int(taille_voisinage)
+    n = k * k
+    before, after = k // 2, k - 1 - k // 2
+    tol_n = int(np.floor(tol * n))
+    seuil_voisins = int(pourcentage_similaire * n)
 
+    h, w = gray.shape
+    # Les intégrales int32 d'une bande restent < 2**31, et une bande couvre au moins son halo
+    max_rows = (2 ** 31 - 1) // (255 * (w + k)) - 2 * k
+    strip_rows = max(2 * k, min(strip_rows, max_rows))
+
+    # Écriture différée d'une bande : la suivante relit encore les 2·halo dernières lignes d'origine
+    pending = None
+    for start in range(0, h, strip_rows):
+        stop = min(h, start + strip_rows)
+
+        # Masque des pixels similaires sur les lignes nécessaires au comptage de la bande
+        m_lo, m_hi = max(0, start - before), min(h, stop + after)
+        sums = _box_sums(_rows_with_border(gray, m_lo, m_hi, before, after), k)
+        centre = gray[m_lo:m_hi].astype(np.int32)
+        centre *= n
+        centre -= sums
+        similar_mask = (np.abs(centre, out=centre) <= tol_n).astype(np.uint8)
+
+        # Voisins similaires : le masque couvre [m_lo, m_hi), bordé comme l'image entière
+        mask_padded = cv2.copyMakeBorder(
+            similar_mask, before - (start - m_lo), after - (m_hi - stop), before, after, cv2.BORDER_REFLECT_101
+        )
+        masque_a_blanchir = _box_sums(mask_padded, k) >= seuil_voisins
+
+        if pending is not None:
+            result[pending[0]:pending[1]][pending[2]] = 255
+        pending = (start, stop, masque_a_blanchir)
+
+    if pending is not None:
+        result[pending[0]:pending[1]][pending[2]] = 255
+
+    return result
+
+
+# Clés de preprocessing_params qui règlent l'exécution sans changer le résultat
+PARAMS_EXECUTION = ("tiling",)
+
+
+def preprocessing_cache_params(params):
+    """preprocessing_params sans les réglages d'exécution, pour les clés du cache OCR."""
+    if not params:
+        return params
+    return {k: v for k, v in params.items() if k not in PARAMS_EXECUTION}
+
+
+def _tile_bounds(length, tile_size):
+    return [(start, min(length, start + tile_size)) for start in range(0, length, tile_size)]
+
+
+class PreprocessingPipeline:
+    """
+    Étapes de prétraitement construites une fois depuis `preprocessing_params`,
+    dans l'ordre flou → nettoyage du fond → CLAHE → binarisation → deskew.
+
+    Seules les étapes activées (`enabled`) sont exécutées. Elles travaillent
+    sur un unique buffer uint8 en niveaux de gris, modifié en place quand
+    OpenCV le permet (seul le deskew produit une nouvelle image quand il
+    tourne la page). run() cumule la durée de chaque étape dans `timings`.
+
+    Avec `tiling.enabled`, les étapes locales (flou, nettoyage du fond,
+    binarisation) s'exécutent par tuiles dans un pool de threads (OpenCV
+    relâche le GIL). Chaque tuile est lue avec un halo au moins aussi large
+    que les noyaux des étapes enchaînées, puis seul son cœur est recopié :
+    le résultat est identique au traitement d'un seul bloc. CLAHE (dont la
+    grille dépend de la taille de l'image) et le deskew restent sur la page
+    entière. En mode tuiles, les durées par étape sont cumulées sur les
+    threads.
+    """
+
+    def __init__(self, params=None):
+        params = params or {}
+        self.params = params
+        # (nom, fonction(gray, orientation) -> gray, halo) ; halo None = page entière
+        self.steps = []
+
+        blur = params.get("blur") or {}
+        if blur.get("enabled", True):
+            ksize = blur.get("kernel_size", 3)
+            self.steps.append(("blur", lambda gray, _: cv2.GaussianBlur(gray, (ksize, ksize), 0, dst=gray), ksize // 2))
+
+        bg = params.get("background_cleaning") or {}
+        if bg.get("enabled", True):
+            taille_voisinage = bg.get("taille_voisinage", 10)
+            tol = bg.get("tol", 25)
+            pourcentage_similaire = bg.get("pourcentage_similaire", 0.35)
+            # Masque de similarité puis comptage des voisins : deux fenêtres enchaînées
+            self.steps.append(("background_cleaning", lambda gray, _: remove_uniform_background_by_similarity(
+                gray, taille_voisinage, tol, pourcentage_similaire, out=gray), taille_voisinage))
+
+        clahe_params = params.get("clahe") or {}
+        if clahe_params.get("enabled", True):
+            clip_limit = clahe_params.get("clip_limit", 2.0)
+            tile_grid = clahe_params.get("tile_grid_size", 8)
+            # Un objet CLAHE par appel : run() peut être appelé depuis plusieurs threads
+            self.steps.append(("clahe", lambda gray, _: cv2.createCLAHE(
+                clipLimit=clip_limit, tileGridSize=(tile_grid, tile_grid)).apply(gray, gray), None))
+
+        binar_params = params.get("binarization") or {}
+        if binar_params.get("enabled", False):
+            block_size = binar_params.get("block_size", 11)
+            c = binar_params.get("C", 2)
+            self.steps.append(("binarization", lambda gray, _: cv2.adaptiveThreshold(
+                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block_size, c, dst=gray), block_size // 2))
+
+        deskew_params = params.get("deskew") or {}
+        if deskew_params.get("enabled", True):
+            self.steps.append(("deskew", lambda gray, orientation: deskew(gray, config=deskew_params, orientation=orientation), None))
+
+        tiling = params.get("tiling") or {}
+        self.tiling = bool(tiling.get("enabled", False))
+        self.tile_size = tiling.get("tile_size", 1024)
+        self.tile_workers = tiling.get("workers", 0) or (os.cpu_count() or 1)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def step_names(self):
+        return [name for name, _, _ in self.steps]
+
+    def _segments(self):
+        """Regroupe les étapes consécutives exécutables par tuiles : [(étapes, halo cumulé ou None)]."""
+        segments = []
+        for name, step, halo in self.steps:
+            if halo is not None and self.tiling and segments and segments[-1][1] is not None:
+                segments[-1][0].append((name, step))
+                segments[-1] = (segments[-1][0], segments[-1][1] + halo)
+            elif halo is not None and self.tiling:
+                segments.append(([(name, step)], halo))
+            else:
+                segments.append(([(name, step)], None))
+        return segments
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.tile_workers, thread_name_prefix="pretraitement")
+            return self._pool
+
+    @staticmethod
+    def _run_steps(gray, steps, orientation, timings):
+        for name, step in steps:
+            debut = time.perf_counter()
+            gray = step(gray, orientation)
+            if timings is not None:
+                timings[name] = timings.get(name, 0.0) + time.perf_counter() - debut
+        return gray
+
+    def _run_tiled(self, gray, steps, halo, timings):
+        h, w = gray.shape
+        if h <= self.tile_size and w <= self.tile_size:
+            return self._run_steps(gray, steps, None, timings)
+
+        out = np.empty_like(gray)
+        tile_timings = []
+
+        def traiter_tuile(bounds):
+            (y0, y1), (x0, x1) = bounds
+            ty0, ty1 = max(0, y0 - halo), min(h, y1 + halo)
+            tx0, tx1 = max(0, x0 - halo), min(w, x1 + halo)
+            local = {}
+            tile = self._run_steps(gray[ty0:ty1, tx0:tx1].copy(), steps, None, local)
+            out[y0:y1, x0:x1] = tile[y0 - ty0:y1 - ty0, x0 - tx0:x1 - tx0]
+            tile_timings.append(local)
+
+        tuiles = [(ys, xs) for ys in _tile_bounds(h, self.tile_size) for xs in _tile_bounds(w, self.tile_size)]
+        list(self._executor().map(traiter_tuile, tuiles))
+
+        if timings is not None:
+            for local in tile_timings:
+                for name, duree in local.items():
+                    timings[name] = timings.get(name, 0.0) + duree
+        return out
+
+    def run(self, pil_img, orientation=None, timings=None):
+        """Retourne l'image PIL prétraitée ; timings : dict optionnel étape → secondes (cumulées)."""
+        img = np.array(pil_img)
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+
+        for steps, halo in self._segments():
+            if halo is None:
+                gray = self._run_steps(gray, steps, orientation, timings)
+            else:
+                gray = self._run_tiled(gray, steps, halo, timings)
+
+        return Image.fromarray(gray)
+
+    def close(self):
+        """Ferme le pool de tuiles (rouvert au besoin si le pipeline resert)."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def preprocess_page(pil_img, params=None, orientation=None, timings=None):
+    """
+    orientation : (rotation, confiance) déjà connue pour cette page, passée
+    à deskew pour éviter de relancer l'OSD.
+    timings : dict optionnel où cumuler la durée de chaque étape.
+    """
+    with PreprocessingPipeline(params) as pretraitement:
+        return pretraitement.run(pil_img, orientation=orientation, timings=timings)
+
+def preprocessed_dir(job=None):
+    """Dossier des pages prétraitées sauvegardées : celui du job, sinon l'ancien dossier partagé."""
+    if job is not None:
+        return job.subdir(PREPROCESSED)
+    os.makedirs("data/tmp_preprocessed", exist_ok=True)
+    return "data/tmp_preprocessed"
+
+def preprocess_pdf(pdf_path, save_images=True, debug=False, mode_doux=True, params=None, provider=None, job=None,
+                   indices=None):
+    """
+    job : JobContext dont le dossier reçoit les pages prétraitées (save_images),
+    pour que deux extractions simultanées ne s'écrasent pas.
+    indices : pages (0-based) à prétraiter, toutes par défaut ; la liste
+    retournée suit cet ordre.
+    """
+    print(f"🔧 Prétraitement du PDF : {pdf_path}")
+    if provider is None:
+        provider = PageImageProvider(pdf_path, dpi=300)
+    processed_pages = []
+
+    if save_images:
+        out_dir = preprocessed_dir(job)
+
+    timings = {}
+
+    with PreprocessingPipeline(params) as pretraitement:
+        redresser = "deskew" in pretraitement.step_names
+        if indices is None:
+            indices = range(len(provider))
+        for i in indices:
+            pil_img = provider.get(i)
+            orientation = provider.orientation(i, detect_orientation) if redresser else None
+            processed = pretraitement.run(pil_img, orientation=orientation, timings=timings)
+            processed_pages.append(processed)
+
+            if save_images:
+                output_path = os.path.join(out_dir, f"page_{i+1}.png")
+                processed.save(output_path)
+                print(f"📏 Sauvegardé : {output_path}")
+
+            if debug:
+                print(f"[👁️] Affichage de la page prétraitée {i + 1}")
+                cv2.imshow("Prétraitement OCR", np.array(processed))
+                cv2.waitKey(0)
+                cv2.destroyAllWindows()
+            provider.release(i, "pretraitement")
+
+    print("⏱️ Prétraitement : " + ", ".join(f"{etape} {duree:.2f}s" for etape, duree in timings.items()))
     return processed_pages
\ No newline at end of file
@@ -1,24 +1,37 @@
 import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
 import cv2
 import numpy as np
-from pdf2image import convert_from_path
-from preprocess_image import preprocess_page
+from preprocess_image import PreprocessingPipeline, detect_orientation
+from page_images import PageImageProvider
+from job_context import TABLES, JobContext
 from PIL import Image
 import argparse
 
-def detect_tables(image):
-    if len(image.shape) == 3:
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-    else:
-        gray = image.copy()
+# Dossier partagé historique, utilisé sans job ni --output-dir
+DEFAULT_TABLES_DIR = "data/tables_detected"
+
+
+def _gray(image):
+    return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if len(image.shape) == 3 else image
+
 
-    _, binary = cv2.threshold(gray, 180, 255, cv2.THRESH_BINARY_INV)
+def line_masks(image):
+    """Masques des traits horizontaux et verticaux (ouvertures morphologiques) d'une image."""
+    _, binary = cv2.threshold(_gray(image), 180, 255, cv2.THRESH_BINARY_INV)
 
     horiz_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (40, 1))
     horiz_lines = cv2.morphologyEx(binary, cv2.MORPH_OPEN, horiz_kernel, iterations=2)
 
     vert_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 40))
     vert_lines = cv2.morphologyEx(binary, cv2.MORPH_OPEN, vert_kernel, iterations=2)
+    return horiz_lines, vert_lines
+
+
+def detect_tables(image):
+    horiz_lines, vert_lines = line_masks(image)
 
     table_mask = cv2.add(horiz_lines, vert_lines)
 
@@ -33,50 +46,153 @@ def detect_tables(image):
     return table_boxes
 
 
-def crop_tables_from_pdf(pdf_path, output_dir="data/tables_detected", visualize=False, use_preprocessing=True):
+@dataclass(frozen=True)
+class TableRegion:
+    """Tableau détecté : page (0-based), rang sur la page (0-based) et boîte en pixels de l'image de page."""
+    page_index: int
+    index: int
+    x: int
+    y: int
+    width: int
+    height: int
+
+    def name(self, base_name):
+        """Nom historique du tableau : <base>_p<page>_tab<rang> (1-based)."""
+        return f"{base_name}_p{self.page_index + 1}_tab{self.index + 1}"
+
+    def view(self, page_array):
+        """Vue numpy du tableau dans le tableau de la page : aucune copie des pixels."""
+        return page_array[self.y:self.y + self.height, self.x:self.x + self.width]
+
+
+def detect_table_regions(page_array, page_index):
+    """Tableaux d'une page déjà rendue (et prétraitée) sous forme de TableRegion."""
+    return [
+        TableRegion(page_index, i, int(x), int(y), int(w), int(h))
+        for i, (x, y, w, h) in enumerate(detect_tables(page_array))
+    ]
+
+
+@dataclass(frozen=True)
+class TableGrid:
+    """
+    Grille d'un tableau réglé : intérieur (sans les traits) de chaque rangée
+    (y0, y1) et de chaque colonne (x0, x1), en pixels relatifs au tableau.
+    """
+    region: TableRegion
+    rows: Tuple[Tuple[int, int], ...]
+    columns: Tuple[Tuple[int, int], ...]
+
+    def cells(self):
+        """(rangée, colonne, (x0, y0, x1, y1)) de chaque cellule, rangée par rangée."""
+        for r, (y0, y1) in enumerate(self.rows):
+            for c, (x0, x1) in enumerate(self.columns):
+                yield r, c, (x0, y0, x1, y1)
+
+
+def _intervalles(profil, longueur_min, taille, cellule_min):
+    """
+    Intérieurs entre les traits d'un profil de projection : un trait est une
+    suite d'indices où au moins `longueur_min` pixels appartiennent au
+    masque ; les bords du tableau ferment la première et la dernière case.
+    """
+    traits = np.flatnonzero(profil >= longueur_min)
+    bornes = [-1]
+    if len(traits):
+        ruptures = np.flatnonzero(np.diff(traits) > 1)
+        debuts = np.concatenate(([traits[0]], traits[ruptures + 1]))
+        fins = np.concatenate((traits[ruptures], [traits[-1]]))
+        for debut, fin in zip(debuts.tolist(), fins.tolist()):
+            bornes.extend((debut, fin))
+    bornes.append(taille)
+
+    # bornes = [-1, début trait 1, fin trait 1, ..., taille] : intérieurs entre fin d'un trait et début du suivant
+    return tuple(
+        (fin + 1, debut) for fin, debut in zip(bornes[0::2], bornes[1::2])
+        if debut - (fin + 1) >= cellule_min
+    )
+
+
+def detect_grid(table_array, region, min_line_fraction=0.5, min_cell=8) -> Optional[TableGrid]:
+    """
+    Rangées et colonnes d'un tableau réglé, à partir des mêmes masques de
+    traits que detect_tables : un trait horizontal (vertical) doit couvrir
+    au moins `min_line_fraction` de la largeur (hauteur) du tableau.
+    Retourne None si le tableau n'a pas au moins deux colonnes.
+    """
+    horiz_lines, vert_lines = line_masks(table_array)
+    hauteur, largeur = horiz_lines.shape[:2]
+    rows = _intervalles(np.count_nonzero(horiz_lines, axis=1), min_line_fraction * largeur, hauteur, min_cell)
+    columns = _intervalles(np.count_nonzero(vert_lines, axis=0), min_line_fraction * hauteur, largeur, min_cell)
+    if len(columns) < 2 or not rows:
+        return None
+    return TableGrid(region, rows, columns)
+
+
+def cell_view(table_array, box, inset=2, min_ink=0.002):
+    """
+    Vue numpy d'une cellule, réduite de `inset` pixels pour écarter les
+    restes de traits ; None si la cellule est vide (moins de `min_ink` de
+    pixels sombres) : inutile de la passer à l'OCR.
+    """
+    x0, y0, x1, y1 = box
+    cellule = table_array[y0 + inset:y1 - inset, x0 + inset:x1 - inset]
+    if cellule.size == 0 or np.count_nonzero(_gray(cellule) < 128) < min_ink * cellule.shape[0] * cellule.shape[1]:
+        return None
+    return cellule
+
+
+def crop_tables_from_pdf(pdf_path, output_dir=None, visualize=False, use_preprocessing=True, provider=None, job=None):
+    """
+    Sauvegarde chaque tableau détecté en PDF dans output_dir ; par défaut le
+    dossier `tables` du job s'il y en a un, sinon data/tables_detected.
+    """
     print(f"🔍 Traitement de : {pdf_path}")
+    if output_dir is None:
+        output_dir = job.subdir(TABLES) if job is not None else DEFAULT_TABLES_DIR
     os.makedirs(output_dir, exist_ok=True)
-    pages = convert_from_path(pdf_path, dpi=300)
+    if provider is None:
+        provider = PageImageProvider(pdf_path, dpi=300)
 
     base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-
-    for page_num, pil_page in enumerate(pages):
-        if use_preprocessing:
-            processed = preprocess_page(pil_page)
-        else:
-            print("⚠️ Prétraitement désactivé — traitement sur l'image brute.")
-            processed = pil_page
-
-        image = np.array(processed)
-        boxes = detect_tables(image)
-
-        print(f"[📄] Page {page_num + 1} → {len(boxes)} tableau(x) détecté(s)")
-
-        for i, (x, y, w, h) in enumerate(boxes):
-            roi = image[y:y + h, x:x + w]
-            roi_pil = Image.fromarray(roi)
-            if roi_pil.mode != "RGB":
-                roi_pil = roi_pil.convert("RGB")
-
-            # Format du nom : nompdf_p1_tab1.pdf
-            filename = f"{base_name}_p{page_num+1}_tab{i+1}.pdf"
-            roi_path = os.path.join(output_dir, filename)
-            roi_pil.save(roi_path, "PDF", resolution=300.0)
-            print(f"   💾 Sauvegardé : {roi_path}")
-
-        if visualize:
-            annotated = image.copy()
-            for (x, y, w, h) in boxes:
-                cv2.rectangle(annotated, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            cv2.imshow(f"Page {page_num+1}", annotated)
-            cv2.waitKey(0)
-            cv2.destroyAllWindows()
+    with PreprocessingPipeline() as pretraitement:
+        for page_num, pil_page in provider.iter_pages("tableaux"):
+            if use_preprocessing:
+                processed = pretraitement.run(pil_page, orientation=provider.orientation(page_num, detect_orientation))
+            else:
+                print("⚠️ Prétraitement désactivé — traitement sur l'image brute.")
+                processed = pil_page
+
+            image = np.array(processed)
+            regions = detect_table_regions(image, page_num)
+
+            print(f"[📄] Page {page_num + 1} → {len(regions)} tableau(x) détecté(s)")
+
+            for region in regions:
+                roi_pil = Image.fromarray(region.view(image))
+                if roi_pil.mode != "RGB":
+                    roi_pil = roi_pil.convert("RGB")
+
+                # Format du nom : nompdf_p1_tab1.pdf
+                filename = f"{region.name(base_name)}.pdf"
+                roi_path = os.path.join(output_dir, filename)
+                roi_pil.save(roi_path, "PDF", resolution=300.0)
+                print(f"   💾 Sauvegardé : {roi_path}")
+
+            if visualize:
+                annotated = image.copy()
+                for r in regions:
+                    cv2.rectangle(annotated, (r.x, r.y), (r.x + r.width, r.y + r.height), (0, 255, 0), 2)
+                cv2.imshow(f"Page {page_num+1}", annotated)
+                cv2.waitKey(0)
+                cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Détecte et recadre les tableaux dans un PDF ou une image.")
     parser.add_argument("pdf_path", help="Chemin vers le PDF à traiter")
-    parser.add_argument("--output-dir", default="data/tables_detected", help="Dossier où sauvegarder les tableaux")
+    parser.add_argument("--output-dir", help="Dossier où sauvegarder les tableaux (défaut : tables/ de --job-dir, sinon data/tables_detected)")
+    parser.add_argument("--job-dir", help="Dossier de travail de cette extraction (voir job_context)")
     parser.add_argument("--visualize", action="store_true", help="Afficher les tableaux détectés")
     parser.add_argument("--no-preprocess", action="store_true", help="Désactiver le prétraitement de l'image")
 
@@ -86,5 +202,6 @@ if __name__ == "__main__":
         args.pdf_path,
         output_dir=args.output_dir,
         visualize=args.visualize,
-        use_preprocessing=not args.no_preprocess
+        use_preprocessing=not args.no_preprocess,
+        job=JobContext(path=args.job_dir) if args.job_dir else None
     )
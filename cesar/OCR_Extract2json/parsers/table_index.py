@@ -0,0 +1,103 @@
+"""
+Index SQLite des tableaux OCR d'un dossier (data/ocr/tables.sqlite).
+
+Chaque tableau OCRisé (<pdf>_p<page>_tab<rang>.json, ou .grid.json en mode
+grid) y est enregistré à l'écriture avec son document, sa page, son rang et
+son texte en minuscules. Le choix des tableaux d'un document (filter_all /
+filter_any) devient une requête sur l'index (document, type) : ni listing
+du dossier, ni chargement des JSON des autres documents.
+"""
+import os
+import re
+import sqlite3
+
+INDEX_NAME = "tables.sqlite"
+
+# <document>_p<page>_tab<rang>.json ou .grid.json (voir table_cropper.TableRegion.name)
+_NOM_TABLEAU = re.compile(r"^(?P<document>.+)_p(?P<page>\d+)_tab(?P<rang>\d+)(?P<grid>\.grid)?\.json$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tables (
+    fname TEXT PRIMARY KEY,
+    document TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    rang INTEGER NOT NULL,
+    grid INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    texte TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tables_document ON tables (document, grid);
+"""
+
+
+def parse_table_name(fname):
+    """(document, page, rang, grid) d'un nom de tableau OCR, None si ce n'en est pas un."""
+    match = _NOM_TABLEAU.match(fname)
+    if not match:
+        return None
+    return match["document"], int(match["page"]), int(match["rang"]), match["grid"] is not None
+
+
+def index_path(ocr_dir):
+    return os.path.join(ocr_dir, INDEX_NAME)
+
+
+def _connect(ocr_dir):
+    os.makedirs(ocr_dir, exist_ok=True)
+    # Plusieurs processus (batch, API) peuvent écrire dans le même data/ocr
+    conn = sqlite3.connect(index_path(ocr_dir), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def record_table(path, text):
+    """Enregistre (ou remplace) le tableau écrit en `path` avec son texte. Sans effet pour un autre fichier."""
+    ocr_dir, fname = os.path.split(path)
+    parsed = parse_table_name(fname)
+    if parsed is None:
+        return
+    document, page, rang, grid = parsed
+    with _connect(ocr_dir or ".") as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO tables (fname, document, page, rang, grid, mtime, texte) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (fname, document, page, rang, int(grid), os.path.getmtime(path), text.lower())
+        )
+    conn.close()
+
+
+def query_tables(ocr_dir, document, filter_all=None, filter_any=None, grid=False):
+    """
+    Noms des tableaux indexés du document qui contiennent tous les mots de
+    filter_all et au moins un de filter_any (sous-chaînes, sans casse), dans
+    l'ordre (page, rang). Retourne None si l'index n'existe pas, ne connaît
+    pas ce document ou est plus ancien qu'un de ses fichiers : il faut alors
+    parcourir le dossier.
+    """
+    if not os.path.exists(index_path(ocr_dir)):
+        return None
+
+    conditions = ["document = ?", "grid = ?"]
+    params = [document, int(grid)]
+    for mot in filter_all or ():
+        conditions.append("instr(texte, ?) > 0")
+        params.append(mot.lower())
+    if filter_any:
+        conditions.append("(" + " OR ".join("instr(texte, ?) > 0" for _ in filter_any) + ")")
+        params.extend(mot.lower() for mot in filter_any)
+
+    with _connect(ocr_dir) as conn:
+        connus = conn.execute("SELECT COUNT(*) FROM tables WHERE document = ? AND grid = ?", (document, int(grid))).fetchone()[0]
+        lignes = conn.execute(
+            f"SELECT fname, mtime FROM tables WHERE {' AND '.join(conditions)} ORDER BY page, rang", params
+        ).fetchall()
+    conn.close()
+    if not connus:
+        return None
+
+    try:
+        if any(os.path.getmtime(os.path.join(ocr_dir, fname)) > mtime for fname, mtime in lignes):
+            return None
+    except OSError:
+        return None
+    return [fname for fname, _ in lignes]
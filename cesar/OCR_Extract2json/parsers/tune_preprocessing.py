@@ -0,0 +1,278 @@
+import argparse
+import copy
+import itertools
+import json
+import os
+import random
+import re
+import tempfile
+import time
+
+import yaml
+
+from batch_extract import lister_documents
+from extract_data import charger_config_yaml, ecrire_resultat
+from page_images import PageImageProvider
+from pipeline import ExtractionPipeline
+from preprocess_image import PreprocessingPipeline, detect_orientation
+
+# Espace de recherche par défaut : chemin pointé dans preprocessing_params → valeurs essayées
+DEFAULT_GRID = {
+    "blur.kernel_size": [3, 5],
+    "background_cleaning.taille_voisinage": [6, 10, 14],
+    "background_cleaning.tol": [15, 25],
+    "clahe.enabled": [False, True],
+    "binarization.enabled": [False, True],
+    "binarization.block_size": [11, 21],
+}
+
+CLES_HORS_CHAMPS = ("transactions", "lignes_exclues", "fichiers_tables")
+
+
+def charger_grille(grid_path):
+    if not grid_path:
+        return DEFAULT_GRID
+    with open(grid_path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+
+def _appliquer(params, chemin, valeur):
+    noeud = params
+    *parents, feuille = chemin.split(".")
+    for cle in parents:
+        if not isinstance(noeud.get(cle), dict):
+            noeud[cle] = {}
+        noeud = noeud[cle]
+    noeud[feuille] = valeur
+
+
+def _forme_effective(params):
+    """Paramètres réellement utilisés : une étape désactivée ne garde que `enabled: false`."""
+    effectifs = {}
+    for etape, reglages in params.items():
+        if isinstance(reglages, dict) and reglages.get("enabled") is False:
+            effectifs[etape] = {"enabled": False}
+        else:
+            effectifs[etape] = reglages
+    return effectifs
+
+
+def generer_candidats(base_params, grille, max_trials=None, seed=0):
+    """
+    Combinaisons de la grille appliquées sur les paramètres actuels, sans
+    doublons effectifs. Les paramètres actuels sont toujours le premier
+    candidat (référence). max_trials : échantillon aléatoire reproductible.
+    """
+    base = _forme_effective(copy.deepcopy(base_params or {}))
+    vus = {json.dumps(base, sort_keys=True)}
+    candidats = []
+
+    chemins = list(grille)
+    for valeurs in itertools.product(*(grille[c] for c in chemins)):
+        params = copy.deepcopy(base_params or {})
+        for chemin, valeur in zip(chemins, valeurs):
+            _appliquer(params, chemin, valeur)
+        params = _forme_effective(params)
+        signature = json.dumps(params, sort_keys=True)
+        if signature not in vus:
+            vus.add(signature)
+            candidats.append(params)
+
+    if max_trials is not None and len(candidats) > max_trials - 1:
+        candidats = random.Random(seed).sample(candidats, max(0, max_trials - 1))
+    return [base] + candidats
+
+
+def _normaliser(valeur):
+    if isinstance(valeur, bool) or valeur is None:
+        return valeur
+    if isinstance(valeur, (int, float)):
+        return round(float(valeur), 2)
+    return " ".join(str(valeur).split()).casefold()
+
+
+def score_document(result, expected):
+    """
+    (bonnes valeurs, valeurs attendues) : champs simples, puis cellules des
+    transactions comparées ligne à ligne. Les transactions en trop comptent
+    comme des erreurs.
+    """
+    bons = total = 0
+    for cle, valeur in expected.items():
+        if cle in CLES_HORS_CHAMPS:
+            continue
+        total += 1
+        bons += _normaliser(result.get(cle)) == _normaliser(valeur)
+
+    attendues = expected.get("transactions", [])
+    obtenues = result.get("transactions", [])
+    for i, tx in enumerate(attendues):
+        for colonne, valeur in tx.items():
+            total += 1
+            if i < len(obtenues) and _normaliser(obtenues[i].get(colonne)) == _normaliser(valeur):
+                bons += 1
+    total += max(0, len(obtenues) - len(attendues))
+    return bons, total
+
+
+def pareto_front(essais):
+    """Essais non dominés : aucun autre n'est à la fois au moins aussi précis et au moins aussi rapide (et strictement meilleur sur l'un)."""
+    front = []
+    for e in essais:
+        domine = any(
+            o["precision"] >= e["precision"] and o["secondes_par_page"] <= e["secondes_par_page"]
+            and (o["precision"] > e["precision"] or o["secondes_par_page"] < e["secondes_par_page"])
+            for o in essais
+        )
+        if not domine:
+            front.append(e)
+    return sorted(front, key=lambda e: e["secondes_par_page"])
+
+
+def choisir(front, tolerance=0.0):
+    """Le plus rapide des essais du front dont la précision reste à `tolerance` près de la meilleure."""
+    meilleure = max(e["precision"] for e in front)
+    retenus = [e for e in front if e["precision"] >= meilleure - tolerance]
+    return min(retenus, key=lambda e: e["secondes_par_page"])
+
+
+def ouvrir_documents(documents, config):
+    """Rend chaque page (et son orientation) une seule fois pour tous les essais."""
+    providers = {}
+    redresser = "deskew" in PreprocessingPipeline(config.get("preprocessing_params")).step_names
+    for doc in documents:
+        provider = PageImageProvider.from_config(doc["pdf"], config)
+        for index in range(len(provider)):
+            provider.get(index)
+            if redresser:
+                provider.orientation(index, detect_orientation)
+        providers[doc["pdf"]] = provider
+    return providers
+
+
+def evaluer(config, config_path, params, documents, attendus, providers):
+    essai_config = copy.deepcopy(config)
+    essai_config["preprocessing_params"] = params
+    pipeline = ExtractionPipeline(essai_config, config_path=config_path, save_ocr=False, visualize=False, cache=None)
+
+    bons = total = pages = 0
+    duree = 0.0
+    try:
+        for doc in documents:
+            provider = providers[doc["pdf"]]
+            debut = time.perf_counter()
+            result = pipeline.run(doc["pdf"], provider=provider)
+            duree += time.perf_counter() - debut
+            pages += len(provider)
+            b, t = score_document(result, attendus[doc["pdf"]])
+            bons += b
+            total += t
+    finally:
+        pipeline.close()
+
+    return {
+        "params": params,
+        "precision": round(bons / total, 4) if total else 0.0,
+        "secondes_par_page": round(duree / max(pages, 1), 3),
+    }
+
+
+def ecrire_preprocessing_params(yaml_path, params, output_path=None):
+    """
+    Remplace le bloc `preprocessing_params:` du YAML au niveau du texte (les
+    commentaires et l'ordre du reste du fichier sont conservés). Sans bloc
+    existant, il est inséré avant `ocr:` ou ajouté en fin de fichier.
+    """
+    with open(yaml_path, 'r', encoding='utf-8') as f:
+        lignes = f.read().splitlines(keepends=True)
+
+    contenu = yaml.safe_dump(params, sort_keys=False, allow_unicode=True, default_flow_style=False)
+    bloc = ["preprocessing_params:\n"] + [f"  {ligne}\n" for ligne in contenu.splitlines()]
+
+    debut = next((i for i, l in enumerate(lignes) if re.match(r"^preprocessing_params:\s*(#.*)?$", l)), None)
+    if debut is not None:
+        fin = next((j for j in range(debut + 1, len(lignes)) if re.match(r"^[^\s#]", lignes[j])), len(lignes))
+        # Les lignes vides qui séparaient le bloc de la clé suivante sont gardées
+        while fin > debut + 1 and not lignes[fin - 1].strip():
+            fin -= 1
+        lignes[debut:fin] = bloc
+    else:
+        position = next((i for i, l in enumerate(lignes) if re.match(r"^ocr:", l)), None)
+        if position is None:
+            if lignes and not lignes[-1].endswith("\n"):
+                lignes[-1] += "\n"
+            lignes += ["\n"] + bloc
+        else:
+            lignes[position:position] = bloc + ["\n"]
+
+    cible = output_path or yaml_path
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cible)), suffix=".tmp")
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.writelines(lignes)
+    os.replace(tmp_path, cible)
+    return cible
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recherche des preprocessing_params les plus rapides à précision égale sur un jeu annoté"
+    )
+    parser.add_argument("--config", required=True, help="Fichier YAML de la banque à régler")
+    parser.add_argument("--labels", required=True, help="Manifeste CSV/JSONL : colonnes pdf, expected (JSON structuré attendu)")
+    parser.add_argument("--grid", help="YAML chemin.pointé → liste de valeurs (défaut : grille intégrée)")
+    parser.add_argument("--max-trials", type=int, help="Nombre maximal d'essais (échantillon aléatoire de la grille)")
+    parser.add_argument("--seed", type=int, default=0, help="Graine de l'échantillonnage")
+    parser.add_argument("--accuracy-tolerance", type=float, default=0.0,
+                        help="Perte de précision acceptée pour un réglage plus rapide (ex. 0.01)")
+    parser.add_argument("--report", default="data/output/tuning_report.json", help="Rapport JSON de tous les essais")
+    parser.add_argument("--output", help="Écrire le YAML réglé ailleurs qu'à la place de --config")
+    parser.add_argument("--dry-run", action="store_true", help="Ne pas modifier le YAML")
+    args = parser.parse_args()
+
+    config = charger_config_yaml(args.config)
+    if not config.get("preprocess_pdf") and not config.get("preprocess_tables"):
+        parser.error("preprocess_pdf et preprocess_tables sont désactivés : aucun prétraitement à régler")
+
+    documents = lister_documents(manifest=args.labels)
+    attendus = {}
+    for doc in documents:
+        if not doc.get("expected"):
+            parser.error(f"Colonne 'expected' manquante pour {doc['pdf']}")
+        with open(doc["expected"], 'r', encoding='utf-8') as f:
+            attendus[doc["pdf"]] = json.load(f)
+
+    candidats = generer_candidats(config.get("preprocessing_params"), charger_grille(args.grid),
+                                  max_trials=args.max_trials, seed=args.seed)
+    print(f"🎛️ {len(candidats)} réglage(s) à évaluer sur {len(documents)} document(s)")
+
+    providers = ouvrir_documents(documents, config)
+    essais = []
+    try:
+        for i, params in enumerate(candidats, start=1):
+            essai = evaluer(config, args.config, params, documents, attendus, providers)
+            essais.append(essai)
+            print(f"[{i}/{len(candidats)}] précision {essai['precision']:.3f} — {essai['secondes_par_page']:.2f}s/page")
+    finally:
+        for provider in providers.values():
+            provider.close()
+
+    front = pareto_front(essais)
+    choix = choisir(front, tolerance=args.accuracy_tolerance)
+    reference = essais[0]
+
+    ecrire_resultat({"reference": reference, "choix": choix, "pareto": front, "essais": essais}, args.report)
+    print(f"📊 Front de Pareto ({len(front)} réglage(s)) → {args.report}")
+    print(f"🏁 Référence : précision {reference['precision']:.3f}, {reference['secondes_par_page']:.2f}s/page")
+    print(f"✅ Retenu    : précision {choix['precision']:.3f}, {choix['secondes_par_page']:.2f}s/page")
+
+    if args.dry_run:
+        return
+    if choix is reference:
+        print("ℹ️ Les paramètres actuels restent les meilleurs : YAML inchangé")
+        return
+    cible = ecrire_preprocessing_params(args.config, choix["params"], output_path=args.output)
+    print(f"💾 preprocessing_params écrit dans {cible}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import os
+
+import numpy as np
+
+# Colonnes numériques d'un mot OCR (voir ocr_reader.build_page_result), dans l'ordre des clés du JSON
+COLONNES = ("x", "y", "width", "height", "page", "line_num", "block_num", "word_num", "conf")
+
+# Version du format .words.npz
+FORMAT_VERSION = 1
+# Séparateur des textes du vocabulaire dans le .npz (absent des mots OCR)
+_SEPARATEUR = "\x1f"
+
+
+def words_path(ocr_json_path):
+    """Chemin du .words.npz écrit à côté d'un JSON OCR (data/ocr/x.json → data/ocr/x.words.npz)."""
+    base, _ = os.path.splitext(ocr_json_path)
+    return base + ".words.npz"
+
+
+def _colonne(valeurs):
+    """Tableau numpy compact : int32 si toutes les valeurs sont entières, float64 sinon."""
+    tableau = np.asarray(valeurs)
+    if tableau.dtype.kind in "iub":
+        return tableau.astype(np.int32)
+    return tableau.astype(np.float64)
+
+
+class WordStore:
+    """
+    Mots OCR d'un document en colonnes : un tableau numpy par coordonnée
+    (x, y, width, height, page, line_num, block_num, word_num, conf) et
+    les textes internés (un code par mot, chaque texte distinct une fois
+    dans `vocab`).
+
+    Les recherches du parser (zone rectangulaire, bande de lignes, texte
+    contenant une ancre, regex) sont des masques sur les colonnes ; la regex
+    ou la sous-chaîne n'est testée qu'une fois par texte distinct. Seuls les
+    mots retenus sont matérialisés en dicts (même format que le JSON OCR),
+    une fois chacun : deux requêtes renvoient le même objet pour un mot.
+    """
+
+    def __init__(self, columns, text_codes, vocab):
+        self.columns = columns
+        self.text_codes = text_codes
+        self.vocab = vocab
+        self._words = {}
+        self._vocab_lower = None
+        self._pages = {}
+        self._sorted = None
+        self._sorted_page = None
+        self._sorted_y = None
+
+    def __len__(self):
+        return len(self.text_codes)
+
+    @classmethod
+    def from_pages(cls, pages):
+        """Depuis le JSON OCR (pages → blocs → lignes → mots), dans l'ordre de lecture."""
+        valeurs = {colonne: [] for colonne in COLONNES}
+        codes, vocab, interne = [], [], {}
+        for page in pages:
+            for block in page.get('blocks', []):
+                for line in block.get('lines', []):
+                    for w in line.get('words', []):
+                        for colonne in COLONNES:
+                            valeurs[colonne].append(w[colonne])
+                        code = interne.get(w['text'])
+                        if code is None:
+                            code = interne[w['text']] = len(vocab)
+                            vocab.append(w['text'])
+                        codes.append(code)
+
+        columns = {colonne: _colonne(v) for colonne, v in valeurs.items()}
+        return cls(columns, np.asarray(codes, dtype=np.int32), vocab)
+
+    def save(self, path):
+        """Format binaire compact : colonnes brutes + vocabulaire UTF-8 en un seul bloc."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        vocab = np.frombuffer(_SEPARATEUR.join(self.vocab).encode('utf-8'), dtype=np.uint8)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, version=np.int32(FORMAT_VERSION), text_codes=self.text_codes,
+                 vocab=vocab, vocab_size=np.int64(len(self.vocab)), **self.columns)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != FORMAT_VERSION:
+                raise ValueError(f"Format {path} non supporté (version {int(data['version'])})")
+            columns = {colonne: data[colonne] for colonne in COLONNES}
+            vocab = data["vocab"].tobytes().decode('utf-8').split(_SEPARATEUR) if int(data["vocab_size"]) else []
+            return cls(columns, data["text_codes"], vocab)
+
+    # --- Matérialisation ---------------------------------------------------
+
+    def word(self, i):
+        """Le mot `i` sous forme de dict (format JSON OCR), créé au premier accès."""
+        w = self._words.get(i)
+        if w is None:
+            w = {"text": self.vocab[self.text_codes[i]]}
+            for colonne in COLONNES:
+                w[colonne] = self.columns[colonne][i].item()
+            self._words[i] = w
+        return w
+
+    def words(self, indices):
+        return [self.word(int(i)) for i in indices]
+
+    def texts(self):
+        return [self.vocab[c] for c in self.text_codes.tolist()]
+
+    # --- Requêtes ----------------------------------------------------------
+
+    def page_indices(self, page=None):
+        """Indices des mots de la page (toutes les pages si None), dans l'ordre de lecture."""
+        if page is None:
+            return np.arange(len(self))
+        indices = self._pages.get(page)
+        if indices is None:
+            indices = self._pages[page] = np.flatnonzero(self.columns["page"] == page)
+        return indices
+
+    def query_indices(self, page=None, x_min=None, x_max=None, y_min=None, y_max=None):
+        """
+        Indices (triés) des mots dont (x, y) est dans le rectangle, bornes
+        incluses. Une borne à None n'est pas contrainte ; page=None
+        interroge toutes les pages.
+        """
+        indices = self.page_indices(page)
+        x = self.columns["x"][indices]
+        y = self.columns["y"][indices]
+        masque = np.ones(len(indices), dtype=bool)
+        if x_min is not None:
+            masque &= x >= x_min
+        if x_max is not None:
+            masque &= x <= x_max
+        if y_min is not None:
+            masque &= y >= y_min
+        if y_max is not None:
+            masque &= y <= y_max
+        return indices[masque]
+
+    def query(self, page=None, x_min=None, x_max=None, y_min=None, y_max=None):
+        """Mots dont (x, y) est dans le rectangle, dans l'ordre de lecture OCR."""
+        return self.words(self.query_indices(page, x_min, x_max, y_min, y_max))
+
+    def text_mask(self, predicate):
+        """Masque des mots dont le texte vérifie `predicate`, évalué une fois par texte distinct."""
+        par_texte = np.fromiter((bool(predicate(t)) for t in self.vocab), dtype=bool, count=len(self.vocab))
+        return par_texte[self.text_codes] if len(self.vocab) else np.zeros(len(self), dtype=bool)
+
+    def contains_mask(self, fragment_lower):
+        """Masque des mots dont le texte en minuscules contient `fragment_lower`."""
+        if self._vocab_lower is None:
+            self._vocab_lower = [t.lower() for t in self.vocab]
+        par_texte = np.fromiter((fragment_lower in t for t in self._vocab_lower), dtype=bool, count=len(self.vocab))
+        return par_texte[self.text_codes] if len(self.vocab) else np.zeros(len(self), dtype=bool)
+
+    def regex_mask(self, pattern):
+        return self.text_mask(pattern.search)
+
+    def sorted_order(self):
+        """Indices des mots triés par (page, y, x), tri stable comme sorted()."""
+        if self._sorted is None:
+            c = self.columns
+            self._sorted = np.lexsort((c["x"], c["y"], c["page"]))
+            self._sorted_page = c["page"][self._sorted]
+            self._sorted_y = c["y"][self._sorted]
+        return self._sorted
+
+    def band_indices(self, page, y_min, y_max):
+        """
+        Mots de la bande [y_min, y_max] d'une page, dans l'ordre (page, y, x) :
+        deux dichotomies sur les colonnes triées, sans parcours du document.
+        """
+        ordre = self.sorted_order()
+        debut = np.searchsorted(self._sorted_page, page, side='left')
+        fin = np.searchsorted(self._sorted_page, page, side='right')
+        ys = self._sorted_y[debut:fin]
+        return ordre[debut + np.searchsorted(ys, y_min, side='left'):debut + np.searchsorted(ys, y_max, side='right')]
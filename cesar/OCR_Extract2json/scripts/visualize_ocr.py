@@ -6,39 +6,11 @@ import cv2
 import numpy as np
 from PIL import Image
 
-def visualize_ocr_to_pdf(json_path, pdf_path=None, output_dir="data/ocr_visualization", image_dir=None):
-
-
-    
-    
-    if image_dir:
-        image_paths = sorted([
-            os.path.join(image_dir, f) for f in os.listdir(image_dir)
-            if f.lower().endswith('.png')
-        ])
-        pages = [Image.open(p) for p in image_paths]
-    elif pdf_path:
-        pages = convert_from_path(pdf_path, dpi=300)
-    else:
-        raise ValueError("❌ Vous devez fournir soit --image-dir, soit pdf_path.")
-
-    
-    with open(json_path, 'r', encoding='utf-8', errors='ignore') as f:
-        ocr_data = json.load(f)
-
-    
-    os.makedirs(output_dir, exist_ok=True)
-    if pdf_path:
-        base_filename = os.path.splitext(os.path.basename(pdf_path))[0]
-    elif image_dir:
-        # Essaye de deviner un nom basé sur le JSON OCR (ex: nsia.json → nsia)
-        base_filename = os.path.splitext(os.path.basename(json_path))[0]
-    else:
-        base_filename = "output"
+def annotate_pages(pages, ocr_data):
     annotated_images = []
 
     for page_idx, page in enumerate(pages):
-        img = cv2.cvtColor(np.array(page), cv2.COLOR_RGB2BGR)
+        img = cv2.cvtColor(np.array(page.convert("RGB")), cv2.COLOR_RGB2BGR)
         page_data = ocr_data[page_idx]
 
         for block in page_data.get("blocks", []):
@@ -71,12 +43,58 @@ def visualize_ocr_to_pdf(json_path, pdf_path=None, output_dir="data/ocr_visualiz
         pil_img = Image.fromarray(img_rgb)
         annotated_images.append(pil_img)
 
-    pdf_output_path = os.path.join(output_dir, f"{base_filename}_annotated.pdf")
+    return annotated_images
+
+
+def save_annotated_pdf(annotated_images, pdf_output_path):
+    os.makedirs(os.path.dirname(pdf_output_path) or ".", exist_ok=True)
     annotated_images[0].save(pdf_output_path, save_all=True, append_images=annotated_images[1:])
     print(f"✅ PDF annoté enregistré → {pdf_output_path}")
+    return pdf_output_path
+
+
+def visualize_ocr_to_pdf(json_path, pdf_path=None, output_dir="data/ocr_visualization", image_dir=None, provider=None,
+                         cleanup_image_dir=False):
+    """cleanup_image_dir : supprimer image_dir après usage (dossier temporaire propre à l'appelant)."""
+
+
+    
+    
+    if image_dir:
+        image_paths = sorted([
+            os.path.join(image_dir, f) for f in os.listdir(image_dir)
+            if f.lower().endswith('.png')
+        ])
+        pages = [Image.open(p) for p in image_paths]
+    elif provider is not None:
+        # Pages déjà rendues par le PageImageProvider partagé (pas de nouvelle rasterisation)
+        pages = [image for _, image in provider.iter_pages("visualisation")]
+        pdf_path = pdf_path or provider.pdf_path
+    elif pdf_path:
+        pages = convert_from_path(pdf_path, dpi=300)
+    else:
+        raise ValueError("❌ Vous devez fournir soit --image-dir, soit pdf_path.")
+
+    
+    with open(json_path, 'r', encoding='utf-8', errors='ignore') as f:
+        ocr_data = json.load(f)
+
+    
+    os.makedirs(output_dir, exist_ok=True)
+    if pdf_path:
+        base_filename = os.path.splitext(os.path.basename(pdf_path))[0]
+    elif image_dir:
+        # Essaye de deviner un nom basé sur le JSON OCR (ex: nsia.json → nsia)
+        base_filename = os.path.splitext(os.path.basename(json_path))[0]
+    else:
+        base_filename = "output"
+    annotated_images = annotate_pages(pages, ocr_data)
+
+    pdf_output_path = os.path.join(output_dir, f"{base_filename}_annotated.pdf")
+    save_annotated_pdf(annotated_images, pdf_output_path)
     
-    # Nettoyage du dossier temporaire si utilisé
-    if image_dir == "data/tmp_preprocessed":
+    # Nettoyage du dossier temporaire si demandé (jamais un dossier partagé deviné par son nom)
+    if image_dir and cleanup_image_dir:
         import shutil
         try:
             shutil.rmtree(image_dir)
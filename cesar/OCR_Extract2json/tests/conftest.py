@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+# Les modules de parsers/ s'importent entre eux par leur nom (comme en CLI)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsers"))
+
+import ocr_reader  # noqa: E402  (après l'ajout de parsers/ au chemin)
+
+
+class OcrFactice:
+    """
+    Remplace ocr_page_data (pas de Tesseract) : un mot par image, pris dans
+    `textes` s'il est défini, sinon "mot". `images` garde les images reçues.
+    """
+
+    def __init__(self):
+        self.images = []
+        self.textes = None
+
+    def __call__(self, image, psm=None, oem=None, lang='fra', engine=None):
+        self.images.append(image)
+        texte = next(self.textes) if self.textes is not None else "mot"
+        return {"text": [texte], "left": [10], "top": [10], "width": [40], "height": [12],
+                "line_num": [1], "block_num": [1], "word_num": [1], "conf": [90]}
+
+
+@pytest.fixture
+def ocr_factice(monkeypatch):
+    factice = OcrFactice()
+    monkeypatch.setattr(ocr_reader, "ocr_page_data", factice)
+    return factice
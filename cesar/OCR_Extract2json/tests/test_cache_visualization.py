@@ -0,0 +1,39 @@
+import os
+
+import fitz
+import numpy as np
+import yaml
+
+import pipeline as P
+from ocr_cache import OcrCache
+
+RACINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def test_visualisation_page_du_cache_pretraitee(tmp_path, monkeypatch, ocr_factice):
+    """Sur un hit du cache OCR, l'annotation se fait sur la page prétraitée, comme au premier passage."""
+    pdf_path = str(tmp_path / "doc.pdf")
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Relevé de compte")
+    doc.save(pdf_path)
+
+    with open(os.path.join(RACINE, "configs", "sgbe.releve.yaml"), encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    cfg.update({
+        "crop_tables": False,
+        "preprocess_pdf": True,
+        "preprocessing_params": {"binarization": {"enabled": True}},
+        "rasterization": {"engine": "fitz", "dpi": 100},
+    })
+
+    annotees = []
+    monkeypatch.setattr(P.ExtractionPipeline, "annotate",
+                        lambda self, pages, ocr_json, nom_base, visualization_dir=None: annotees.append(pages))
+
+    with P.ExtractionPipeline(cfg, save_ocr=False, visualize=True, cache=OcrCache(str(tmp_path / "cache"))) as pipeline:
+        pipeline.run(pdf_path)
+        pipeline.run(pdf_path)
+
+    assert len(ocr_factice.images) == 1
+    premier, second = annotees
+    assert np.array_equal(np.asarray(premier[0]), np.asarray(second[0]))
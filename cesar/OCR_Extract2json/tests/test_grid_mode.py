@@ -0,0 +1,68 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+import yaml
+from PIL import Image
+
+import pipeline as P
+from document_parser import parse_document
+from parsing_plan import compile_plan
+
+RACINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def _tableau_regle():
+    """Page blanche avec un tableau réglé de 5 rangées × 3 colonnes, de l'encre dans certaines cellules."""
+    page = np.full((1500, 1200, 3), 255, np.uint8)
+    cv2.rectangle(page, (100, 200), (900, 700), (0, 0, 0), 3)
+    for y in (300, 400, 500, 600):
+        cv2.line(page, (100, y), (900, y), (0, 0, 0), 2)
+    for x in (300, 600):
+        cv2.line(page, (x, 200), (x, 700), (0, 0, 0), 2)
+    for r, c in [(0, 0), (0, 1), (0, 2), (1, 1), (2, 0), (2, 1), (2, 2)]:
+        cv2.putText(page, "abc", ((100, 300, 600)[c] + 20, 200 + r * 100 + 60),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+    return Image.fromarray(page)
+
+
+@pytest.mark.parametrize("preprocess_tables", [False, True])
+def test_grid_mode(ocr_factice, preprocess_tables):
+    # Une cellule OCRisée par appel, dans l'ordre des rangées
+    ocr_factice.textes = iter(["12/03", "Achat carte", "100,00", "magasin", "13/03", "Virement", "25,50"])
+    with open(os.path.join(RACINE, "configs", "sgbe.releve.yaml"), encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    cfg.update({
+        "crop_tables": True,
+        "preprocess_tables": preprocess_tables,
+        # Pages considérées déjà redressées : pas d'OSD Tesseract sur les tableaux
+        "preprocess_pdf": True,
+        "preprocessing_params": {"binarization": {"enabled": True}},
+    })
+    tx = cfg["structure"]["transactions"]
+    tx.update({"source": "table", "mode": "grid", "columns_order": ["date", "libelle", "montant"],
+               "columns_regex": {"montant": r"([\d ]+,\d{2})"}, "start_line_regex": r"^\d{2}/\d{2}"})
+    tx.pop("filter_contains", None)
+    tx["filter_contains_any"] = ["virement", "prélèvement"]
+
+    pipeline = P.ExtractionPipeline(cfg, save_ocr=False, visualize=False, cache=None)
+    try:
+        tables = pipeline.crop_tables([_tableau_regle()], "doc")
+        result = parse_document([], pipeline.plan, "doc.json", tables=tables)
+    finally:
+        pipeline.close()
+
+    assert all(isinstance(image, np.ndarray) for image in ocr_factice.images)
+    assert [nom for nom, _ in tables] == ["doc_p1_tab1.grid.json"]
+    assert result["fichiers_tables"] == ["doc_p1_tab1.grid.json"]
+    assert result["transactions"] == [
+        {"date": "12/03", "libelle": "Achat carte magasin", "montant": "100,00"},
+        {"date": "13/03", "libelle": "Virement", "montant": "25,50"},
+    ]
+
+    # Le filtre porte sur le texte des cellules : un tableau sans le mot demandé est écarté
+    tx["filter_contains_any"] = ["solde"]
+    ecarte = parse_document([], compile_plan(cfg), "doc.json", tables=tables)
+    assert ecarte["fichiers_tables"] == []
+    assert ecarte["transactions"] == []
@@ -0,0 +1,20 @@
+import pytest
+
+from parsing_plan import compile_transactions
+
+
+def test_filtre_de_tableaux_inconnu_refuse():
+    with pytest.raises(ValueError, match="filter_any"):
+        compile_transactions({"source": "table", "filter_any": ["Date"], "start_line_regex": r"^\d{2}/\d{2}"})
+
+
+def test_filtres_de_tableaux_connus():
+    tx = compile_transactions({"source": "table", "filter_contains": ["Date"], "filter_contains_any": ["Débit", "Crédit"],
+                               "start_line_regex": r"^\d{2}/\d{2}"})
+    assert tx.filter_all == ("Date",)
+    assert tx.filter_any == ("Débit", "Crédit")
+
+
+def test_mode_grid_exige_source_table():
+    with pytest.raises(ValueError, match="source: table"):
+        compile_transactions({"mode": "grid", "columns_order": ["date"], "start_line_regex": r"^\d{2}/\d{2}"})
@@ -0,0 +1,20 @@
+import json
+
+from document_parser import parse_document
+from parsing_plan import compile_plan
+
+
+def test_tableaux_lus_dans_le_dossier_ocr_du_job(tmp_path):
+    """Sans tableaux en mémoire, parse_document lit (et indexe) ceux du dossier OCR passé, pas data/ocr."""
+    grille = {"page": 1, "rows": [{"y": 10, "cells": ["12/03", "Virement", "25,50"]}]}
+    (tmp_path / "releve_p1_tab1.grid.json").write_text(json.dumps(grille), encoding="utf-8")
+    plan = compile_plan({"structure": {"transactions": {
+        "source": "table", "mode": "grid", "columns_order": ["date", "libelle", "montant"],
+        "start_line_regex": r"^\d{2}/\d{2}",
+    }}})
+
+    result = parse_document([], plan, str(tmp_path / "releve.json"), ocr_dir=str(tmp_path))
+
+    assert result["fichiers_tables"] == ["releve_p1_tab1.grid.json"]
+    assert result["transactions"] == [{"date": "12/03", "libelle": "Virement", "montant": "25,50"}]
+    assert (tmp_path / "tables.sqlite").exists()